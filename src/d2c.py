@@ -1,25 +1,37 @@
 """translate figma json to compose ui code"""
 import os, sys
 import json
+import asyncio
 import random
 import string
 import shutil
 import subprocess
+import threading
 import requests
 import re
 from langgraph.graph import StateGraph, START, END
 import time
 from langgraph.prebuilt import create_react_agent
-from llm import init_gemini_chat
+from llm import get_stage_model
 from d2c_logger import tlogger, log_duration
 from utils.tos_manager import upload_zip_to_tos
 import d2c_datautil
 import d2c_config
 from utils import llm_prompts, llm_tools
-from utils.spec_data_schema import AgentState, ExportIcons, RecognizedComponents, CoderOutput, EvaluateResult
+from utils.spec_data_schema import AgentState, ExportIcon, ExportIcons, RecognizedComponents, CoderOutput, EvaluateResult
 import utils.spec_tool_utils as d2c_utils
-from utils.container_tools import prepare_container
+from utils.container_tools import prepare_container, warm_up_gradle
+from utils.workspace_pool import get_workspace_pool
+from utils.workspace_template import create_workspace_from_template
 from utils.retry_pool_tools import RetryPool
+from utils.async_llm import run_async
+from utils.llm_router import LLMRouter
+from utils.coder_stream import streaming_structured_output
+from utils.agent_context import compaction_hook
+from utils.icon_dedupe_tools import dedupe_icons, merge_icon_aliases
+from utils.icon_export_manifest import STATE_DIR, get_icon_export_manifest
+from utils.kotlin_compile_server import get_kotlin_compile_server
+from utils.llm_response_cache import response_cache_key, cache_response
 
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -62,26 +74,33 @@ def init_container(state: AgentState):
     d2c_datautil.update_task_stage(state["task_id"], "init_container")
     task_id = state["task_id"]
     workspace_directory = os.path.join(d2c_config.OUTPUT_DIR, f"{task_id}")
-    os.makedirs(workspace_directory, exist_ok=True)
-
     #workspace_directory = tempfile.mkdtemp()
     tlogger().info(f"project directory: {workspace_directory}")
-    # Clone the repository
-    prepare_container(workspace_directory)
-    # Run gradlew command
-    gradlew_command = ["./gradlew", "updateDebugScreenshotTest"]
-    result = subprocess.run(gradlew_command, cwd=workspace_directory, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"Failed to run gradlew command: {result.stderr}")
-    
+    workspace_pool = get_workspace_pool()
+    # a resumed task keeps its own workspace, only new tasks take a snapshot or a pre-warmed one
+    if d2c_config.WorkspaceCopyOnWrite and not os.path.exists(workspace_directory):
+        create_workspace_from_template(workspace_directory)
+    elif workspace_pool and not os.path.exists(workspace_directory) and workspace_pool.acquire(workspace_directory):
+        tlogger().info("use pre-warmed workspace")
+    else:
+        os.makedirs(workspace_directory, exist_ok=True)
+        # Clone the repository
+        prepare_container(workspace_directory)
+        # Run gradlew command
+        warm_up_gradle(workspace_directory)
+
+    if d2c_config.KotlinCompileServer:
+        # resolves the compile classpath in the background, check_compile does not wait for Gradle later
+        threading.Thread(target=get_kotlin_compile_server().warm_up, args=(workspace_directory,),
+                         name="kotlin_compile_server", daemon=True).start()
+
     # create resource directory
     resource_directory = os.path.join(workspace_directory, "app/src/main/res/drawable-xxhdpi")
     os.makedirs(resource_directory, exist_ok=True)
     return {"workspace_directory": workspace_directory, "resource_directory": resource_directory}
 
 tools = [llm_tools.export_figma_icon]
-model = init_gemini_chat(streaming=False)
-llm_with_tools = model.bind_tools(tools)
+llm_with_tools = get_stage_model("export_figma_icons").bind_tools(tools)
 
 def recognize_icon_block(node_json: dict):
     tlogger().info("recognize iconblock")
@@ -98,6 +117,39 @@ def recognize_icon_block(node_json: dict):
     else:
         return []
 
+def recognize_and_record_icon_block(workspace_directory: str, node_id: str, node_json: dict):
+    icons = recognize_icon_block(node_json)
+    # record each block as soon as it finishes, a failure in another block does not lose the work
+    get_icon_export_manifest(workspace_directory).set_recognized(node_id, [icon.dict() for icon in icons])
+    return icons
+
+async def arecognize_and_record_icon_block(workspace_directory: str, node_id: str, node_json: dict):
+    """Async version of recognize_and_record_icon_block, retried like RetryPool does."""
+    node_json_str = json.dumps(node_json, indent=4, ensure_ascii=False)
+    chain = llm_with_tools.with_structured_output(ExportIcons, method="function_calling")
+    messages = [
+        ("system", llm_prompts.get_recognize_icon_system_prompt()),
+        ("human", f"node json is:\n```{node_json_str}\n```"),
+    ]
+    for attempt in range(1, d2c_config.AsyncLLMMaxAttempts + 1):
+        try:
+            export_icons_obj = await llm_tools.asafe_call_llm(chain, messages)
+            break
+        except Exception as e:
+            tlogger().info(f"recognize node {node_id} failed {attempt}/{d2c_config.AsyncLLMMaxAttempts}: {e}")
+            if attempt == d2c_config.AsyncLLMMaxAttempts:
+                raise
+            await asyncio.sleep(1)
+    icons = export_icons_obj.icons if export_icons_obj and export_icons_obj.icons else []
+    get_icon_export_manifest(workspace_directory).set_recognized(node_id, [icon.dict() for icon in icons])
+    return icons
+
+async def arecognize_icon_blocks(workspace_directory: str, blocks: dict):
+    """Recognizes all blocks concurrently on the shared LLM event loop, the quota scheduler paces the requests."""
+    results = await asyncio.gather(*(arecognize_and_record_icon_block(workspace_directory, node_id, node_json)
+                                     for node_id, node_json in blocks.items()))
+    return [icon for icons in results for icon in icons]
+
 def export_icon_block(state: AgentState):
     icons_info = {}
     if "icon_list" not in state:
@@ -110,21 +162,52 @@ def export_icon_block(state: AgentState):
     #Reduce API calls because Figma services number of calls
     main_node_id = state["figma_url"].split("node-id=")[-1].split("&")[0].replace("-", ":")
     icons_info[main_node_id] = f"figma_screenshot_{state['task_id']}"
-    image_info = d2c_utils.get_image_ref(state["figma_json"].get("document", {}))
-    saved_path = llm_tools.export_figma_icon.invoke({
-        "figma_nodes": icons_info,
-        "image_refs": image_info,
-        "figma_file_key": state["figma_file_key"],
-        "root_node_id": state["root_node_id"],
-        "figma_token": state["figma_token"],
-        "resource_directory": state["resource_directory"]
-    })
+    document = state["figma_json"].get("document", {})
+    image_info = d2c_utils.get_image_ref(document)
+    icon_formats = d2c_utils.select_icon_formats(document, icons_info.keys())
+    # the screenshot is always a png
+    icon_formats[main_node_id] = "png"
+    pending_icons = dict(state.get("pending_icons") or {})
+    manifest = get_icon_export_manifest(state["workspace_directory"])
+    # a resumed task reuses the saved plan, so file names and urls stay the same as the first attempt
+    download_plan = manifest.get_download_plan(icons_info)
+    if download_plan is None:
+        # lazy mode only keeps node ids, render urls are requested for the icons the code references
+        download_plan = llm_tools.resolve_icon_downloads(icons_info, image_info, state["figma_file_key"], state["root_node_id"],
+                                                         state["figma_token"], state["resource_directory"], icon_formats,
+                                                         resolve_urls=not d2c_config.LazyIconDownload)
+        manifest.set_download_plan(icons_info, download_plan)
+    else:
+        tlogger().info(f"reuse icon download plan from manifest, {len(download_plan)} icons")
+    if d2c_config.LazyIconDownload:
+        # only the screenshot is downloaded here, icons referenced by the generated code are downloaded in materialize_icons
+        node_sizes = d2c_utils.get_node_sizes(document, icons_info.keys())
+        screenshot_plan = {}
+        for rel_path, item in download_plan.items():
+            if item["node_id"] == main_node_id:
+                screenshot_plan[rel_path] = item
+                continue
+            width, height = node_sizes.get(item["node_id"], (None, None))
+            pending_icons[rel_path] = dict(item, width=width, height=height)
+        saved_path = llm_tools.materialize_icon_downloads(screenshot_plan, state["resource_directory"], state["figma_file_key"],
+                                                          state["root_node_id"], state["figma_token"], manifest)
+        saved_path.update(pending_icons.keys())
+        tlogger().info(f"pending icons {len(pending_icons)}")
+    else:
+        saved_path = llm_tools.materialize_icon_downloads(download_plan, state["resource_directory"], state["figma_file_key"],
+                                                          state["root_node_id"], state["figma_token"], manifest)
     if saved_path:
         state["icon_list"].update(saved_path)
+    icon_aliases = dict(state.get("icon_aliases") or {})
+    # lazy mode has no bytes to compare before the code is generated
+    if d2c_config.DedupeExportedIcons and not d2c_config.LazyIconDownload:
+        new_aliases = dedupe_icons(state["workspace_directory"], state["icon_list"])
+        state["icon_list"].difference_update(new_aliases.keys())
+        icon_aliases = merge_icon_aliases(icon_aliases, new_aliases)
     tlogger().info(f"icon_list {state['icon_list']}")
     # Clear the list of icons to be exported after processing
     state["icons_need_to_be_exported"] = []
-    return {"icon_list": state["icon_list"]}
+    return {"icon_list": state["icon_list"], "icon_aliases": icon_aliases, "pending_icons": pending_icons}
 
 
 # Step 3: Export Figma Icons
@@ -139,11 +222,23 @@ def export_figma_icons(state: AgentState):
     d2c_datautil.update_task_stage(state["task_id"], "export_figma_icons")
     sub_figma = d2c_utils.split_tree(state["figma_json"].get("document", {}))
     retry_pool = state.get("retry_pool", RetryPool(task_id=state["task_id"]))
+    manifest = get_icon_export_manifest(state["workspace_directory"])
     future_tasks = []
+    pending_blocks = {}
     for node_id, node_json in sub_figma.items():
+        recognized = manifest.get_recognized(node_id)
+        if recognized is not None:
+            tlogger().info(f"Reuse recognized node {node_id} from manifest: {len(recognized)} icons")
+            state["icons_need_to_be_exported"].extend(ExportIcon(**icon) for icon in recognized)
+            continue
         tlogger().info(f"Recognize node {node_id}: type={node_json.get('type')}, name={node_json.get('name')}")
-        future_tasks.append(retry_pool.submit(recognize_icon_block, node_json))
+        if d2c_config.AsyncLLM:
+            pending_blocks[node_id] = node_json
+            continue
+        future_tasks.append(retry_pool.submit(recognize_and_record_icon_block, state["workspace_directory"], node_id, node_json))
         time.sleep(5)
+    if pending_blocks:
+        state["icons_need_to_be_exported"].extend(run_async(arecognize_icon_blocks(state["workspace_directory"], pending_blocks)))
     for f in future_tasks:
         state["icons_need_to_be_exported"].extend(f.result())
     builder_export = StateGraph(AgentState)
@@ -153,7 +248,8 @@ def export_figma_icons(state: AgentState):
     export_graph = builder_export.compile()
     result = export_graph.invoke(state)
     state.update(result)
-    return {"icon_list": state.get("icon_list", set())}
+    return {"icon_list": state.get("icon_list", set()), "icon_aliases": state.get("icon_aliases", {}),
+            "pending_icons": state.get("pending_icons", {})}
 
 # Step 4: Export Figma Screenshot
 def export_figma_screenshot(state: AgentState):
@@ -238,7 +334,7 @@ Respond with a JSON object containing a single key "components" which is a list
 '''
     user_prompt = f"Figma JSON:\n{figma_json_str}"
     
-    llm_without_tools = model.bind_tools([])
+    llm_without_tools = get_stage_model("recognize_components").bind_tools([])
     
     chain = llm_without_tools.with_structured_output(RecognizedComponents, method="function_calling")
     recognized = llm_tools.safe_call_llm(chain, [
@@ -278,29 +374,57 @@ def coder(state: AgentState):
     d2c_datautil.update_task_stage(state["task_id"], "coder")
     workspace_dir = state["workspace_directory"]
     knowledges = []
-    for component, knowledge_json in state["comp_knowledges"].items():
+    # sorted so that the same components always give the same prompt prefix
+    for component, knowledge_json in sorted(state["comp_knowledges"].items()):
         knowledge_text = json.dumps(knowledge_json, indent=4, ensure_ascii=False)
         knowledges.append(f"## {component}\n```json\n{knowledge_text}\n```")
     component_knowledge_prompt = "\n".join(knowledges)
-    system_prompt = llm_prompts.get_coder_system_prompt(component_knowledge_prompt)
-    user_prompt = llm_prompts.get_coder_user_prompt(json.dumps(state["figma_json"], indent=4, ensure_ascii=False))
+    system_prompt = llm_prompts.get_coder_system_prompt()
+    user_prompt = llm_prompts.get_coder_user_prompt(json.dumps(state["figma_json"], indent=4, ensure_ascii=False),
+                                                    component_knowledge_prompt)
     exported_icons_prompt = ""
     if "icon_list" in state and state["icon_list"]:
         exported_icons_prompt += "The resource files in the app/src/main/res/drawable-xxhdpi directory are:\n"
-        for icon in state["icon_list"]:
-            exported_icons_prompt += f"- {icon}\n"
+        pending_icons = state.get("pending_icons") or {}
+        for icon in sorted(state["icon_list"]):
+            width, height = pending_icons.get(icon, {}).get("width"), pending_icons.get(icon, {}).get("height")
+            if width and height:
+                exported_icons_prompt += f"- {icon} ({width}x{height}dp)\n"
+            else:
+                exported_icons_prompt += f"- {icon}\n"
+        if state.get("icon_aliases"):
+            exported_icons_prompt += "Duplicated icons have been merged, reference the kept resource instead:\n"
+            for duplicated_icon, kept_icon in state["icon_aliases"].items():
+                exported_icons_prompt += f"- {duplicated_icon} -> {kept_icon}\n"
         user_prompt += "\n# Icon List\n" + exported_icons_prompt
     tlogger().info("generate code start")
-    llm_without_tools = model.bind_tools([])
-    chain = llm_without_tools.with_structured_output(CoderOutput, method="function_calling")
+    def is_valid_output(output):
+        return output and output.compose_code and d2c_utils.is_valid_compose_code(output.compose_code.strip())
+
+    greeting_path = os.path.join(workspace_dir, "app/src/main/java/com/example/myapplication/Greeting.kt")
+    if d2c_config.CoderStreaming:
+        # aborts a generation as soon as the partial code cannot be valid, partial code is written to Greeting.kt
+        chain = streaming_structured_output(get_stage_model("coder", streaming=True), CoderOutput, greeting_path)
+    else:
+        llm_without_tools = get_stage_model("coder").bind_tools([])
+        chain = llm_without_tools.with_structured_output(CoderOutput, method="function_calling")
+    if isinstance(chain, LLMRouter):
+        # a hedged request is only won by valid code
+        chain = chain.with_validator(is_valid_output)
     messages = [
         ("system", system_prompt),
         ("user", user_prompt)
     ]
+
+    # coming back to the coder means the compiler or the evaluator rejected the previous code,
+    # the cached answer for the same messages must not be replayed
+    revisit = bool(state.get("coder_compose_code"))
     for retry_time in range(d2c_config.MAXCoderRetry):
-        coder_output = llm_tools.safe_call_llm(chain, messages)
+        # the output is only cached after the evaluator accepts it, see evaluator
+        coder_output = llm_tools.safe_call_llm(chain, messages, refresh_cache=revisit or retry_time > 0,
+                                               cacheable=lambda _: False)
         # ensure the compose code is not empty and valid
-        if coder_output and coder_output.compose_code and d2c_utils.is_valid_compose_code(coder_output.compose_code.strip()):
+        if is_valid_output(coder_output):
             tlogger().info(f"generate code as follows: \n{coder_output.compose_code}")
             break
         else:
@@ -311,13 +435,15 @@ def coder(state: AgentState):
 
     # clean the compose code format to avoid the code is not valid for kotlin file
     generated_compose_code = d2c_utils.clean_generated_code(coder_output.compose_code.strip())
+    generated_compose_code = d2c_utils.apply_icon_aliases(generated_compose_code, state.get("icon_aliases"))
     idx = generated_compose_code.find(d2c_config.Package_Declaration)
     if idx > 0:
         tlogger().info(f"remove from {idx} extra code : {generated_compose_code[:idx]}")
         generated_compose_code = generated_compose_code[idx:]
-    with open(os.path.join(workspace_dir, "app/src/main/java/com/example/myapplication/Greeting.kt"), "w") as f:
+    with open(greeting_path, "w") as f:
         f.write(generated_compose_code)
-    return {"coder_compose_code": generated_compose_code, "latest_compose_code": generated_compose_code, "current_node_name": "coder"}
+    return {"coder_compose_code": generated_compose_code, "latest_compose_code": generated_compose_code,
+            "coder_cache_entry": (response_cache_key(chain, messages), coder_output), "current_node_name": "coder"}
 
 @log_duration
 def bugfix(state: AgentState):
@@ -336,14 +462,22 @@ def bugfix(state: AgentState):
     else:
         error_message = "Go on fixing the current issue, and ensure the compose ui code is complete, free of syntax errors and runnable."
 
-    system_prompt = llm_prompts.get_bugfix_system_prompt(workspace_dir)
-    model_stream = init_gemini_chat(streaming=False)
+    system_prompt = llm_prompts.get_bugfix_system_prompt(quick_compile=d2c_config.KotlinCompileServer)
+    model_stream = get_stage_model("bugfix")
+    bugfix_tools = [llm_tools.replace_all, llm_tools.read_file, llm_tools.edit_file, llm_tools.rename_icon, llm_tools.mock_icon, llm_tools.list_icons]
+    if d2c_config.KotlinCompileServer:
+        bugfix_tools.append(llm_tools.check_compile)
     bugfix_agent = create_react_agent(
         model=model_stream,
-        tools=[llm_tools.replace_all, llm_tools.read_file, llm_tools.edit_file, llm_tools.rename_icon, llm_tools.mock_icon, llm_tools.list_icons],
+        tools=bugfix_tools,
         prompt=system_prompt,
+        pre_model_hook=compaction_hook if d2c_config.AgentContextCompaction else None,
     )
-    inputs = {"messages": [{"role": "user", "content": f"Current working directory is: {workspace_dir}\n"+error_message}]}
+    inputs = {"messages": [{"role": "user", "content": llm_prompts.get_bugfix_user_prompt(workspace_dir, error_message)}]}
+    if d2c_config.AsyncLLM:
+        # the quota scheduler paces the requests, no need to sleep between steps
+        run_async(llm_tools.astream_agent(bugfix_agent, inputs))
+        return {"current_node_name": "bugfix"}
     time.sleep(10)
     for chunk in bugfix_agent.stream(inputs, stream_mode="updates"):
         tlogger().info(chunk)
@@ -361,28 +495,18 @@ def replace_tester(state: AgentState):
     d2c_datautil.update_task_stage(state["task_id"], "replace_tester")
     workspace_dir = state["workspace_directory"]
 
-    system_prompt = f"""You are an expert Android developer. You need to update the test file to test the composable function in the Greeting.kt file.
-
-Workspace directory: {workspace_dir}
-
-Two important files in the workspace::
-1. {workspace_dir}/app/src/main/java/com/example/myapplication/Greeting.kt: the composable function to be tested
-2. {workspace_dir}/app/src/test/java/com/example/myapplication/ResourcesTest.kt: you need to edit the `fun compose()` function in the ResourcesTest.kt file
-
-Your task is to edit `ResourcesTest.kt` to correctly test the composable function provided in `Greeting.kt`.
-The function signature of the composable in `Greeting.kt` might be different from the one currently being tested in the test files. You need to handle this.
-
-You can use the following tools:
-- `replace_all`: to replace all occurrences of a string in a file
-- `read_file`: to read the content of a file
-"""
+    system_prompt = llm_prompts.get_replace_tester_system_prompt()
 
     replace_tester_agent = create_react_agent(
-        model=model,
+        model=get_stage_model("replace_tester"),
         tools=[llm_tools.replace_all, llm_tools.read_file],
-        prompt=system_prompt.strip(),
+        prompt=system_prompt,
+        pre_model_hook=compaction_hook if d2c_config.AgentContextCompaction else None,
     )
-    inputs = {"messages": [{"role": "user", "content": "please begin"}]}
+    inputs = {"messages": [{"role": "user", "content": llm_prompts.get_replace_tester_user_prompt(workspace_dir)}]}
+    if d2c_config.AsyncLLM:
+        run_async(llm_tools.astream_agent(replace_tester_agent, inputs))
+        return {}
     for chunk in replace_tester_agent.stream(inputs, stream_mode="updates"):
         tlogger().info(chunk)
         time.sleep(5)
@@ -397,6 +521,15 @@ def compiler(state: AgentState):
     tlogger().info("--- COMPILING ---")
     d2c_datautil.update_task_stage(state["task_id"], "compiler")
     workspace_dir = state["workspace_directory"]
+    if state.get("icon_aliases"):
+        # bugfix may reference a merged icon again, point it to the kept one
+        greeting_path = os.path.join(workspace_dir, "app/src/main/java/com/example/myapplication/Greeting.kt")
+        with open(greeting_path, "r") as f:
+            compose_code = f.read()
+        aliased_code = d2c_utils.apply_icon_aliases(compose_code, state["icon_aliases"])
+        if aliased_code != compose_code:
+            with open(greeting_path, "w") as f:
+                f.write(aliased_code)
     success, error_message = d2c_utils.compile(workspace_dir)
     return {"compile_success": success, "compile_error": error_message, "current_node_name": "compiler"}
 
@@ -413,6 +546,29 @@ def previewer(state: AgentState):
     success, error_message, screenshot_path = d2c_utils.preview(workspace_dir)
     return {"preview_success": success, "preview_error": error_message, "runtime_screenshot": screenshot_path, "current_node_name": "previewer"}
 
+def materialize_icons(state: AgentState):
+    """
+    Downloads the pending icons referenced by the generated code (lazy icon download mode).
+    """
+    pending_icons = state.get("pending_icons") or {}
+    if not pending_icons:
+        return {}
+    tlogger().info("--- MATERIALIZING ICONS ---")
+    d2c_datautil.update_task_stage(state["task_id"], "materialize_icons")
+    compose_code = llm_tools.read_file.invoke({"abs_path": os.path.join(state["workspace_directory"], "app/src/main/java/com/example/myapplication/Greeting.kt")})
+    used_names = {d2c_utils.icon_resource_name(icon) for icon in d2c_utils.find_used_icons(compose_code)}
+    download_plan = {rel_path: item for rel_path, item in pending_icons.items() if d2c_utils.icon_resource_name(rel_path) in used_names}
+    if not download_plan:
+        tlogger().info("no pending icon referenced by the code")
+        return {}
+    saved_path = llm_tools.materialize_icon_downloads(download_plan, state["resource_directory"], state["figma_file_key"],
+                                                      state["root_node_id"], state["figma_token"])
+    remaining_icons = {rel_path: item for rel_path, item in pending_icons.items() if rel_path not in download_plan}
+    # svg may fall back to png, so the saved paths replace the planned ones
+    icon_list = (set(state["icon_list"]) - set(download_plan.keys())) | saved_path
+    tlogger().info(f"materialized {len(download_plan)} icons, {len(remaining_icons)} icons not referenced")
+    return {"pending_icons": remaining_icons, "icon_list": icon_list}
+
 def remove_useless_icons(state: AgentState):
     """
     Removes useless icons.
@@ -443,7 +599,7 @@ runtime运行截图: {runtime_screenshot}
 请严格遵循设计的规则对两张图片, 并按照输出格式输出结果
     """
 
-    llm_for_evaluate = model.bind_tools([llm_tools.encode_image])
+    llm_for_evaluate = get_stage_model("evaluator").bind_tools([llm_tools.encode_image])
     
     evaluate_result = llm_for_evaluate.with_structured_output(EvaluateResult, method="function_calling").invoke([
         ("system", system_prompt.strip()),
@@ -451,6 +607,12 @@ runtime运行截图: {runtime_screenshot}
     ])
     
     tlogger().info(f"Evaluate result: {evaluate_result.result}")
+    # only code the evaluator accepts is replayed from the response cache; if bugfix rewrote Greeting.kt, the accepted
+    # code is not the coder output and the coder output was rejected by the compiler, so nothing is cached
+    coder_code = (state.get("coder_compose_code") or "").strip()
+    coder_code_accepted = coder_code == (state.get("latest_compose_code") or "").strip()
+    if evaluation_passed(evaluate_result.result) and state.get("coder_cache_entry") and coder_code_accepted:
+        cache_response(*state["coder_cache_entry"])
 
     return {"evaluate_result": evaluate_result.result, "current_node_name": "evaluator"}
 
@@ -470,7 +632,7 @@ def commit(state: AgentState):
         subprocess.run(["git", "checkout", "-b", branch_name], cwd=workspace_dir, check=True, capture_output=True, text=True)
 
         # git add .
-        subprocess.run(["git", "add", "."], cwd=workspace_dir, check=True, capture_output=True, text=True)
+        subprocess.run(["git", "add", ".", f":(exclude){STATE_DIR}"], cwd=workspace_dir, check=True, capture_output=True, text=True)
 
         # git commit -m "compose ui"
         subprocess.run(["git", "commit", "-m", "compose ui"], cwd=workspace_dir, check=True, capture_output=True, text=True)
@@ -507,7 +669,7 @@ def compress_upload(state: AgentState):
     if os.path.isfile(logfile):            # 只移动文件
         shutil.copy(logfile, workspace_dir)   
     try:
-        subprocess.run(["zip", "-r", f"{target_name}.zip", f"{task_id}"], cwd=compress_dir, check=True, capture_output=True, text=True)
+        subprocess.run(["zip", "-r", f"{target_name}.zip", f"{task_id}", "-x", f"{task_id}/{STATE_DIR}/*"], cwd=compress_dir, check=True, capture_output=True, text=True)
         """ add upload to url here. """
         output_zip_file_path = os.path.join(compress_dir, f"{target_name}.zip")
         output_folder_path = os.path.join(compress_dir, f"{target_name}")
@@ -529,6 +691,9 @@ def destroy_container(state: AgentState):
     tlogger().info("--- DESTROYING CONTAINER ---")
     d2c_datautil.update_task_stage(state["task_id"], "destroy_container")
     os.remove(f"{state['workspace_directory']}.zip")
+    workspace_pool = get_workspace_pool()
+    if d2c_config.RecycleUploadedWorkspaces and workspace_pool:
+        workspace_pool.recycle(state["workspace_directory"])
     return {"current_node_name": "destroy_container"}
 
 def compiler_status_checker(state: AgentState):
@@ -562,15 +727,20 @@ def evaluator_status_checker(state: AgentState):
     """
     Check the evaluator status
     """
-    if state["evaluate_result"]:
-        evaluate_result = json.loads(state["evaluate_result"].replace("'", '"'))
-        for key, value in evaluate_result.items():
-            if value < d2c_config.EvaluateThreshold:
-                return "coder"
+    if evaluation_passed(state["evaluate_result"]):
         return "compress_upload"
     else:
         return "coder"
 
+def evaluation_passed(evaluate_result) -> bool:
+    """
+    Whether every item of the evaluate result reaches the threshold, an empty result never passes.
+    """
+    if not evaluate_result:
+        return False
+    evaluate_result = json.loads(evaluate_result.replace("'", '"'))
+    return all(value >= d2c_config.EvaluateThreshold for value in evaluate_result.values())
+
 def create_workflow():
     # Define the workflow
     workflow = StateGraph(AgentState)
@@ -585,6 +755,7 @@ def create_workflow():
     workflow.add_node("coder", coder)
     workflow.add_node("replace_tester", replace_tester)
     workflow.add_node("compiler", compiler)
+    workflow.add_node("materialize_icons", materialize_icons)
     workflow.add_node("remove_useless_icons", remove_useless_icons)
     workflow.add_node("previewer", previewer)
     workflow.add_node("commit", commit)
@@ -602,8 +773,9 @@ def create_workflow():
     workflow.add_edge("recognize_components", "get_component_knowledges")
     workflow.add_edge("get_component_knowledges", "coder")
     workflow.add_edge("coder", "replace_tester")
-    workflow.add_edge("replace_tester", "compiler")
-    workflow.add_edge("bugfix", "compiler")
+    workflow.add_edge("replace_tester", "materialize_icons")
+    workflow.add_edge("bugfix", "materialize_icons")
+    workflow.add_edge("materialize_icons", "compiler")
 
     workflow.add_conditional_edges(
        "compiler",
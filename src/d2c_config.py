@@ -1,4 +1,5 @@
 
+import os
 from enum import IntEnum
 
 class TaskStatus(IntEnum):
@@ -70,6 +71,247 @@ OUTPUT_DIR="/tmp/d2c_task_output"
 # Must be False in production to ensure the latest design files are always fetched.
 FIGMA_REQUEST_CACHE = False
 
+# Export pure vector icons (VECTOR/BOOLEAN_OPERATION subtrees) as svg and convert them to VectorDrawable xml.
+# Icons with image fills, gradients or effects are still exported as png.
+ExportVectorIconsAsSvg = True
+
+# Collapse duplicated icons of a task (same bytes, or same perceptual hash, aspect ratio and color) into one drawable.
+DedupeExportedIcons = True
+# Max hamming distance between two 64 bit dHash values to be treated as the same icon.
+IconDedupeHashDistance = 3
+# Max difference of the alpha weighted mean color channel (0-255) between duplicated icons.
+IconDedupeColorTolerance = 16
+# Larger images only take part in the exact (sha256) dedupe, decoding them in pure python is too slow.
+IconDedupeMaxPixels = 512 * 512
+
+# Only resolve icon download urls before coding and download the icons referenced by Greeting.kt before compiling.
+# The coder sees the icon names and sizes; icon dedupe is skipped in this mode because nothing is downloaded yet.
+LazyIconDownload = False
+
+# Number of pre-warmed workspaces (cloned, JDK ready, one Gradle build done) kept under OUTPUT_DIR/WorkspacePoolDirName.
+# A task takes one with a rename instead of cloning and building; 0 disables the pool. Off by default: every pooled
+# workspace holds a full clone and Gradle build on disk, so size it for the host before enabling.
+WorkspacePoolSize = 0
+WorkspacePoolDirName = ".workspace_pool"
+# Pre-warmed workspaces older than this are rebuilt so the template repo does not fall too far behind.
+WorkspacePoolMaxAgeSeconds = 6 * 3600
+# Hand the output folder back to the pool (git checkout/clean) after the zip is uploaded.
+# Off by default because the output folder is kept as the local task output.
+RecycleUploadedWorkspaces = False
+
+# Create task workspaces as copy-on-write snapshots of one immutable golden template under
+# OUTPUT_DIR/WorkspaceTemplateDirName instead of cloning; the workspace pool is not used in this mode. Off by default:
+# hardlink snapshots share files with the template, only enable it on hosts where the strategy below is verified.
+WorkspaceCopyOnWrite = False
+# "reflink" (cp --reflink, needs btrfs/xfs), "hardlink" (hardlink farm) or "auto" (reflink, then hardlink).
+WorkspaceCowStrategy = "auto"
+WorkspaceTemplateDirName = ".workspace_template"
+WorkspaceTemplateMaxAgeSeconds = 6 * 3600
+# Directories written by Gradle or the task itself, copied instead of hardlinked in hardlink mode. Gradle rewrites
+# build outputs in place, so they cannot be shared; every hardlink workspace pays the full size of app/build, build
+# and .gradle (usually the largest part of the template). Prefer reflink where the filesystem supports it.
+WorkspaceCowCopiedDirs = ["app/src", "app/build", "build", ".gradle"]
+
+# All Gradle builds share one GRADLE_USER_HOME, so dependency cache, local build cache and daemons are reused
+# across task workspaces. None keeps the environment default.
+GradleUserHome = os.path.expanduser("~/.gradle")
+# Configuration cache problems are reported as warnings instead of failing the build.
+GradleConfigurationCache = True
+# Concurrent builds, which is also the upper bound of long running daemons.
+GradleMaxConcurrentBuilds = 4
+# Daemons are stopped (gradlew --stop) after this many builds, or when a build shows a daemon crash/OOM.
+GradleDaemonMaxBuilds = 200
+# Minimum interval between gradlew --status health checks, only run while no build is in flight.
+GradleDaemonHealthCheckSeconds = 300
+
+# The compiler stage only compiles Kotlin offline (seconds) instead of running updateDebugScreenshotTest;
+# the Paparazzi screenshot is rendered once by the previewer after a successful compile.
+CompileOnlyCheck = True
+# Test sources are compiled too because replace_tester edits ResourcesTest.kt.
+CompileCheckTasks = [":app:compileDebugUnitTestKotlin"]
+
+# Give the bugfix agent a check_compile tool backed by a long running Kotlin compiler process that keeps the
+# template classpath warm (about a second per check). The compiler stage still verifies with Gradle. Off by default:
+# each compiler process keeps KotlinCompileServerHeapMb of heap for the lifetime of the service.
+KotlinCompileServer = False
+KotlinCompileServerDirName = ".kotlin_compile_server"
+# None: JAVA_HOME, then the provisioned JDK, then javac on PATH.
+KotlinCompileServerJavaHome = None
+KotlinCompileServerHeapMb = 2048
+KotlinCompileServerTimeoutSeconds = 120
+# Restart the compiler process after this many checks to bound its memory.
+KotlinCompileServerMaxChecks = 200
+# Compiler processes (KotlinCompileServerHeapMb each). At most this many check_compile calls run at the same time,
+# the checks of all other concurrent tasks wait for a free process.
+KotlinCompileServerProcesses = 2
+
+# Gradle/Paparazzi jobs are admitted against a CPU and memory budget and queue when it is used up.
+# None: all cores / 80% of the host memory.
+BuildCpuBudget = None
+BuildMemoryBudgetMb = None
+# Stop admitting new jobs when the host has less available memory than this, whatever the budget says.
+BuildMemoryReserveMb = 2048
+# Estimated (cpus, memory MB) per kind of job.
+BuildJobCost = {
+    "build": (2, 3072),
+    "warm_up": (4, 4096),
+    "compile": (2, 3072),
+    "preview": (2, 4096),
+    "quick_compile": (1, 1024),
+}
+
+# Hand bugfix a ranked, deduplicated list of Kotlin/Paparazzi errors instead of the raw Gradle output.
+ParseBuildDiagnostics = True
+BuildDiagnosticsMaxItems = 20
+# Lines of output kept when no diagnostic can be parsed.
+BuildOutputTailLines = 40
+
+# Background GC of OUTPUT_DIR: workspaces, output folders, zips and logs of finished tasks are removed after
+# WorkspaceRetentionSeconds, and oldest first while OUTPUT_DIR is over OutputDirQuotaBytes. Running tasks are never
+# touched. WorkspaceGcIntervalSeconds = 0 disables the GC.
+WorkspaceGcIntervalSeconds = 600
+WorkspaceRetentionSeconds = 3 * 24 * 3600
+OutputDirQuotaBytes = 50 * 1024 ** 3
+# Entries modified more recently than this are kept even when over quota.
+WorkspaceGcMinAgeSeconds = 1800
+
+# Every Gradle/Paparazzi run gets a wall clock timeout (seconds) per kind of job; on expiry the whole process group is
+# killed, the build fails with a timeout message and the daemons are recycled.
+GradleTimeoutSeconds = {
+    "build": 900,
+    "warm_up": 1800,
+    "compile": 600,
+    "preview": 900,
+    "status": 120,
+}
+# cgroup v2 directory for per build CPU/memory limits taken from BuildJobCost. The parent has to be writable,
+# otherwise builds run without limits. With limits on, builds use --no-daemon so the build JVM stays in the cgroup.
+# Without a cgroup, builds run in the shared daemon: the sandbox timeout, rusage and kill only cover the gradlew
+# client, and a timed out build is stopped by recycling all daemons (gradlew --stop).
+GradleSandboxCgroupRoot = None
+# memory.max = estimated memory of the job kind * headroom.
+GradleSandboxMemoryHeadroom = 1.5
+
+# LLM clients are shared process wide per (quota, model options), and every upstream quota has exactly one rate
+# limiter, so the aggregate request rate of all concurrent tasks stays within the quota. Keys are quota names
+# (the model name for the Gemini endpoints); "default" applies to unknown quotas.
+LLMRateLimits = {
+    "default": {"requests_per_second": 0.7, "max_bucket_size": 5},
+    "gemini-3-pro-preview-new": {"requests_per_second": 0.7, "max_bucket_size": 5},
+    "gemini-2.5-pro": {"requests_per_second": 0.7, "max_bucket_size": 5},
+}
+# Connection pool shared by all LLM clients.
+LLMMaxConnections = 64
+LLMMaxKeepaliveConnections = 16
+
+# Disk cache of LLM responses (safe_call_llm), keyed by model options, tools/output schema and normalised messages.
+# Stages that must not reuse a response pass cache=False. Off by default: a cache hit replays an earlier generation
+# instead of sampling a new one, enable it where reruns of the same page are expected.
+LLMResponseCache = False
+LLMResponseCacheDir = "/tmp/d2c_llm_cache"
+LLMResponseCacheTTLSeconds = 7 * 24 * 3600
+# Least recently used responses are evicted above this size.
+LLMResponseCacheMaxBytes = 1024 ** 3
+
+# LLM requests of one quota wait in a shared priority queue. Later stages go first so in-flight tasks finish before
+# new tasks start; ties go to the app with fewer requests in flight, then first come first served.
+LLMStagePriority = {
+    "export_figma_icons": 1,
+    "recognize_components": 2,
+    "coder": 3,
+    "bugfix": 4,
+    "replace_tester": 4,
+    "evaluator": 5,
+}
+LLMDefaultPriority = 2
+# A waiting request gains one priority level per this many seconds, so nothing starves.
+LLMPriorityAgingSeconds = 60
+# Tasks are expected to finish within LLMTaskDeadlineSeconds of creation; requests of tasks with less than
+# LLMDeadlineSlackSeconds left (or already late) get LLMDeadlineBoost extra priority.
+LLMTaskDeadlineSeconds = 1800
+LLMDeadlineSlackSeconds = 300
+LLMDeadlineBoost = 3
+# Concurrent requests per quota.
+LLMMaxInFlight = 8
+
+# Run icon block recognition and the bugfix/replace_tester agents as coroutines on one shared event loop instead of
+# a thread (and fixed sleeps) per call; the quota scheduler paces the requests. Off by default until the async path
+# has run alongside the threaded one in production.
+AsyncLLM = False
+# Attempts per icon block in async mode, like RetryPool's max_retry.
+AsyncLLMMaxAttempts = 3
+
+# Interchangeable LLM backends per stage, in order of preference (names from llm.LLM_BACKENDS). With more than one
+# backend a stage is routed: degraded backends (rate limit cooldown, error rate or p95 latency over the stage budget
+# in the rolling window) move to the back, and an attempt slower than the stage timeout is cancelled and retried on
+# the next backend. Agent stages keep one backend because tool call history is not portable across providers.
+# Routed requests run on the shared event loop of utils.async_llm whatever AsyncLLM says, so every stage ships with a
+# single backend until routing has run in production; to route a stage list its fallbacks, for example
+#   "coder": ["gemini-3-pro-preview-new", "gemini-2.5-pro"],
+LLMStageBackends = {
+    "default": ["gemini-3-pro-preview-new"],
+    "export_figma_icons": ["gemini-3-pro-preview-new"],
+    "recognize_components": ["gemini-3-pro-preview-new"],
+    "coder": ["gemini-3-pro-preview-new"],
+    "evaluator": ["gemini-3-pro-preview-new"],
+    "bugfix": ["gemini-3-pro-preview-new"],
+    "replace_tester": ["gemini-3-pro-preview-new"],
+}
+# p95 latency (seconds) above which a backend counts as degraded for a stage.
+LLMRouterLatencyBudgetSeconds = {"default": 60, "coder": 240}
+# Attempts slower than this (seconds) fail over to the next backend; the last backend has no limit.
+LLMRouterAttemptTimeoutSeconds = {"default": 120, "coder": 420}
+LLMRouterWindowSeconds = 600
+LLMRouterMinSamples = 5
+LLMRouterMaxErrorRate = 0.3
+# Routed backends do not retry 429 themselves (no client retries, no llm_retry): the first 429 cools the backend down
+# for this long and the request fails over; safe_call_llm backs off only when every backend is rate limited.
+LLMRouterRateLimitCooldownSeconds = 60
+# Hedged stages: once a request takes longer than the stage's rolling latency quantile (default_delay_seconds until
+# there are enough samples, never less than min_delay_seconds), a duplicate is sent to the next backend (or the same
+# one); the first valid result wins and the other request is cancelled. At most budget_ratio of the stage's requests
+# in the rolling window are hedged. Off by default: every hedge is a second paid request, and a hedged stage is always
+# routed (see LLMStageBackends). To hedge the coder, the slowest call in the pipeline:
+#   "coder": {"quantile": 0.9, "min_delay_seconds": 30, "default_delay_seconds": 180, "budget_ratio": 0.2},
+LLMHedging = {}
+
+# Stream the coder's structured output: compose_code is parsed while it is generated, and the generation is aborted
+# as soon as it cannot pass is_valid_compose_code (no package declaration near the start, mismatched brackets), so
+# the retry starts without waiting for the rest of a bad response. Off by default: the incremental checks can abort
+# code that the final is_valid_compose_code would have accepted.
+CoderStreaming = False
+# Characters of compose_code allowed before the package declaration appears.
+CoderStreamPackageWindow = 400
+# Re-parse the partial tool call arguments every this many new characters.
+CoderStreamParseChunkChars = 200
+# Write the partial code to Greeting.kt every this many new characters, so the task output shows progress.
+CoderStreamWriteChunkChars = 1000
+
+# Backends (model names) whose prompt caching needs an explicit cache_control breakpoint; it is put at the end of the
+# last system message. Gemini and GPT cache repeated prompt prefixes implicitly, which works because the system
+# prompts in utils/llm_prompts.py are static and everything task specific is in the user message.
+LLMPromptCacheControl = ["gcp-claude37-sonnet"]
+
+# USD per 1M tokens, used to estimate the cost of every LLM call in the per task/stage telemetry (llm_usage in the
+# task query). List prices; replace with the contracted ones. Models not listed are counted with cost 0.
+LLMTokenPrices = {
+    "gemini-3-pro-preview-new": {"input": 2.0, "cached_input": 0.2, "output": 12.0},
+    "gemini-2.5-pro": {"input": 1.25, "cached_input": 0.125, "output": 10.0},
+    "gcp-claude37-sonnet": {"input": 3.0, "cached_input": 0.3, "output": 15.0},
+    "gpt-4.1-2025-04-14": {"input": 2.0, "cached_input": 0.5, "output": 8.0},
+}
+
+# Compact what the bugfix/replace_tester agents send to the model on every turn (the graph state keeps the full
+# history): a file read again is sent as a diff against the earlier full read when the diff is at most
+# AgentContextDiffMaxRatio of the file, tool results older than the last AgentContextKeepRecentToolResults are cut to
+# AgentContextToolResultMaxChars, and the oldest tool call rounds are dropped while the history is over
+# AgentContextMaxChars.
+AgentContextCompaction = True
+AgentContextKeepRecentToolResults = 4
+AgentContextToolResultMaxChars = 1500
+AgentContextDiffMaxRatio = 0.5
+AgentContextMaxChars = 100_000
+
 Package_Declaration = "package com.example.myapplication"
 
 FigmaSampleUrl= "https://www.figma.com/design/T5UGp5w1e4Re7Y1ePsLoqB/D2C-Benchmark?node-id=69-2157&t=OxJmcfPw7ZZZmavD-4" #"https://www.figma.com/design/T5UGp5w1e4Re7Y1ePsLoqB/D2C-Benchmark?node-id=1-166&t=kMsYMoAYmqy1S6Cm-4" #"https://www.figma.com/design/4VPgbnqRBmEgAyFrz75nNZ/Mediun_Schedule?node-id=0-1&p=f&t=MDCzFXi2duxjOoeX-0"# "https://www.figma.com/design/NDhYpgHZiCs8euNGEt4s7m/D2C-figma-demo?node-id=1-465&t=6c12q9vIPu42nUqq-0" # "https://www.figma.com/design/CP80TPBxJhPIYZe7wrVKu6/Medium_Order?node-id=0-8&t=2XRvc9auNmXNZLrl-4" # 
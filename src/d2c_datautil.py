@@ -8,6 +8,8 @@ _lock = threading.Lock()
 _tasks: Dict[int, dict] = {}          # task_id -> 任务字典
 _tasks_output_code: Dict[int, str] = {}          # task_id -> output content代码
 _tasks_stage: Dict[int, List[str]] = {}          # task_id -> stage
+_tasks_build_wait: Dict[int, float] = {}          # task_id -> 构建排队等待总时长(秒)
+_tasks_llm_usage: Dict[int, Dict[str, Dict[str, float]]] = {}          # task_id -> stage -> LLM 调用统计(token/延迟/排队)
 _app_index: Dict[str, List[int]] = {}  # app_name -> [task_id, ...]
 
 # ---------- 工具函数 ----------
@@ -91,6 +93,11 @@ def count_app_running_task(app_name: str) -> int:
         task_ids = _app_index.get(app_name, [])
         return sum(1 for tid in task_ids if _tasks.get(tid, {}).get("task_status") in RUNNING)
 
+def list_running_task_ids() -> List[int]:
+    RUNNING = {0, 2}          # 与 count_app_running_task 一致
+    with _lock:
+        return [tid for tid, task in _tasks.items() if task.get("task_status") in RUNNING]
+
 
 def update_task_log(task_id: int,    
                     output_url: Optional[str] = None) -> None:
@@ -128,4 +135,30 @@ def update_task_stage(task_id: int, new_stage: str) -> None:
 
 def get_task_stage(task_id: int) -> str:
     with _lock:
-        return _tasks_stage.get(task_id)
\ No newline at end of file
+        return _tasks_stage.get(task_id)
+
+
+def add_task_build_wait(task_id: int, wait_seconds: float) -> None:
+    with _lock:
+        _tasks_build_wait[task_id] = _tasks_build_wait.get(task_id, 0.0) + wait_seconds
+
+
+def get_task_build_wait(task_id: int) -> float:
+    with _lock:
+        return _tasks_build_wait.get(task_id, 0.0)
+
+
+def add_task_llm_usage(task_id: int, stage: str, metrics: Dict[str, float]) -> None:
+    """以 max_ 开头的字段取最大值，其余累加"""
+    with _lock:
+        totals = _tasks_llm_usage.setdefault(task_id, {}).setdefault(stage, {})
+        for field, value in metrics.items():
+            if field.startswith("max_"):
+                totals[field] = max(totals.get(field, 0), value)
+            else:
+                totals[field] = totals.get(field, 0) + value
+
+
+def get_task_llm_usage(task_id: int) -> Dict[str, Dict[str, float]]:
+    with _lock:
+        return {stage: dict(metrics) for stage, metrics in _tasks_llm_usage.get(task_id, {}).items()}
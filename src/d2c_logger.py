@@ -3,11 +3,14 @@ from logging.handlers import RotatingFileHandler
 import os
 import threading
 import functools
+import contextvars
 import d2c_config
 import time
 
 # 初始化线程本地存储（每个线程独立的数据空间）
 task_context = threading.local()
+# 协程共用事件循环线程，协程里的任务上下文放在 contextvar 中，每个 asyncio Task 各自一份
+async_task_context = contextvars.ContextVar("d2c_async_task_context", default=None)
 
 def get_task_logger(task_id: int) -> logging.Logger:
     """为特定任务创建或获取日志记录器"""
@@ -38,12 +41,20 @@ def get_task_logger(task_id: int) -> logging.Logger:
     return logger
 
 
+def bind_async_task_context(task_id: int):
+    """在协程中绑定任务上下文，之后该协程（及其创建的子任务）里的 tlogger/logger_task_id 指向该任务"""
+    async_task_context.set((task_id, logging.getLogger(f"task_{task_id}")))
+
+
 def clean_threading_context():
     if hasattr(task_context, "logger"):
         del task_context.logger
 
 def tlogger(task_id=10000) -> logging.Logger:
     """从线程本地存储获取当前任务的日志器（全局可用）"""
+    bound = async_task_context.get()
+    if bound is not None:
+        return bound[1]
     try:
         if not hasattr(task_context, "logger"):
             task_context.logger = get_task_logger(task_id)
@@ -54,6 +65,9 @@ def tlogger(task_id=10000) -> logging.Logger:
     
 def logger_task_id() -> logging.Logger:
     """从线程本地存储获取当前任务的日志器（全局可用）"""
+    bound = async_task_context.get()
+    if bound is not None:
+        return bound[0]
     try:
         if not hasattr(task_context, "logger"):
             return 10000
@@ -45,6 +45,7 @@ D2C_STAGE_MSG_COMPILER = "编译代码（第 %d 次）"
 D2C_STAGE_MSG_BUGFIX = "修复错误（第 %d 次）"
 D2C_STAGE_MSG_EVALUATOR = "效果评估中"
 
+D2C_STAGE_MSG_MATERIALIZE_ICONS = "下载代码引用的图标"
 D2C_STAGE_MSG_REMOVE_USELESS_ICONS = "清理无用图标资源"
 D2C_STAGE_MSG_PREVIEWER = "生成代码预览效果"
 D2C_STAGE_MSG_COMMIT = "提交代码至版本仓库"
@@ -65,6 +66,7 @@ node_msg_mapping = {
     "replace_tester": D2C_STAGE_MSG_REPLACE_CODE,
     "compiler": D2C_STAGE_MSG_COMPILER,
     "bugfix": D2C_STAGE_MSG_BUGFIX,
+    "materialize_icons": D2C_STAGE_MSG_MATERIALIZE_ICONS,
     "remove_useless_icons": D2C_STAGE_MSG_REMOVE_USELESS_ICONS,
 
     "previewer": D2C_STAGE_MSG_PREVIEWER,
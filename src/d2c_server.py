@@ -1,17 +1,36 @@
 #!/usr/bin/env python3
 # d2c_server_file.py  (1.18.0 官方示例结构)
+import threading
 from typing import Optional, Dict, List
 
 import uvicorn  # 新增：导入uvicorn，避免main函数中未定义
 from fastapi import FastAPI, Query, HTTPException
 from pydantic import BaseModel
 
+import d2c_config
 from d2c_task import create_task, query_task, query_tasks
+from llm import llm_scheduler_stats
+from utils.build_scheduler import get_build_scheduler
+from utils.llm_router import backend_health_stats
+from utils.prompt_cache import prompt_cache_stats
+from utils.workspace_pool import get_workspace_pool
+from utils.workspace_template import ensure_template
+from utils.workspace_gc import start_workspace_gc
 
 
 app = FastAPI(title="D2C Task Management API", version="1.0")
 
 
+@app.on_event("startup")
+def warm_workspace_pool():
+    """服务启动时开始预热工作区（或构建黄金模板），第一个任务也不用冷启动；同时启动 OUTPUT_DIR 回收"""
+    if d2c_config.WorkspaceCopyOnWrite:
+        threading.Thread(target=ensure_template, name="workspace_template", daemon=True).start()
+    else:
+        get_workspace_pool()
+    start_workspace_gc()
+
+
 # ------------------------------
 # 请求模型定义
 # ------------------------------
@@ -49,6 +68,13 @@ async def query_task_api(task_id: str):
     return query_task(task_id)
 
 
+@app.get("/d2c/scheduler", response_model=Dict[str, object])
+async def query_scheduler_api():
+    """REST 接口：LLM 请求和构建的排队深度、等待时间，各 LLM 后端的延迟和错误率，以及各模型的 token 用量和前缀缓存命中率"""
+    return {"llm": llm_scheduler_stats(), "llm_backends": backend_health_stats(), "llm_tokens": prompt_cache_stats(),
+            "build": get_build_scheduler().stats()}
+
+
 # ------------------------------
 # 服务启动入口（修复模块名引用）
 # ------------------------------
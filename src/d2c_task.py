@@ -6,6 +6,9 @@ from d2c import create_workflow
 import d2c_datautil
 import d2c_config
 import d2c_msg
+from utils.name_registry import release_name_registries
+from utils.icon_export_manifest import release_icon_export_manifest
+from utils.llm_telemetry import task_llm_usage
 import subprocess
 from datetime import datetime
 from typing import Dict, Tuple, List
@@ -58,6 +61,9 @@ def d2c_exec_task(task_id: str, figma_url: str, figma_token: str):
         task_logger.info(f"Status updated to 'error'")
         d2c_datautil.update_task_complete(task_id, d2c_config.TaskStatus.Failed.value, output_log_path) 
     finally:
+        # 释放工作区的文件名分配记录和 icon 导出清单（清单文件保留在工作区，任务恢复时重新加载）
+        release_name_registries(os.path.join(d2c_config.OUTPUT_DIR, f"{task_id}"))
+        release_icon_export_manifest(os.path.join(d2c_config.OUTPUT_DIR, f"{task_id}"))
         # 清理线程本地存储（关键！避免线程复用导致数据残留
         clean_threading_context()
         # 移除日志处理器，避免资源泄露
@@ -141,6 +147,7 @@ def query_task(task_id: str) -> Dict[str, object]:
     task_status = task_data["task_status"]
     output_content = d2c_datautil.get_task_output(task_number_id) if task_status == d2c_config.TaskStatus.Successed.value else ""
     current_stage = d2c_datautil.get_task_stage(task_number_id)
+    llm_usage = task_llm_usage(task_number_id)
     return {
         "task_id": task_id,
         "page_title": task_data.get("page_title", ""),
@@ -149,6 +156,9 @@ def query_task(task_id: str) -> Dict[str, object]:
         "create_time": task_data.get("create_time").strftime("%Y-%m-%d %H:%M:%S") if task_data.get("create_time") else "",
         "output_code": output_content,
         "stage_msg": d2c_msg.get_last_stage_message(current_stage),
+        "build_queue_wait": round(d2c_datautil.get_task_build_wait(task_number_id), 3),
+        "llm_queue_wait": llm_usage["total"].get("queue_wait_seconds", 0.0),
+        "llm_usage": llm_usage,
         "msg": d2c_msg.get_msg_by_status(task_status)
     }
 
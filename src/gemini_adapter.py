@@ -67,7 +67,8 @@ def restore_thought_signatures(messages: List[AnyMessage]) -> List[AnyMessage]:
                 for tool_call in tool_calls:
                     if isinstance(tool_call, dict):
                         tool_call_id = tool_call.get("id", "")
-                        if tool_call_id in signatures:
+                        # Already restored on an earlier turn: the agent resends the whole history every turn
+                        if tool_call_id in signatures and tool_call.get("signature") != signatures[tool_call_id]:
                             tool_call["signature"] = signatures[tool_call_id]
                             restored_count += 1
                 if restored_count > 0:
@@ -1,18 +1,31 @@
-from typing import Union, List, Dict, Type
+from typing import Union, List, Dict, Type, Optional
 from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_core.messages import AIMessage, AnyMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from pydantic.v1 import BaseModel
 from gemini_adapter import extract_and_store_thought_signatures, restore_thought_signatures
 
 
+def model_cache_identity(model) -> dict:
+    """The model options that change the response, used as part of the LLM response cache key."""
+    return {
+        "model": getattr(model, "model_name", None) or getattr(model, "model", None),
+        "temperature": getattr(model, "temperature", None),
+        "max_tokens": getattr(model, "max_tokens", None),
+    }
+
+
 class Gemini3Wrapper(Runnable):
     """Wrapper to automatically handle thoughtSignature persistence."""
-    def __init__(self, model):
+    def __init__(self, model, cache_identity: Optional[dict] = None):
         self.model = model
+        # Describes model, tools and output schema, see utils.llm_response_cache
+        self.cache_identity = cache_identity or model_cache_identity(model)
 
-    def bind_tools(self, *args, **kwargs):
+    def bind_tools(self, tools, **kwargs):
         """Supports bind_tools, returns the wrapped self."""
-        return Gemini3Wrapper(self.model.bind_tools(*args, **kwargs))
+        cache_identity = dict(self.cache_identity, tools=[convert_to_openai_tool(t) for t in tools], tool_options=kwargs)
+        return Gemini3Wrapper(self.model.bind_tools(tools, **kwargs), cache_identity)
 
     def with_structured_output(self, schema: Union[Dict, Type[BaseModel]], **kwargs):
         """
@@ -30,8 +43,10 @@ class Gemini3Wrapper(Runnable):
         # so the extract step is not needed.
         
         class StructuredOutputWrapper(Runnable):
-            def __init__(self, chain):
+            def __init__(self, chain, structured_schema, cache_identity):
                 self.chain = chain
+                self.structured_schema = structured_schema
+                self.cache_identity = cache_identity
                 
             def invoke(self, input, config=None, **kwargs):
                 # Restore: Restore signature before sending
@@ -55,7 +70,9 @@ class Gemini3Wrapper(Runnable):
                     
                 return await self.chain.ainvoke(input, config=config, **kwargs)
 
-        return StructuredOutputWrapper(structured_chain)
+        output_schema = schema.schema() if hasattr(schema, "schema") and callable(schema.schema) else schema
+        cache_identity = dict(self.cache_identity, output_schema=output_schema, structured_options=kwargs)
+        return StructuredOutputWrapper(structured_chain, schema, cache_identity)
 
     async def ainvoke(self, input: Union[List[AnyMessage], Dict], config: RunnableConfig = None, **kwargs):
         # 1. Restore: Restore signature before sending
@@ -75,6 +92,16 @@ class Gemini3Wrapper(Runnable):
             
         return response
     
+    async def astream(self, input: Union[List[AnyMessage], Dict], config: RunnableConfig = None, **kwargs):
+        # Streaming support: restore signatures before sending; chunks are yielded as they arrive
+        if isinstance(input, dict) and "messages" in input:
+            input["messages"] = restore_thought_signatures(input["messages"])
+        elif isinstance(input, list):
+            input = restore_thought_signatures(input)
+
+        async for chunk in self.model.astream(input, config=config, **kwargs):
+            yield chunk
+
     def invoke(self, input, config=None, **kwargs):
         # Synchronous Invoke support
         messages_arg = input
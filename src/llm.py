@@ -3,10 +3,18 @@
 import openai
 import anthropic
 import base64
+import threading
+from typing import Dict, Optional, Tuple
+import httpx
 from langchain_openai import AzureChatOpenAI
 from langchain_core.rate_limiters import InMemoryRateLimiter
 from utils.llm_tools import llm_retry
+from utils.llm_scheduler import LLMRequestScheduler
+from utils.llm_router import LLMRouter
+from utils.prompt_cache import completion_token_usage, mark_cache_breakpoint
+from utils.llm_telemetry import LLMCall
 import gemini_adapter, gemini_wrapper
+import d2c_config
 from d2c_logger import tlogger
 
 def chat_to_claude(system_prompt, user_prompt):
@@ -50,23 +58,26 @@ def chat_to_claude4(system_prompt, user_prompt, ui_image_url=None):
     else:
         user_content = user_prompt
 
-    completion = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": user_content
-            }
-        ],
-        extra_headers={"X-TT-LOGID": "liaofeng"},
-        max_tokens=20000,
-        timeout=60*10,
-        temperature=0,
-    )
+    call = LLMCall(model_name)
+    with call.measure(0.0):
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_content
+                }
+            ],
+            extra_headers={"X-TT-LOGID": "liaofeng"},
+            max_tokens=20000,
+            timeout=60*10,
+            temperature=0,
+        )
+        call.usage = completion_token_usage(completion)
     return completion.choices[0].message.content
 
 
@@ -115,23 +126,26 @@ def chat_to_genimi25_pro(system_prompt, user_prompt, image_filepath:str=None):
     else:
         user_content = user_prompt
 
-    completion = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": user_content
-            }
-        ],
-        extra_headers={"X-TT-LOGID": "liaofeng"},
-        max_tokens=20000,
-        timeout=60*10,
-        temperature=0,
-    )
+    call = LLMCall(model_name)
+    with call.measure(0.0):
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_content
+                }
+            ],
+            extra_headers={"X-TT-LOGID": "liaofeng"},
+            max_tokens=20000,
+            timeout=60*10,
+            temperature=0,
+        )
+        call.usage = completion_token_usage(completion)
     return completion.choices[0].message.content
 
 
@@ -159,23 +173,26 @@ def chat_to_openai_gpt4(system_prompt, user_prompt=None, user_messages=None):
         else:
             raise Exception("user_prompt or user_messages required!")
 
-    completion = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": user_contents
-            }
-        ],
-        extra_headers={"X-TT-LOGID": "liaofeng"},
-        max_tokens=20000,
-        timeout=60*10,
-        temperature=0,
-    )
+    call = LLMCall(model_name)
+    with call.measure(0.0):
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_contents
+                }
+            ],
+            extra_headers={"X-TT-LOGID": "liaofeng"},
+            max_tokens=20000,
+            timeout=60*10,
+            temperature=0,
+        )
+        call.usage = completion_token_usage(completion)
     return completion.choices[0].message.content
 
 
@@ -185,13 +202,139 @@ def image_to_base64(image_path):
 
 
 class SafeAzureChatOpenAI(AzureChatOpenAI):
-    """Azure 版 ChatOpenAI，自动重试 429"""
-    @llm_retry
-    def _generate(self, *args, **kwargs):
-        return super()._generate(*args, **kwargs)
+    """
+    Azure 版 ChatOpenAI，自动重试 429；每次请求（包括重试）都经过配额的调度器排队，
+    需要显式标记的后端加上 prompt 缓存断点，并记录每次请求的 token、排队、延迟（utils.llm_telemetry）
+    retry_rate_limits 为 False 时 429 直接抛出：作为 LLMRouter 的后端时由路由冷却该后端并切换，见 get_stage_model
+    """
+    quota: str = "default"
+    retry_rate_limits: bool = True
+
+    def _generate(self, messages, *args, **kwargs):
+        if self.retry_rate_limits:
+            return llm_retry(self._generate_once)(messages, *args, **kwargs)
+        return self._generate_once(messages, *args, **kwargs)
+
+    async def _agenerate(self, messages, *args, **kwargs):
+        if self.retry_rate_limits:
+            return await llm_retry(self._agenerate_once)(messages, *args, **kwargs)
+        return await self._agenerate_once(messages, *args, **kwargs)
+
+    def _generate_once(self, messages, *args, **kwargs):
+        call = LLMCall(self.model_name)
+        with get_llm_scheduler(self.quota).admit() as wait, call.measure(wait):
+            result = super()._generate(self._mark_prompt_cache(messages), *args, **kwargs)
+            call.on_result(result.generations[0].message)
+        return result
+
+    async def _agenerate_once(self, messages, *args, **kwargs):
+        if self.streaming:
+            # streaming 模型的 _agenerate 内部走 _astream，排队、缓存断点和统计都由 _astream 处理
+            return await super()._agenerate(messages, *args, **kwargs)
+        call = LLMCall(self.model_name)
+        async with get_llm_scheduler(self.quota).aadmit() as wait:
+            with call.measure(wait):
+                result = await super()._agenerate(self._mark_prompt_cache(messages), *args, **kwargs)
+                call.on_result(result.generations[0].message)
+        return result
+
+    async def _astream(self, messages, *args, **kwargs):
+        # 整个流持续期间占用并发名额，调用方提前退出时随流关闭释放
+        call = LLMCall(self.model_name)
+        async with get_llm_scheduler(self.quota).aadmit() as wait:
+            with call.measure(wait):
+                async for chunk in super()._astream(self._mark_prompt_cache(messages), *args, **kwargs):
+                    call.on_chunk(chunk.message)
+                    yield chunk
 
+    def _mark_prompt_cache(self, messages):
+        if self.model_name in d2c_config.LLMPromptCacheControl:
+            return mark_cache_breakpoint(messages)
+        return messages
 
-def init_gpt_gemini_model(streaming: bool = True):
+
+# ---------- 进程内共享的 LLM 客户端 ----------
+# 同一个 (quota, 参数) 只创建一个 ChatModel，所有任务共用它的连接池；
+# 同一个上游配额只有一个 rate limiter，由该配额的调度器按优先级分配令牌，并发任务的总请求速率受配额约束。
+_registry_lock = threading.Lock()
+_rate_limiters: Dict[str, InMemoryRateLimiter] = {}
+_schedulers: Dict[str, LLMRequestScheduler] = {}
+_chat_models: Dict[Tuple, SafeAzureChatOpenAI] = {}
+_http_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_gemini_patched = False
+
+
+def get_rate_limiter(quota: str) -> InMemoryRateLimiter:
+    """上游配额对应的共享 rate limiter，配额参数见 d2c_config.LLMRateLimits"""
+    with _registry_lock:
+        return _get_rate_limiter(quota)
+
+
+def _get_rate_limiter(quota: str) -> InMemoryRateLimiter:
+    if quota not in _rate_limiters:
+        limits = d2c_config.LLMRateLimits.get(quota, d2c_config.LLMRateLimits["default"])
+        _rate_limiters[quota] = InMemoryRateLimiter(
+            requests_per_second=limits["requests_per_second"],
+            check_every_n_seconds=0.05,
+            max_bucket_size=limits["max_bucket_size"],
+        )
+        tlogger().info(f"llm rate limiter for {quota}: {limits}")
+    return _rate_limiters[quota]
+
+
+def get_llm_scheduler(quota: str) -> LLMRequestScheduler:
+    with _registry_lock:
+        if quota not in _schedulers:
+            _schedulers[quota] = LLMRequestScheduler(quota, _get_rate_limiter(quota), d2c_config.LLMMaxInFlight)
+        return _schedulers[quota]
+
+
+def llm_scheduler_stats() -> Dict[str, dict]:
+    """各配额的排队深度、进行中请求数和等待时间"""
+    with _registry_lock:
+        schedulers = dict(_schedulers)
+    return {quota: scheduler.stats() for quota, scheduler in schedulers.items()}
+
+
+def _get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    global _http_clients
+    if _http_clients is None:
+        limits = httpx.Limits(max_connections=d2c_config.LLMMaxConnections,
+                              max_keepalive_connections=d2c_config.LLMMaxKeepaliveConnections)
+        _http_clients = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+    return _http_clients
+
+
+def get_shared_chat_model(quota: str, **options) -> SafeAzureChatOpenAI:
+    """
+    按 (quota, options) 返回共享的 SafeAzureChatOpenAI
+    quota: 上游配额名，同一配额的所有模型共用一个 rate limiter
+    options: SafeAzureChatOpenAI 的构造参数（需可哈希）
+    """
+    key = (quota, tuple(sorted(options.items())))
+    with _registry_lock:
+        if key not in _chat_models:
+            http_client, http_async_client = _get_http_clients()
+            _chat_models[key] = SafeAzureChatOpenAI(
+                quota=quota,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                # 流式响应也返回 token 用量，用于统计前缀缓存命中
+                stream_usage=True,
+                **options,
+            )
+            tlogger().info(f"created shared llm client for {quota}: {options.get('model')}, streaming: {options.get('streaming')}")
+        return _chat_models[key]
+
+
+def _retry_options(routed: bool) -> dict:
+    """LLMRouter 的后端不重试 429（openai 客户端和 SafeAzureChatOpenAI 都不重试），第一次 429 就交给路由冷却并切换后端"""
+    if routed:
+        return {"max_retries": 0, "retry_rate_limits": False}
+    return {"max_retries": 2}
+
+
+def init_gpt_gemini_model(streaming: bool = True, routed: bool = False):
     base_url = "https://search.bytedance.net/gpt/openapi/online/v2/crawl"
     api_version = "2024-03-01-preview"
     model_name = "gemini-2.5-pro"
@@ -199,13 +342,8 @@ def init_gpt_gemini_model(streaming: bool = True):
     api_type = "azure"
     ak = "Z5Yr0stNmxF8yFfcekeRxV3dpxXhYqkz_GPT_AK"
 
-    rate_limiter = InMemoryRateLimiter(
-        requests_per_second=0.7,  # <-- Can only make a request once every 1/requests_per_second seconds!! 3 requests per minute.
-        check_every_n_seconds=0.05,  # Wake up every 100 ms to check whether allowed to make a request,
-        max_bucket_size=5,  # Controls the maximum burst size.
-    )
-
-    gemini_model = SafeAzureChatOpenAI(
+    return get_shared_chat_model(
+        model_name,
         streaming=streaming,
         azure_endpoint=base_url,
         openai_api_version=api_version,
@@ -213,32 +351,27 @@ def init_gpt_gemini_model(streaming: bool = True):
         openai_api_key=ak,
         openai_api_type=api_type,
         max_tokens=max_tokens,
-        max_retries=2,
+        **_retry_options(routed),
         temperature=0,
-        rate_limiter=rate_limiter,
     )
-    return gemini_model
 
 
-def init_gemini_chat(streaming: bool = True):
-    gemini_adapter._apply_monkey_patch()
+def init_gemini_chat(streaming: bool = True, routed: bool = False):
+    global _gemini_patched
+    with _registry_lock:
+        # 补丁只打一次，重复打会把序列化函数层层包裹
+        if not _gemini_patched:
+            gemini_adapter._apply_monkey_patch()
+            _gemini_patched = True
     base_url = "https://search.bytedance.net/gpt/openapi/online/v2/crawl"
     api_version = "2024-03-01-preview"
     model_name = "gemini-3-pro-preview-new"
     max_tokens = 16000
     api_type = "azure"
     ak = "Z5Yr0stNmxF8yFfcekeRxV3dpxXhYqkz_GPT_AK"
-    thinking_level = "high"
-    include_thoughts = True
-    temperature = 0
-
-    rate_limiter = InMemoryRateLimiter(
-        requests_per_second=0.7,  # <-- Can only make a request once every 1/requests_per_second seconds!! 3 requests per minute.
-        check_every_n_seconds=0.05,  # Wake up every 100 ms to check whether allowed to make a request,
-        max_bucket_size=5,  # Controls the maximum burst size.
-    )
 
-    gemini_model = SafeAzureChatOpenAI(
+    gemini_model = get_shared_chat_model(
+        model_name,
         streaming=streaming,
         azure_endpoint=base_url,
         openai_api_version=api_version,
@@ -246,8 +379,73 @@ def init_gemini_chat(streaming: bool = True):
         openai_api_key=ak,
         openai_api_type=api_type,
         max_tokens=max_tokens,
-        max_retries=2,
+        **_retry_options(routed),
         temperature=0,
-        rate_limiter=rate_limiter,
     )
-    return gemini_wrapper.Gemini3Wrapper(gemini_model)
\ No newline at end of file
+    return gemini_wrapper.Gemini3Wrapper(gemini_model)
+
+
+def init_claude_chat(streaming: bool = True, routed: bool = False):
+    """chat_to_claude4 的 LangChain 版本，可作为路由后端"""
+    base_url = "https://gpt-i18n.byteintl.net/gpt/openapi/online/v2/crawl"
+    api_version = "2023-07-01-preview"
+    ak = ""
+    model_name = "gcp-claude37-sonnet"
+
+    claude_model = get_shared_chat_model(
+        model_name,
+        streaming=streaming,
+        azure_endpoint=base_url,
+        openai_api_version=api_version,
+        model=model_name,
+        openai_api_key=ak,
+        openai_api_type="azure",
+        max_tokens=16000,
+        **_retry_options(routed),
+        temperature=0,
+    )
+    return gemini_wrapper.Gemini3Wrapper(claude_model)
+
+
+def init_gpt4_chat(streaming: bool = True, routed: bool = False):
+    """chat_to_openai_gpt4 的 LangChain 版本，可作为路由后端"""
+    base_url = "https://gpt-i18n.byteintl.net/gpt/openapi/online/v2/crawl"
+    api_version = "2023-07-01-preview"
+    ak = ""
+    model_name = "gpt-4.1-2025-04-14"
+
+    gpt_model = get_shared_chat_model(
+        model_name,
+        streaming=streaming,
+        azure_endpoint=base_url,
+        openai_api_version=api_version,
+        model=model_name,
+        openai_api_key=ak,
+        openai_api_type="azure",
+        max_tokens=16000,
+        **_retry_options(routed),
+        temperature=0,
+    )
+    return gemini_wrapper.Gemini3Wrapper(gpt_model)
+
+
+# 可互换的路由后端：后端名 -> 工厂函数(streaming, routed)，都返回带 bind_tools / with_structured_output 的 Runnable
+LLM_BACKENDS = {
+    "gemini-3-pro-preview-new": init_gemini_chat,
+    "gemini-2.5-pro": lambda streaming=True, routed=False: gemini_wrapper.Gemini3Wrapper(
+        init_gpt_gemini_model(streaming, routed)),
+    "gcp-claude37-sonnet": init_claude_chat,
+    "gpt-4.1-2025-04-14": init_gpt4_chat,
+}
+
+
+def get_stage_model(stage: str, streaming: bool = False):
+    """
+    阶段使用的模型：只配置了一个后端且不对冲时直接返回该后端，否则返回在这些后端之间路由的 LLMRouter
+    后端列表见 d2c_config.LLMStageBackends
+    """
+    names = d2c_config.LLMStageBackends.get(stage, d2c_config.LLMStageBackends["default"])
+    # 对冲可以发给同一个后端，所以配置了对冲的阶段总是走路由
+    if len(names) == 1 and stage not in d2c_config.LLMHedging:
+        return LLM_BACKENDS[names[0]](streaming)
+    return LLMRouter(stage, [(name, LLM_BACKENDS[name](streaming, routed=True)) for name in names])
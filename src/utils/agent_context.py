@@ -0,0 +1,114 @@
+"""
+react agent 的上下文压缩（create_react_agent 的 pre_model_hook）。
+
+bugfix 每一轮都把完整的对话发给模型，read_file 每次返回整份 Greeting.kt，轮数越多请求越大、越慢，最后超出上下文。
+每次调用模型之前，对要发送的消息做压缩，图的 state 保持不变：
+- 同一个文件再次读取时，与上一次完整读取的内容相比改动不大，就只发 diff；改动大则发完整内容，更早的那次读取只留一句说明
+- 最近 AgentContextKeepRecentToolResults 个之外的工具结果截断到 AgentContextToolResultMaxChars（作为 diff 基准的读取除外）
+- 总字符数仍超过 AgentContextMaxChars 时，从最早的一轮工具调用开始整轮丢弃（AIMessage 和它的 ToolMessage 一起），
+  保留第一条用户消息，最近一轮不丢
+"""
+import difflib
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+import d2c_config
+from d2c_logger import tlogger
+
+READ_TOOLS = {"read_file"}
+
+
+# ---------- 公共 API ----------
+def compact_messages(messages: List[AnyMessage]) -> List[AnyMessage]:
+    """返回压缩后的消息列表，不修改传入的消息"""
+    head, turns = _split_turns(messages)
+    dropped = 0
+    compacted = head + _compact_tool_results([m for turn in turns for m in turn])
+    # 最近一轮总是保留，模型需要看到最新的工具结果
+    while _size(compacted) > d2c_config.AgentContextMaxChars and len(turns) - dropped > 1:
+        dropped += 1
+        note = HumanMessage(content=f"[{dropped} earlier tool call rounds are omitted to keep the context short, "
+                                    f"read the files again if needed]")
+        compacted = head + [note] + _compact_tool_results([m for turn in turns[dropped:] for m in turn])
+    if dropped:
+        tlogger().info(f"agent context: dropped {dropped} of {len(turns)} tool call rounds, size: {_size(compacted)}")
+    return compacted
+
+
+def compaction_hook(state: dict) -> dict:
+    """create_react_agent 的 pre_model_hook，只改变发给模型的消息"""
+    return {"llm_input_messages": compact_messages(state["messages"])}
+
+
+# ---------- 内部 ----------
+def _size(messages: List[AnyMessage]) -> int:
+    return sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+
+
+def _split_turns(messages: List[AnyMessage]) -> Tuple[List[AnyMessage], List[List[AnyMessage]]]:
+    """第一条 AIMessage 之前的消息（用户的任务）和之后的轮次：每轮是一条 AIMessage 加上它的 ToolMessage"""
+    first_ai = next((i for i, m in enumerate(messages) if isinstance(m, AIMessage)), len(messages))
+    turns: List[List[AnyMessage]] = []
+    for message in messages[first_ai:]:
+        if isinstance(message, ToolMessage) and turns:
+            turns[-1].append(message)
+        else:
+            turns.append([message])
+    return messages[:first_ai], turns
+
+
+def _tool_call_args(messages: List[AnyMessage]) -> Dict[str, Tuple[str, dict]]:
+    calls = {}
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            calls[tool_call["id"]] = (tool_call["name"], tool_call.get("args") or {})
+    return calls
+
+
+def _read_path(call: Optional[Tuple[str, dict]]) -> Optional[str]:
+    if not call or call[0] not in READ_TOOLS:
+        return None
+    return call[1].get("abs_path") or call[1].get("file_path")
+
+
+def _compact_tool_results(messages: List[AnyMessage]) -> List[AnyMessage]:
+    calls = _tool_call_args(messages)
+    tool_indexes = [i for i, m in enumerate(messages) if isinstance(m, ToolMessage)]
+    keep = d2c_config.AgentContextKeepRecentToolResults
+    recent = set(tool_indexes[-keep:]) if keep else set()
+    contents: Dict[int, str] = {}
+    bases: Dict[str, int] = {}          # 文件路径 -> 作为 diff 基准的完整读取
+    diffs: Dict[str, List[int]] = {}    # 文件路径 -> 相对当前基准的 diff
+    for index in tool_indexes:
+        message = messages[index]
+        path = _read_path(calls.get(message.tool_call_id))
+        if path is None or not isinstance(message.content, str) or message.status == "error":
+            continue
+        base = bases.get(path)
+        if base is not None:
+            base_content = messages[base].content
+            if base_content == message.content:
+                contents[index] = f"[{path} is unchanged since the earlier read_file result]"
+                continue
+            diff = "\n".join(difflib.unified_diff(base_content.splitlines(), message.content.splitlines(),
+                                                  "earlier read", "current", lineterm=""))
+            if len(diff) <= d2c_config.AgentContextDiffMaxRatio * len(message.content):
+                contents[index] = f"[{path} changed since the earlier read_file result, unified diff:]\n{diff}"
+                diffs.setdefault(path, []).append(index)
+                continue
+            # 改动太大，换成新的基准，旧基准和基于它的 diff 都已过时
+            for outdated in [base] + diffs.pop(path, []):
+                contents[outdated] = f"[outdated content of {path}, it is read again below]"
+        bases[path] = index
+    protected = set(bases.values())
+    compacted = list(messages)
+    for index in tool_indexes:
+        content = contents.get(index, messages[index].content)
+        if index not in recent and index not in protected and isinstance(content, str) \
+                and len(content) > d2c_config.AgentContextToolResultMaxChars:
+            content = (content[:d2c_config.AgentContextToolResultMaxChars]
+                       + f"\n[... {len(content) - d2c_config.AgentContextToolResultMaxChars} characters of an older tool result truncated]")
+        if content is not messages[index].content:
+            compacted[index] = messages[index].model_copy(update={"content": content})
+    return compacted
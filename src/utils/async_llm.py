@@ -0,0 +1,35 @@
+"""
+进程内共享的 LLM 事件循环：工作线程把协程提交到同一个事件循环，大量并发的 LLM 请求只占用一个线程，
+不再需要每个请求一个线程。
+"""
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+from d2c_logger import bind_async_task_context, logger_task_id
+
+_loop_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_llm_event_loop() -> asyncio.AbstractEventLoop:
+    """后台线程里常驻的事件循环，第一次调用时启动"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm_event_loop", daemon=True).start()
+        return _loop
+
+
+async def _with_task_context(task_id: int, coro: Coroutine) -> Any:
+    bind_async_task_context(task_id)
+    return await coro
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    在共享事件循环中执行协程并等待结果（在工作线程中调用），协程沿用调用线程的任务上下文
+    """
+    future = asyncio.run_coroutine_threadsafe(_with_task_context(logger_task_id(), coro), get_llm_event_loop())
+    return future.result(timeout)
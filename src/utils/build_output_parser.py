@@ -0,0 +1,149 @@
+"""
+把 Gradle/Kotlin/Paparazzi 的构建输出解析成结构化诊断（文件、行、列、信息），去重、排序后压缩成简短列表交给 bugfix，
+避免把整段嘈杂的 Gradle 输出塞进 prompt。
+"""
+import os
+import re
+from typing import List, Optional
+
+import d2c_config
+
+# e: file:///path/Greeting.kt:12:5 Unresolved reference: foo      (KGP 1.8+)
+KOTLIN_GRADLE_PATTERN = re.compile(r"^([ew]): (?:file://)?(/[^:]+\.kts?):(\d+):(\d+) (.+)$")
+# e: /path/Greeting.kt: (12, 5): Unresolved reference: foo         (旧版 KGP)
+KOTLIN_LEGACY_PATTERN = re.compile(r"^([ew]): (/[^:]+\.kts?): \((\d+), (\d+)\): (.+)$")
+# /path/Greeting.kt:12:5: error: Unresolved reference: foo        (kotlinc 命令行 / 编译服务)
+KOTLINC_PATTERN = re.compile(r"^(?:file://)?(/[^:]+\.kts?):(\d+):(\d+): (error|warning): (.+)$")
+# ResourcesTest > compose FAILED
+TEST_FAILED_PATTERN = re.compile(r"^(\S+) > (.+) FAILED$")
+STACK_FRAME_PATTERN = re.compile(r"^\s*at ([\w.$<>]+)\(([\w.]+\.kt):(\d+)\)")
+WHAT_WENT_WRONG = "* What went wrong:"
+
+
+class BuildDiagnostic:
+    """一条构建诊断"""
+
+    def __init__(self, source: str, message: str, file: Optional[str] = None,
+                 line: Optional[int] = None, column: Optional[int] = None):
+        self.source = source
+        self.message = message.strip()
+        self.file = file
+        self.line = line
+        self.column = column
+
+    def key(self):
+        return self.file, self.line, self.column, self.message
+
+    def location(self) -> str:
+        if not self.file:
+            return ""
+        parts = [self.file] + [str(v) for v in (self.line, self.column) if v is not None]
+        return ":".join(parts)
+
+    def __str__(self):
+        location = self.location()
+        return f"{location}: {self.message}" if location else self.message
+
+
+def _relative(path: str, workspace_dir: Optional[str]) -> str:
+    if workspace_dir and path.startswith(workspace_dir.rstrip("/") + "/"):
+        return os.path.relpath(path, workspace_dir)
+    return path
+
+
+def _parse_kotlin(lines: List[str], workspace_dir: Optional[str]) -> List[BuildDiagnostic]:
+    diagnostics = []
+    for line in lines:
+        line = line.rstrip()
+        match = KOTLIN_GRADLE_PATTERN.match(line) or KOTLIN_LEGACY_PATTERN.match(line)
+        if match:
+            severity, path, line_no, column, message = match.groups()
+        else:
+            match = KOTLINC_PATTERN.match(line)
+            if not match:
+                continue
+            path, line_no, column, severity, message = match.groups()
+        if severity not in ("e", "error"):
+            continue
+        diagnostics.append(BuildDiagnostic("kotlin", message, _relative(path, workspace_dir), int(line_no), int(column)))
+    return diagnostics
+
+
+def _parse_test_failures(lines: List[str]) -> List[BuildDiagnostic]:
+    """Paparazzi 截图测试失败：取异常信息和栈帧位置，优先落在 app 包里的帧，否则用第一个 Kotlin 帧"""
+    app_package = d2c_config.Package_Declaration.replace("package", "", 1).strip() + "."
+    diagnostics = []
+    for index, line in enumerate(lines):
+        match = TEST_FAILED_PATTERN.match(line.strip())
+        if not match:
+            continue
+        message, file, line_no = "", None, None
+        for detail in lines[index + 1:index + 80]:
+            if not detail.startswith((" ", "\t")):
+                break
+            frame = STACK_FRAME_PATTERN.match(detail)
+            if frame:
+                if frame.group(1).startswith(app_package):
+                    file, line_no = frame.group(2), int(frame.group(3))
+                    break
+                if file is None:
+                    file, line_no = frame.group(2), int(frame.group(3))
+            elif not message and detail.strip():
+                message = detail.strip()
+        diagnostics.append(BuildDiagnostic("paparazzi", f"{match.group(1)} > {match.group(2)} failed: {message}", file, line_no))
+    return diagnostics
+
+
+def _parse_what_went_wrong(lines: List[str]) -> List[BuildDiagnostic]:
+    diagnostics = []
+    for index, line in enumerate(lines):
+        if line.strip() != WHAT_WENT_WRONG:
+            continue
+        block = []
+        for detail in lines[index + 1:]:
+            if not detail.strip() or detail.startswith("* "):
+                break
+            block.append(detail.strip())
+        if block:
+            diagnostics.append(BuildDiagnostic("gradle", " ".join(block)))
+    return diagnostics
+
+
+def _rank(diagnostic: BuildDiagnostic):
+    # Greeting.kt 是唯一允许修改的文件，排在最前面；其次是其他源码，最后是没有位置的 Gradle 信息
+    file = diagnostic.file or ""
+    if os.path.basename(file) == "Greeting.kt":
+        group = 0
+    elif file:
+        group = 1
+    else:
+        group = 2
+    return group, file, diagnostic.line or 0, diagnostic.column or 0
+
+
+def parse_build_output(output: str, workspace_dir: Optional[str] = None) -> List[BuildDiagnostic]:
+    """解析构建输出，返回去重并排好序的诊断"""
+    lines = output.splitlines()
+    diagnostics = _parse_kotlin(lines, workspace_dir) + _parse_test_failures(lines)
+    # 只有没有具体错误时才用 Gradle 的失败摘要，它通常只是 "Compilation error. See log for more details"
+    if not diagnostics:
+        diagnostics = _parse_what_went_wrong(lines)
+    unique = {}
+    for diagnostic in diagnostics:
+        unique.setdefault(diagnostic.key(), diagnostic)
+    return sorted(unique.values(), key=_rank)
+
+
+def summarize_build_output(output: str, workspace_dir: Optional[str] = None) -> str:
+    """
+    压缩后的错误列表，每行一条；解析不出任何诊断时退回输出末尾的若干行
+    """
+    diagnostics = parse_build_output(output, workspace_dir)
+    max_items = d2c_config.BuildDiagnosticsMaxItems
+    if not diagnostics:
+        tail = [line for line in output.strip().splitlines() if line.strip()][-d2c_config.BuildOutputTailLines:]
+        return "\n".join(tail)
+    lines = [f"{index}. {diagnostic}" for index, diagnostic in enumerate(diagnostics[:max_items], start=1)]
+    if len(diagnostics) > max_items:
+        lines.append(f"... and {len(diagnostics) - max_items} more errors, fix the ones above first")
+    return "\n".join(lines)
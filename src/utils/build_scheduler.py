@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import d2c_config
+from d2c_logger import tlogger, logger_task_id
+import d2c_datautil
+
+
+def read_mem_available_mb() -> Optional[int]:
+    """主机当前可用内存(MB)，读取失败返回 None（非 Linux）"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def read_mem_total_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+class BuildScheduler:
+    """
+    按 CPU/内存预算准入构建任务（线程安全）
+    :param cpu_budget:        同时运行的构建可占用的 CPU 核数之和
+    :param memory_budget_mb:  同时运行的构建可占用的内存之和(MB)
+    :param memory_reserve_mb: 主机可用内存低于该值时不再准入新构建，即使预算还有剩余
+
+    每类构建按 d2c_config.BuildJobCost 估算资源，预算不足时排队，按先来先服务准入（大构建不会被小构建饿死）。
+    负载高时吞吐量停在预算上限，而不是同时拉起过多 JVM 导致 OOM。
+    """
+
+    def __init__(self, cpu_budget: float, memory_budget_mb: int, memory_reserve_mb: int):
+        self._cpu_budget = cpu_budget
+        self._memory_budget_mb = memory_budget_mb
+        self._memory_reserve_mb = memory_reserve_mb
+        self._cond = threading.Condition()
+        self._cpu_used = 0.0
+        self._memory_used_mb = 0
+        self._next_ticket = 0
+        self._serving_ticket = 0
+        self._running = 0
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    # ---------- 公共 API ----------
+    @contextmanager
+    def admit(self, kind: str):
+        """准入一个构建，with 块结束时释放预算"""
+        cpus, memory_mb = self._cost(kind)
+        start = time.perf_counter()
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving_ticket or not self._fits(cpus, memory_mb):
+                # 可用内存是外部状态，定时重新检查
+                self._cond.wait(timeout=1.0)
+            self._serving_ticket += 1
+            self._cpu_used += cpus
+            self._memory_used_mb += memory_mb
+            self._running += 1
+            wait = time.perf_counter() - start
+            self._admitted += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            queued = self._next_ticket - self._serving_ticket
+            self._cond.notify_all()
+        task_id = logger_task_id()
+        d2c_datautil.add_task_build_wait(task_id, wait)
+        tlogger().info(f"build {kind} admitted, queue wait: {wait:.3f}s, queued: {queued}, "
+                       f"cpu: {self._cpu_used}/{self._cpu_budget}, memory: {self._memory_used_mb}/{self._memory_budget_mb}MB")
+        try:
+            yield wait
+        finally:
+            with self._cond:
+                self._cpu_used -= cpus
+                self._memory_used_mb -= memory_mb
+                self._running -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "running": self._running,
+                "queued": self._next_ticket - self._serving_ticket,
+                "admitted": self._admitted,
+                "avg_wait_seconds": self._total_wait / self._admitted if self._admitted else 0.0,
+                "max_wait_seconds": self._max_wait,
+                "cpu_used": self._cpu_used,
+                "memory_used_mb": self._memory_used_mb,
+            }
+
+    # ---------- 内部 ----------
+    def _cost(self, kind: str) -> Tuple[float, int]:
+        cpus, memory_mb = d2c_config.BuildJobCost.get(kind, d2c_config.BuildJobCost["build"])
+        # 超过总预算的构建单独运行
+        return min(cpus, self._cpu_budget), min(memory_mb, self._memory_budget_mb)
+
+    def _fits(self, cpus: float, memory_mb: int) -> bool:
+        if self._running == 0:
+            return True
+        if self._cpu_used + cpus > self._cpu_budget or self._memory_used_mb + memory_mb > self._memory_budget_mb:
+            return False
+        available = read_mem_available_mb()
+        return available is None or available - memory_mb >= self._memory_reserve_mb
+
+
+# ---------- 进程内共享的调度器 ----------
+_scheduler_lock = threading.Lock()
+_scheduler: Optional[BuildScheduler] = None
+
+
+def get_build_scheduler() -> BuildScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            cpu_budget = d2c_config.BuildCpuBudget or os.cpu_count() or 1
+            memory_budget_mb = d2c_config.BuildMemoryBudgetMb or int((read_mem_total_mb() or 8192) * 0.8)
+            _scheduler = BuildScheduler(cpu_budget, memory_budget_mb, d2c_config.BuildMemoryReserveMb)
+            tlogger().info(f"build scheduler budget, cpu: {cpu_budget}, memory: {memory_budget_mb}MB")
+        return _scheduler
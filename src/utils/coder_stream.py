@@ -0,0 +1,207 @@
+"""
+流式生成 coder 的结构化输出：边接收边解析 compose_code，增量检查包声明和括号配对，发现问题立刻中止这次生成，
+不必等完整的响应返回后才由 is_valid_compose_code 判定失败；生成过程中的代码逐步写入 Greeting.kt。
+"""
+import threading
+from typing import Any, Optional, Type
+
+from langchain_core.runnables import Runnable
+from langchain_core.utils.json import parse_partial_json
+
+import d2c_config
+from d2c_logger import tlogger
+
+CLOSING = {")": "(", "]": "[", "}": "{"}
+OPENING = set(CLOSING.values())
+
+
+class ComposeCodeChecker:
+    """
+    增量检查生成中的 Kotlin 代码，feed 每次传入目前为止的完整代码，只扫描新增部分
+    从包声明开始扫描，跳过字符串、字符字面量和注释里的括号
+    """
+
+    # 末尾保留几个字符到下次再扫，""" 和 */ 这样的多字符记号不会被流的分段切开
+    LOOKAHEAD = 3
+
+    def __init__(self):
+        self._pos = None
+        self._stack = []
+        self._state = "code"        # code / string / raw_string / char / line_comment / block_comment
+
+    # ---------- 公共 API ----------
+    def feed(self, code: str) -> Optional[str]:
+        """返回中止原因，没有问题返回 None"""
+        if self._pos is None:
+            index = code.find(d2c_config.Package_Declaration)
+            if index < 0:
+                # 允许包声明前有少量多余内容（代码块标记、空行），coder 会裁掉
+                if len(code) > d2c_config.CoderStreamPackageWindow:
+                    return f"no package declaration in the first {d2c_config.CoderStreamPackageWindow} characters"
+                return None
+            self._pos = index
+        return self._advance(code, len(code) - self.LOOKAHEAD)
+
+    def finish(self, code: str) -> Optional[str]:
+        """生成结束时的检查：有包声明、括号闭合、有 @Preview、满足 is_valid_compose_code 的长度要求"""
+        reason = self.feed(code)
+        if reason:
+            return reason
+        if self._pos is None:
+            return "missing package declaration"
+        reason = self._advance(code, len(code))
+        if reason:
+            return reason
+        if self._stack:
+            return f"unbalanced brackets, {len(self._stack)} not closed"
+        if "@Preview" not in code:
+            return "missing @Preview"
+        if len(code.strip()) <= d2c_config.MINValidComposeCodeLength:
+            return "compose code too short"
+        return None
+
+    # ---------- 内部 ----------
+    def _advance(self, code: str, end: int) -> Optional[str]:
+        i = self._pos
+        while i < end:
+            ch, state = code[i], self._state
+            if state == "code":
+                if code.startswith("//", i):
+                    self._state, i = "line_comment", i + 2
+                    continue
+                if code.startswith("/*", i):
+                    self._state, i = "block_comment", i + 2
+                    continue
+                if code.startswith('"""', i):
+                    self._state, i = "raw_string", i + 3
+                    continue
+                if ch == '"':
+                    self._state = "string"
+                elif ch == "'":
+                    self._state = "char"
+                elif ch in OPENING:
+                    self._stack.append(ch)
+                elif ch in CLOSING:
+                    if not self._stack or self._stack[-1] != CLOSING[ch]:
+                        self._pos = i
+                        return f"unexpected '{ch}' at offset {i}"
+                    self._stack.pop()
+            elif state == "line_comment":
+                if ch == "\n":
+                    self._state = "code"
+            elif state == "block_comment":
+                if code.startswith("*/", i):
+                    self._state, i = "code", i + 2
+                    continue
+            elif state == "raw_string":
+                if code.startswith('"""', i):
+                    self._state, i = "code", i + 3
+                    continue
+            else:
+                if ch == "\\":
+                    i += 2
+                    continue
+                if ch == ('"' if state == "string" else "'"):
+                    self._state = "code"
+            i += 1
+        self._pos = max(self._pos, i)
+        return None
+
+
+class ProgressiveFile:
+    """
+    生成过程中逐步写入的文件；对冲时同一次 coder 调用有多个生成在进行，只有最先开始输出的那个写入，
+    它中止后由下一个继续
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._owner = None
+        self._written = 0
+
+    def write(self, owner: object, text: str):
+        with self._lock:
+            if self._owner is None:
+                self._owner, self._written = owner, 0
+            if self._owner is not owner or len(text) - self._written < d2c_config.CoderStreamWriteChunkChars:
+                return
+            try:
+                with open(self._path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                self._written = len(text)
+            except OSError as e:
+                tlogger().info(f"progressive write of {self._path} failed: {e}")
+
+    def release(self, owner: object):
+        with self._lock:
+            if self._owner is owner:
+                self._owner = None
+
+
+class StreamingStructuredOutput(Runnable):
+    """
+    用流式工具调用生成结构化输出的 Runnable，可以像 with_structured_output 的结果一样放进 LLMRouter
+    :param model:       后端（Gemini3Wrapper），会绑定 schema 对应的工具
+    :param schema:      pydantic 输出结构，code_field 是其中的代码字段
+    :param progressive: 生成中的代码写入的文件，None 不写
+    生成被中止、或结束时检查不通过，返回 None（与结构化输出解析失败一致），由调用方重试
+    """
+
+    def __init__(self, model, schema: Type, code_field: str = "compose_code", progressive: Optional[ProgressiveFile] = None):
+        self.model = model.bind_tools([schema], tool_choice=schema.__name__)
+        self.schema = schema
+        self.code_field = code_field
+        self.progressive = progressive
+        self.structured_schema = schema
+        self.cache_identity = dict(getattr(model, "cache_identity", {}) or {}, output_schema=schema.schema(), streaming=True)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        checker = ComposeCodeChecker()
+        owner = object()
+        args, parsed_length, code = "", 0, ""
+        try:
+            async for chunk in self.model.astream(input, config=config, **kwargs):
+                for tool_call_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+                    args += tool_call_chunk.get("args") or ""
+                # 部分 JSON 的解析是全量的，攒够一段再解析
+                if len(args) - parsed_length < d2c_config.CoderStreamParseChunkChars:
+                    continue
+                parsed_length = len(args)
+                code = (parse_partial_json(args) or {}).get(self.code_field) or ""
+                if not code:
+                    continue
+                reason = checker.feed(code)
+                if reason:
+                    # 退出 async for 会关闭流，上游停止生成
+                    tlogger().info(f"abort streaming generation after {len(code)} characters: {reason}")
+                    return None
+                if self.progressive:
+                    self.progressive.write(owner, code)
+            data = parse_partial_json(args) if args else None
+            if not data:
+                tlogger().info("streaming generation returned no tool call")
+                return None
+            code = data.get(self.code_field) or ""
+            reason = checker.finish(code)
+            if reason:
+                tlogger().info(f"streaming generation rejected: {reason}")
+                return None
+            return self.schema.parse_obj(data)
+        finally:
+            if self.progressive:
+                self.progressive.release(owner)
+
+    def invoke(self, input, config=None, **kwargs):
+        from utils.async_llm import run_async
+        return run_async(self.ainvoke(input, config, **kwargs))
+
+
+def streaming_structured_output(model: Any, schema: Type, greeting_path: Optional[str] = None):
+    """
+    model 是单个后端或 LLMRouter；路由时每个后端各自流式生成，对冲和失败切换照常工作
+    """
+    progressive = ProgressiveFile(greeting_path) if greeting_path else None
+    if hasattr(model, "map_backends"):
+        return model.map_backends(lambda backend: StreamingStructuredOutput(backend, schema, progressive=progressive))
+    return StreamingStructuredOutput(model, schema, progressive=progressive)
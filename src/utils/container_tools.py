@@ -1,8 +1,10 @@
+import fcntl
 import os
 import shutil
 import subprocess
 import hashlib
 from d2c_logger import tlogger
+from utils.gradle_tools import run_gradle
 import requests
 
 JDK_ZIP = "jdk-17.0.12.jdk.zip"
@@ -10,6 +12,9 @@ JDK_VERIFY_FILE = "jdk_md5_verify"
 JDK_TARGET_FOLDER = "/tmp"
 REPO_URL = "git@code.byted.org:ugc-android/kmp-d2c-evaluate.git"
 JDK_DOWNLOAD_URL = "https://tosv.byted.org/obj/atk/d2c/static/jdk-17.0.12.jdk.zip"
+# 主机级别的 JDK 准备：文件锁保证同一时间只有一个进程在校验/解压，完成后写入记录 md5 的标记文件
+JDK_LOCK_FILE = os.path.join(JDK_TARGET_FOLDER, ".d2c_jdk.lock")
+JDK_READY_MARKER = os.path.join(JDK_TARGET_FOLDER, ".d2c_jdk_ready")
 
 
 def md5_of_file(file_path: str) -> str:
@@ -34,13 +39,14 @@ def unzip_jdk(jdk_zip_path: str):
         raise FileNotFoundError(f"JDK zip file not found: {jdk_zip_path}")
     
     jdk_folder = jdk_zip_path.removesuffix('.zip')
-    unzip_command = ["unzip", "-oq", str(jdk_zip_path), "-d", "/tmp"]
+    unzip_command = ["unzip", "-oq", str(jdk_zip_path), "-d", JDK_TARGET_FOLDER]
     run_cmd(unzip_command)
     tlogger().info(f"Successfully unzipped JDK to: {jdk_folder}")
 
 
-def download_jdk(workspace_directory: str):
-    download_path = os.path.join(workspace_directory, JDK_ZIP)
+def download_jdk(jdk_target_path: str):
+    """下载到临时文件，校验大小后再替换，中途失败不会留下半个 zip"""
+    download_path = f"{jdk_target_path}.part"
     os.makedirs(JDK_TARGET_FOLDER, exist_ok=True)
     headers = {
         "Accept-Encoding": "identity",
@@ -63,37 +69,86 @@ def download_jdk(workspace_directory: str):
         actual_size = os.path.getsize(download_path)
         if total and actual_size != total:
             raise RuntimeError(f"Size mismatch: {actual_size} != {total}")
-        md5 = hashlib.md5(open(download_path, 'rb').read()).hexdigest()
-        tlogger().info(f"Downloaded {download_path}, size={actual_size}, MD5={md5}")
-        shutil.copy(download_path, os.path.join(JDK_TARGET_FOLDER, JDK_ZIP))
+        tlogger().info(f"Downloaded {download_path}, size={actual_size}")
+        os.replace(download_path, jdk_target_path)
     tlogger().info("JDK downloaded successfully (original bytes preserved)")
 
 
+def _jdk_ready(expected_md5_value: str) -> bool:
+    jdk_folder = os.path.join(JDK_TARGET_FOLDER, JDK_ZIP).removesuffix('.zip')
+    if not os.path.isfile(JDK_READY_MARKER) or not os.path.isdir(jdk_folder):
+        return False
+    with open(JDK_READY_MARKER) as f:
+        return f.read().strip() == expected_md5_value
+
+
 def prepare_jdk(workspace_directory: str):
+    """
+    每台主机只校验、解压一次 JDK。标记文件记录已解压 JDK 的 md5，与仓库的 jdk_md5_verify 一致时直接返回，
+    不再对 zip 重新算 md5 和解压；仓库升级 JDK 后 md5 变化会重新准备。
+    """
     md5_verify_path = os.path.join(workspace_directory, JDK_VERIFY_FILE)
     if not os.path.exists(md5_verify_path):
         raise FileNotFoundError(f"{md5_verify_path} not found in repo")
     expected_md5_value = open(md5_verify_path).read().strip()
-    jdk_target_path = os.path.join(JDK_TARGET_FOLDER, JDK_ZIP)
-    if os.path.exists(jdk_target_path):
-        jdk_md5_value = md5_of_file(jdk_target_path)
-        if expected_md5_value == jdk_md5_value:
+    if _jdk_ready(expected_md5_value):
+        return
+    os.makedirs(JDK_TARGET_FOLDER, exist_ok=True)
+    with open(JDK_LOCK_FILE, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # 等锁期间可能已经被其他任务准备好
+            if _jdk_ready(expected_md5_value):
+                return
+            jdk_target_path = os.path.join(JDK_TARGET_FOLDER, JDK_ZIP)
+            if os.path.exists(jdk_target_path):
+                jdk_md5_value = md5_of_file(jdk_target_path)
+                if expected_md5_value != jdk_md5_value:
+                    tlogger().info(f"jdk file check failed, md5 of exist file is: {jdk_md5_value}, expect {expected_md5_value}")
+                    download_jdk(jdk_target_path)
+            else:
+                tlogger().info(f"jdk file not exist, dowoload from cdn")
+                download_jdk(jdk_target_path)
+            jdk_md5_value = md5_of_file(jdk_target_path)
+            if expected_md5_value != jdk_md5_value:
+                raise RuntimeError(f"downloaded jdk md5 mismatch: {jdk_md5_value} != {expected_md5_value}")
+            if os.path.exists(JDK_READY_MARKER):
+                os.remove(JDK_READY_MARKER)
             unzip_jdk(jdk_target_path)
-            return
-        else:
-            tlogger().info(f"jdk file check failed, md5 of exist file is: {jdk_md5_value}, expect {expected_md5_value}")
-    else:
-        tlogger().info(f"jdk file not exist, dowoload from cdn")
-    download_jdk(workspace_directory)
-    unzip_jdk(jdk_target_path)
+            with open(f"{JDK_READY_MARKER}.tmp", "w") as f:
+                f.write(expected_md5_value)
+            os.replace(f"{JDK_READY_MARKER}.tmp", JDK_READY_MARKER)
+            tlogger().info(f"jdk provisioned on host, md5: {expected_md5_value}")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 
 def prepare_container(workspace_directory: str):
-    clone_command = ["git", "clone", "--depth", "1", REPO_URL, workspace_directory]
-    run_cmd(clone_command, cwd=workspace_directory)
+    # 任务恢复时工作区已经克隆过，直接复用，保留已导出的 icon 和 .d2c 中间状态
+    if os.path.isdir(os.path.join(workspace_directory, ".git")):
+        tlogger().info(f"workspace already cloned, reuse: {workspace_directory}")
+    else:
+        clone_command = ["git", "clone", "--depth", "1", REPO_URL, workspace_directory]
+        run_cmd(clone_command, cwd=workspace_directory)
     prepare_jdk(workspace_directory)
 
 
+def warm_up_gradle(workspace_directory: str):
+    """执行一次完整构建，下载依赖并生成基准截图，之后的编译只做增量工作"""
+    result = run_gradle(workspace_directory, ["updateDebugScreenshotTest"], kind="warm_up")
+    if result.returncode != 0:
+        raise Exception(f"Failed to run gradlew command: {result.stderr}")
+
+
+def reset_workspace(workspace_directory: str):
+    """
+    把用过的工作区恢复到克隆时的状态：丢弃改动和任务分支，删除未跟踪文件（生成的代码、icon、.d2c）。
+    不加 -x，保留被忽略的构建产物，复用后仍是热的。
+    """
+    run_cmd(["git", "checkout", "-f", "--detach", "origin/HEAD"], cwd=workspace_directory)
+    run_cmd(["git", "clean", "-fd"], cwd=workspace_directory)
+
+
 if __name__ == "__main__":
     prepare_container("/Users/bytedance/")
 
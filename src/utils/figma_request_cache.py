@@ -39,16 +39,18 @@ def write_json_cache(file_key: str, node_id: str, data: Dict[str, Any]) -> None:
 
 
 # ------------- 缓存工具 -------------
-def image_json_cache_path(file_key: str, root_node_id: str) -> str:
-    return f"{cache_dir}/{file_key}_image_link_cache_{root_node_id}.json"
+def image_json_cache_path(file_key: str, root_node_id: str, image_format: str = "png") -> str:
+    # png 沿用旧文件名，其他格式（svg）单独缓存，避免同一节点不同格式的链接互相覆盖
+    suffix = "" if image_format == "png" else f"_{image_format}"
+    return f"{cache_dir}/{file_key}_image_link_cache_{root_node_id}{suffix}.json"
 
 
 def read_image_json_cache(file_key: str, root_node_id: str,
-                          needed_nodes: Set[str]) -> Optional[Dict[str, str]]:
+                          needed_nodes: Set[str], image_format: str = "png") -> Optional[Dict[str, str]]:
     """
     返回 needed_nodes 对应的 images 字段 dict；缓存必须包含所有 needed_nodes 且值不为 null 才算命中
     """
-    path = image_json_cache_path(file_key, root_node_id)
+    path = image_json_cache_path(file_key, root_node_id, image_format)
     if not os.path.isfile(path):
         tlogger().info(f"link cache file {path} for figma not exist")
         return None
@@ -73,9 +75,10 @@ def read_image_json_cache(file_key: str, root_node_id: str,
     return None
 
 
-def write_image_json_cache(file_key: str, root_node_id: str, new_images: Dict[str, str]) -> None:
+def write_image_json_cache(file_key: str, root_node_id: str, new_images: Dict[str, str],
+                           image_format: str = "png") -> None:
     """增量合并并落盘；失败不抛"""
-    path = image_json_cache_path(file_key, root_node_id)
+    path = image_json_cache_path(file_key, root_node_id, image_format)
     try:
         # 读旧缓存
         old = {}
@@ -0,0 +1,205 @@
+import os
+import re
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+import d2c_config
+from d2c_logger import tlogger
+from utils.build_scheduler import get_build_scheduler
+from utils.sandbox_runner import SandboxResult, cgroup_available, run_sandboxed
+
+# 出现这些输出说明 daemon 本身出了问题，需要回收
+DAEMON_UNHEALTHY_PATTERNS = [
+    "Gradle build daemon disappeared unexpectedly",
+    "Could not connect to the Gradle daemon",
+    "Could not receive a message from the daemon",
+    "java.lang.OutOfMemoryError",
+    "Timeout waiting to lock",
+]
+DAEMON_STATUS_PATTERN = re.compile(r"^\s*(\d+)\s+(IDLE|BUSY|STOPPED|STOPPING|CANCELED)\b", re.MULTILINE)
+
+
+class GradleDaemonManager:
+    """
+    所有工作区共享的 Gradle daemon 管理（线程安全）
+    :param max_concurrent_builds:  同时执行的构建数，也就是常驻 daemon 的数量上限
+    :param max_builds:             累计构建次数达到后回收 daemon，避免长期运行的内存膨胀
+    :param health_check_interval:  空闲时执行 gradlew --status 健康检查的最小间隔(秒)
+
+    所有构建使用同一个 GRADLE_USER_HOME，依赖缓存、本地 build cache 和 daemon 在工作区之间复用，
+    只有第一次构建需要付出 JVM 启动和依赖解析的开销。
+    回收（gradlew --stop）会停掉该 GRADLE_USER_HOME 下的所有 daemon，所以先阻止新构建开始，
+    等进行中的构建结束后再执行。健康检查和回收在 self._cond 之外执行，期间 _maintaining 阻止新构建开始，
+    结束的构建不会被它们卡住。
+    """
+
+    def __init__(self, max_concurrent_builds: int, max_builds: int, health_check_interval: float):
+        self._slots = threading.BoundedSemaphore(max_concurrent_builds)
+        self._max_concurrent_builds = max_concurrent_builds
+        self._max_builds = max_builds
+        self._health_check_interval = health_check_interval
+        self._cond = threading.Condition()
+        self._running = 0
+        self._builds = 0
+        self._recycle_requested = False
+        self._maintaining = False
+        self._last_health_check = time.time()
+
+    # ---------- 公共 API ----------
+    def env(self) -> dict:
+        env = dict(os.environ)
+        if d2c_config.GradleUserHome:
+            env["GRADLE_USER_HOME"] = d2c_config.GradleUserHome
+        return env
+
+    def command(self, tasks: List[str], configuration_cache: bool = True) -> List[str]:
+        # 共享 daemon 不在构建的 cgroup 里，开启 cgroup 限制时每次构建使用独立的构建进程
+        daemon = "--no-daemon" if self._cgroup_root() else "--daemon"
+        command = ["./gradlew", *tasks, daemon, "--build-cache"]
+        if not configuration_cache:
+            command.append("--no-configuration-cache")
+        elif d2c_config.GradleConfigurationCache:
+            command += ["--configuration-cache", "--configuration-cache-problems=warn"]
+        return command
+
+    def run(self, workspace_dir: str, tasks: List[str], configuration_cache: bool = True,
+            kind: str = "build") -> SandboxResult:
+        """
+        在 workspace_dir 执行 gradle 任务（可以带 --offline 等参数），返回 SandboxResult，由调用方判断 returncode
+        :param configuration_cache: 执行期访问 project 的任务（如 init script 注册的任务）需要关闭配置缓存
+        :param kind: 构建类型，构建调度器按它估算 CPU/内存占用，沙箱按它决定超时和 cgroup 限制
+        """
+        timeout = d2c_config.GradleTimeoutSeconds.get(kind, d2c_config.GradleTimeoutSeconds["build"])
+        cpus, memory_mb = d2c_config.BuildJobCost.get(kind, d2c_config.BuildJobCost["build"])
+        # 先拿 daemon 名额，等名额的构建不占用调度器的 CPU/内存预算
+        with self._slots, get_build_scheduler().admit(kind):
+            self._before_build(workspace_dir)
+            result = None
+            try:
+                result = run_sandboxed(self.command(tasks, configuration_cache), cwd=workspace_dir, env=self.env(),
+                                       timeout=timeout, cpus=cpus,
+                                       memory_mb=int(memory_mb * d2c_config.GradleSandboxMemoryHeadroom),
+                                       cgroup_root=self._cgroup_root())
+                usage = ", ".join(f"{k}: {v:.1f}" for k, v in result.usage.items())
+                tlogger().info(f"gradle {kind} finished in {result.wall_seconds:.1f}s, returncode: {result.returncode}, "
+                               f"timed out: {result.timed_out}, {usage}")
+            finally:
+                self._after_build(workspace_dir, result)
+        return result
+
+    def request_recycle(self):
+        with self._cond:
+            self._recycle_requested = True
+
+    # ---------- 内部 ----------
+    @staticmethod
+    def _cgroup_root() -> Optional[str]:
+        root = d2c_config.GradleSandboxCgroupRoot
+        if root and cgroup_available(root):
+            return root
+        return None
+
+    def _before_build(self, workspace_dir: str):
+        maintained = False
+        while True:
+            with self._cond:
+                while self._maintaining or (self._recycle_requested and self._running > 0):
+                    self._cond.wait()
+                if self._recycle_requested:
+                    action = "recycle"
+                elif not maintained and self._running == 0 \
+                        and time.time() - self._last_health_check > self._health_check_interval:
+                    action = "health_check"
+                else:
+                    self._running += 1
+                    return
+                self._maintaining = True
+            self._maintain(action, workspace_dir)
+            # 健康检查或回收之后直接开始这次构建
+            maintained = True
+
+    def _after_build(self, workspace_dir: str, result: Optional[SandboxResult]):
+        with self._cond:
+            self._running -= 1
+            self._builds += 1
+            if self._builds >= self._max_builds:
+                tlogger().info(f"gradle daemons served {self._builds} builds, recycle")
+                self._recycle_requested = True
+            output = f"{result.stdout}\n{result.stderr}" if result else ""
+            pattern = next((p for p in DAEMON_UNHEALTHY_PATTERNS if p in output), None)
+            if pattern:
+                tlogger().info(f"gradle daemon unhealthy: {pattern}, recycle")
+                self._recycle_requested = True
+            if result and result.timed_out:
+                # 客户端被杀后 daemon 里可能还留着这次构建，回收掉
+                tlogger().info("gradle build timed out, recycle")
+                self._recycle_requested = True
+            recycle = self._recycle_requested and self._running == 0 and not self._maintaining
+            if recycle:
+                self._maintaining = True
+            self._cond.notify_all()
+        if recycle:
+            self._maintain("recycle", workspace_dir)
+
+    def _maintain(self, action: str, workspace_dir: str):
+        """调用方已在 self._cond 内设置 _maintaining，这里不持有锁执行 gradlew，结束后清除标记"""
+        healthy = True
+        try:
+            if action == "health_check":
+                healthy = self._is_healthy(workspace_dir)
+            else:
+                self._recycle(workspace_dir)
+        finally:
+            with self._cond:
+                self._maintaining = False
+                self._last_health_check = time.time()
+                if action == "recycle":
+                    self._builds = 0
+                    self._recycle_requested = False
+                elif not healthy:
+                    self._recycle_requested = True
+                self._cond.notify_all()
+
+    def _is_healthy(self, workspace_dir: str) -> bool:
+        try:
+            result = subprocess.run(["./gradlew", "--status"], cwd=workspace_dir, env=self.env(),
+                                    capture_output=True, text=True, timeout=d2c_config.GradleTimeoutSeconds["status"])
+        except subprocess.TimeoutExpired:
+            tlogger().info("gradle --status timed out")
+            return False
+        if result.returncode != 0:
+            tlogger().info(f"gradle --status failed: {result.stderr}")
+            return False
+        daemons = DAEMON_STATUS_PATTERN.findall(result.stdout)
+        tlogger().info(f"gradle daemons: {daemons}")
+        # 空闲时还有 BUSY 的是卡住的 daemon，数量超过并发上限说明有 daemon 泄露
+        if any(status == "BUSY" for _, status in daemons) or len(daemons) > self._max_concurrent_builds:
+            return False
+        return True
+
+    def _recycle(self, workspace_dir: str):
+        """由 _maintain 调用，没有进行中的构建"""
+        result = run_sandboxed(["./gradlew", "--stop"], cwd=workspace_dir, env=self.env(),
+                               timeout=d2c_config.GradleTimeoutSeconds["status"])
+        tlogger().info(f"gradle daemons recycled after {self._builds} builds, returncode: {result.returncode}")
+
+
+# ---------- 进程内共享的 daemon 管理 ----------
+_manager_lock = threading.Lock()
+_manager: Optional[GradleDaemonManager] = None
+
+
+def get_gradle_manager() -> GradleDaemonManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = GradleDaemonManager(d2c_config.GradleMaxConcurrentBuilds, d2c_config.GradleDaemonMaxBuilds,
+                                           d2c_config.GradleDaemonHealthCheckSeconds)
+        return _manager
+
+
+def run_gradle(workspace_dir: str, tasks: List[str], configuration_cache: bool = True,
+               kind: str = "build") -> SandboxResult:
+    return get_gradle_manager().run(workspace_dir, tasks, configuration_cache, kind)
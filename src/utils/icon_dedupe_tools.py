@@ -0,0 +1,232 @@
+"""
+对同一任务导出的 icon 去重：先按内容 sha256 精确去重，再对 png 做感知哈希（dHash）近似去重。
+png 解码为纯 Python 实现，只用于计算哈希，不依赖 Pillow。
+"""
+import hashlib
+import os
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import d2c_config
+from d2c_logger import tlogger
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# color type -> 每个像素的通道数
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+class IconFingerprint:
+    """单个 icon 文件的指纹"""
+
+    def __init__(self, rel_path: str, digest: str, width: int = 0, height: int = 0,
+                 phash: Optional[int] = None, mean_color: Optional[Tuple[float, float, float, float]] = None):
+        self.rel_path = rel_path
+        self.digest = digest
+        self.width = width
+        self.height = height
+        self.phash = phash
+        self.mean_color = mean_color
+
+
+# ---------- png 解码 ----------
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def decode_png_rgba(content: bytes) -> Optional[Tuple[int, int, List[Tuple[int, int, int, int]]]]:
+    """
+    解码 png 为 (width, height, rgba 像素列表)。
+    只支持非隔行扫描、8/16 位深的 png（Figma 导出的 png 都满足），其他格式返回 None。
+    """
+    if not content.startswith(PNG_SIGNATURE):
+        return None
+    pos = len(PNG_SIGNATURE)
+    width = height = bit_depth = color_type = interlace = 0
+    palette: List[Tuple[int, int, int]] = []
+    palette_alpha = b""
+    idat = bytearray()
+    while pos + 8 <= len(content):
+        length, chunk_type = struct.unpack(">I4s", content[pos:pos + 8])
+        data = content[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b"IHDR":
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+        elif chunk_type == b"PLTE":
+            palette = [tuple(data[i:i + 3]) for i in range(0, len(data), 3)]
+        elif chunk_type == b"tRNS":
+            palette_alpha = data
+        elif chunk_type == b"IDAT":
+            idat.extend(data)
+        elif chunk_type == b"IEND":
+            break
+    if interlace or bit_depth not in (8, 16) or color_type not in PNG_CHANNELS or not width or not height:
+        return None
+    try:
+        raw = zlib.decompress(bytes(idat))
+    except zlib.error:
+        return None
+
+    bytes_per_sample = bit_depth // 8
+    bpp = PNG_CHANNELS[color_type] * bytes_per_sample
+    stride = width * bpp
+    if len(raw) < (stride + 1) * height:
+        return None
+    pixels = []
+    previous = bytearray(stride)
+    for row in range(height):
+        offset = row * (stride + 1)
+        filter_type = raw[offset]
+        line = bytearray(raw[offset + 1:offset + 1 + stride])
+        for i in range(stride):
+            left = line[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            if filter_type == 1:
+                line[i] = (line[i] + left) & 0xFF
+            elif filter_type == 2:
+                line[i] = (line[i] + up) & 0xFF
+            elif filter_type == 3:
+                line[i] = (line[i] + ((left + up) >> 1)) & 0xFF
+            elif filter_type == 4:
+                up_left = previous[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + _paeth(left, up, up_left)) & 0xFF
+        previous = line
+        # 16 位深只取高字节
+        samples = line[::bytes_per_sample]
+        channels = PNG_CHANNELS[color_type]
+        for x in range(width):
+            px = samples[x * channels:(x + 1) * channels]
+            if color_type == 6:
+                pixels.append((px[0], px[1], px[2], px[3]))
+            elif color_type == 2:
+                pixels.append((px[0], px[1], px[2], 255))
+            elif color_type == 4:
+                pixels.append((px[0], px[0], px[0], px[1]))
+            elif color_type == 0:
+                pixels.append((px[0], px[0], px[0], 255))
+            else:
+                index = px[0]
+                if index >= len(palette):
+                    return None
+                r, g, b = palette[index]
+                pixels.append((r, g, b, palette_alpha[index] if index < len(palette_alpha) else 255))
+    return width, height, pixels
+
+
+# ---------- 感知哈希 ----------
+def dhash(width: int, height: int, pixels: List[Tuple[int, int, int, int]], hash_size: int = 8) -> int:
+    """
+    差值哈希：合成到白底后转灰度，区域平均缩放到 (hash_size+1) x hash_size，比较相邻像素亮度。
+    """
+    grid_w, grid_h = hash_size + 1, hash_size
+    sums = [0.0] * (grid_w * grid_h)
+    counts = [0] * (grid_w * grid_h)
+    for y in range(height):
+        gy = y * grid_h // height
+        for x in range(width):
+            r, g, b, a = pixels[y * width + x]
+            gray = (r * 299 + g * 587 + b * 114) / 1000
+            value = (gray * a + 255 * (255 - a)) / 255
+            cell = gy * grid_w + x * grid_w // width
+            sums[cell] += value
+            counts[cell] += 1
+    cells = [sums[i] / counts[i] if counts[i] else 255.0 for i in range(len(sums))]
+    value = 0
+    for y in range(grid_h):
+        for x in range(hash_size):
+            value = (value << 1) | (cells[y * grid_w + x] > cells[y * grid_w + x + 1])
+    return value
+
+
+def mean_color(pixels: List[Tuple[int, int, int, int]]) -> Tuple[float, float, float, float]:
+    """按 alpha 加权的平均颜色，用来区分形状相同、颜色不同的 icon"""
+    total_alpha = sum(p[3] for p in pixels) or 1
+    return (
+        sum(p[0] * p[3] for p in pixels) / total_alpha,
+        sum(p[1] * p[3] for p in pixels) / total_alpha,
+        sum(p[2] * p[3] for p in pixels) / total_alpha,
+        total_alpha / len(pixels) if pixels else 0.0,
+    )
+
+
+def fingerprint_icon(rel_path: str, content: bytes) -> IconFingerprint:
+    digest = hashlib.sha256(content).hexdigest()
+    if not rel_path.endswith(".png"):
+        return IconFingerprint(rel_path, digest)
+    decoded = decode_png_rgba(content)
+    if not decoded:
+        return IconFingerprint(rel_path, digest)
+    width, height, pixels = decoded
+    if width * height > d2c_config.IconDedupeMaxPixels:
+        return IconFingerprint(rel_path, digest, width, height)
+    return IconFingerprint(rel_path, digest, width, height, dhash(width, height, pixels), mean_color(pixels))
+
+
+def is_perceptual_duplicate(a: IconFingerprint, b: IconFingerprint) -> bool:
+    if a.phash is None or b.phash is None:
+        return False
+    # 宽高比不同不是同一个 icon
+    if abs(a.width * b.height - b.width * a.height) > 0.05 * a.width * b.height:
+        return False
+    if any(abs(ca - cb) > d2c_config.IconDedupeColorTolerance for ca, cb in zip(a.mean_color, b.mean_color)):
+        return False
+    return bin(a.phash ^ b.phash).count("1") <= d2c_config.IconDedupeHashDistance
+
+
+def dedupe_icons(workspace_dir: str, icon_list, keep_prefixes=("figma_screenshot_",)) -> Dict[str, str]:
+    """
+    对导出的 icon 去重，删除重复文件。
+    返回 {重复 icon 相对路径: 保留 icon 相对路径}。同组内保留分辨率最高的一个。
+    """
+    fingerprints: List[IconFingerprint] = []
+    for rel_path in sorted(icon_list):
+        if os.path.basename(rel_path).startswith(keep_prefixes):
+            continue
+        abs_path = os.path.join(workspace_dir, rel_path)
+        if not os.path.isfile(abs_path):
+            continue
+        with open(abs_path, "rb") as f:
+            fingerprints.append(fingerprint_icon(rel_path, f.read()))
+
+    # 分辨率高的优先作为保留项
+    fingerprints.sort(key=lambda fp: (-(fp.width * fp.height), fp.rel_path))
+    canonical: List[IconFingerprint] = []
+    aliases: Dict[str, str] = {}
+    by_digest: Dict[str, IconFingerprint] = {}
+    for fp in fingerprints:
+        keep = by_digest.get(fp.digest)
+        if keep is None:
+            keep = next((c for c in canonical if is_perceptual_duplicate(c, fp)), None)
+        if keep is None:
+            canonical.append(fp)
+            by_digest[fp.digest] = fp
+            continue
+        aliases[fp.rel_path] = keep.rel_path
+        os.remove(os.path.join(workspace_dir, fp.rel_path))
+        tlogger().info(f"dedupe icon {fp.rel_path} -> {keep.rel_path}")
+    if aliases:
+        tlogger().info(f"dedupe icons: {len(fingerprints)} -> {len(canonical)}")
+    return aliases
+
+
+def merge_icon_aliases(icon_aliases: Dict[str, str], new_aliases: Dict[str, str]) -> Dict[str, str]:
+    """
+    合并多次去重的结果，并把链式别名（A -> B，后来 B -> C）压缩成直接指向最终保留的 icon（A -> C），
+    B 的文件已经删除，不能再被引用。
+    """
+    merged = dict(icon_aliases or {})
+    merged.update(new_aliases or {})
+    return {dup: resolve_icon_alias(merged, keep) for dup, keep in merged.items()}
+
+
+def resolve_icon_alias(icon_aliases: Dict[str, str], icon: str) -> str:
+    """沿别名链找到最终保留的 icon；遇到环时停在环上第一个重复的节点"""
+    seen = {icon}
+    while icon in icon_aliases and icon_aliases[icon] not in seen:
+        icon = icon_aliases[icon]
+        seen.add(icon)
+    return icon
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from d2c_logger import tlogger
+
+# 任务工作区内存放 d2c 中间状态的目录，压缩上传时排除
+STATE_DIR = ".d2c"
+MANIFEST_FILE = "icon_export_manifest.json"
+
+
+class IconExportManifest:
+    """
+    icon 导出进度清单（线程安全），持久化在任务工作区 .d2c/icon_export_manifest.json
+    记录每个节点块的 icon 识别结果、解析好的下载计划以及已完成的下载，
+    任务重试或恢复时跳过已完成的识别和下载。
+    """
+
+    def __init__(self, workspace_directory: str):
+        self._path = os.path.join(workspace_directory, STATE_DIR, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._data = {"recognized": {}, "download_plan": None, "downloaded": []}
+        if os.path.isfile(self._path):
+            try:
+                with open(self._path, "r", encoding="utf-8") as f:
+                    self._data.update(json.load(f))
+                tlogger().info(f"load icon export manifest {self._path}, recognized blocks: {len(self._data['recognized'])}, "
+                               f"downloaded: {len(self._data['downloaded'])}")
+            except Exception as e:
+                tlogger().info(f"load icon export manifest failed, start from scratch: {e}")
+
+    # ---------- icon 识别 ----------
+    def get_recognized(self, block_node_id: str) -> Optional[List[dict]]:
+        with self._lock:
+            return self._data["recognized"].get(block_node_id)
+
+    def set_recognized(self, block_node_id: str, icons: List[dict]):
+        with self._lock:
+            self._data["recognized"][block_node_id] = icons
+            self._save()
+
+    # ---------- 下载计划 ----------
+    def get_download_plan(self, figma_nodes: Dict[str, str]) -> Optional[Dict[str, dict]]:
+        """要导出的节点与上次一致时返回保存的下载计划，否则返回 None"""
+        with self._lock:
+            saved = self._data["download_plan"]
+            if saved and saved.get("figma_nodes") == figma_nodes:
+                return saved["plan"]
+            return None
+
+    def set_download_plan(self, figma_nodes: Dict[str, str], plan: Dict[str, dict]):
+        with self._lock:
+            self._data["download_plan"] = {"figma_nodes": figma_nodes, "plan": plan}
+            self._save()
+
+    # ---------- 下载进度 ----------
+    def is_downloaded(self, rel_path: str, abs_path: str) -> bool:
+        with self._lock:
+            return rel_path in self._data["downloaded"] and os.path.isfile(abs_path)
+
+    def mark_downloaded(self, rel_paths):
+        with self._lock:
+            downloaded = set(self._data["downloaded"])
+            downloaded.update(rel_paths)
+            self._data["downloaded"] = sorted(downloaded)
+            self._save()
+
+    def _save(self):
+        """先写临时文件再替换，避免中途失败留下损坏的清单"""
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path)
+
+
+# ---------- 按工作区共享的 manifest ----------
+_manifests_lock = threading.Lock()
+_manifests: Dict[str, IconExportManifest] = {}
+
+
+def get_icon_export_manifest(workspace_directory: str) -> IconExportManifest:
+    key = os.path.abspath(workspace_directory)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = IconExportManifest(key)
+            _manifests[key] = manifest
+        return manifest
+
+
+def release_icon_export_manifest(workspace_directory: str):
+    with _manifests_lock:
+        _manifests.pop(os.path.abspath(workspace_directory), None)
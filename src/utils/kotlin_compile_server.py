@@ -0,0 +1,346 @@
+"""
+常驻的 Kotlin 编译服务：一个长期运行的 JVM 进程持有 Kotlin 编译器（K2JVMCompiler）和模板工程的编译 classpath，
+bugfix 每次修改 Greeting.kt 后只编译 app 的 main 源码，秒级返回诊断，不走完整的 Gradle 构建。
+
+- classpath、compose 编译器插件和 Kotlin 编译器 jar 通过 init script 从模板工程的 compileDebugKotlin 任务获取，
+  任务初始化工作区后在后台预热时解析，每个服务进程只解析一次，不在编译请求的临界区里
+- 最多 KotlinCompileServerProcesses 个编译进程，同时进行的检查超过这个数时排队
+- R 类不使用构建生成的 R.jar（任务中会新增 icon），而是每次按 res 目录生成 Kotlin 桩代码
+- 编译服务只用于快速反馈，最终结果仍以 Gradle 编译为准
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Set, Tuple
+
+import d2c_config
+from d2c_logger import tlogger
+from utils.container_tools import JDK_TARGET_FOLDER, JDK_ZIP
+from utils.gradle_tools import run_gradle
+from utils.build_scheduler import get_build_scheduler
+
+SERVER_CLASS = "D2CKotlinCompileServer"
+END_MARKER = "__D2C_END__"
+SERVER_SOURCE = """
+import java.io.*;
+import org.jetbrains.kotlin.cli.common.ExitCode;
+import org.jetbrains.kotlin.cli.jvm.K2JVMCompiler;
+
+public class D2CKotlinCompileServer {
+    public static void main(String[] argv) throws Exception {
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) continue;
+            ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+            PrintStream messages = new PrintStream(buffer, true, "UTF-8");
+            String code;
+            try {
+                ExitCode exit = new K2JVMCompiler().exec(messages, line.split("\\t"));
+                code = exit.name();
+            } catch (Throwable t) {
+                t.printStackTrace(messages);
+                code = "INTERNAL_ERROR";
+            }
+            out.print(buffer.toString("UTF-8"));
+            out.println();
+            out.println("__D2C_END__ " + code);
+        }
+    }
+}
+"""
+CLASSPATH_INIT_SCRIPT = """
+allprojects {
+    afterEvaluate { project ->
+        if (project.path != ":app") return
+        project.tasks.register("d2cPrintKotlinClasspath") {
+            doLast {
+                def t = project.tasks.getByName("compileDebugKotlin")
+                println "D2C_LIBRARIES=" + t.libraries.files.join(File.pathSeparator)
+                println "D2C_PLUGINS=" + t.pluginClasspath.files.join(File.pathSeparator)
+                def compiler = t.hasProperty("defaultCompilerClasspath") ? t.defaultCompilerClasspath.files : []
+                println "D2C_COMPILER=" + compiler.join(File.pathSeparator)
+                println "D2C_BOOTCLASSPATH=" + project.android.bootClasspath.join(File.pathSeparator)
+            }
+        }
+    }
+}
+"""
+# 基于文件的资源目录，目录名前缀即 R 的类型
+FILE_RESOURCE_TYPES = {"drawable", "mipmap", "layout", "raw", "font", "xml", "anim", "animator", "color", "menu", "navigation"}
+VALUE_RESOURCE_TAGS = {"string": "string", "color": "color", "dimen": "dimen", "bool": "bool", "integer": "integer",
+                       "style": "style", "plurals": "plurals", "array": "array", "string-array": "array",
+                       "integer-array": "array", "attr": "attr", "id": "id"}
+
+
+def _find_java_home() -> Optional[str]:
+    if d2c_config.KotlinCompileServerJavaHome:
+        return d2c_config.KotlinCompileServerJavaHome
+    jdk_folder = os.path.join(JDK_TARGET_FOLDER, JDK_ZIP).removesuffix(".zip")
+    for candidate in [os.environ.get("JAVA_HOME"), os.path.join(jdk_folder, "Contents/Home"), jdk_folder]:
+        if candidate and os.path.isfile(os.path.join(candidate, "bin", "javac")):
+            return candidate
+    javac = shutil.which("javac")
+    return os.path.dirname(os.path.dirname(os.path.realpath(javac))) if javac else None
+
+
+def collect_resource_names(res_directory: str) -> Dict[str, Set[str]]:
+    """按类型收集 res 目录下的资源名"""
+    resources: Dict[str, Set[str]] = {}
+    if not os.path.isdir(res_directory):
+        return resources
+    for dir_name in sorted(os.listdir(res_directory)):
+        dir_path = os.path.join(res_directory, dir_name)
+        if not os.path.isdir(dir_path):
+            continue
+        res_type = dir_name.split("-")[0]
+        for file_name in os.listdir(dir_path):
+            if res_type == "values" and file_name.endswith(".xml"):
+                try:
+                    root = ET.parse(os.path.join(dir_path, file_name)).getroot()
+                except ET.ParseError:
+                    continue
+                for element in root:
+                    value_type = element.get("type") if element.tag == "item" else VALUE_RESOURCE_TAGS.get(element.tag)
+                    if value_type and element.get("name"):
+                        resources.setdefault(value_type, set()).add(element.get("name").replace(".", "_"))
+            elif res_type in FILE_RESOURCE_TYPES:
+                resources.setdefault(res_type, set()).add(file_name.split(".")[0])
+    return resources
+
+
+def generate_r_stub(res_directory: str, package_declaration: str) -> str:
+    """生成 R 类的 Kotlin 桩代码，R.drawable.xxx 这样的引用与 Java 生成的 R 类源码兼容"""
+    lines = [package_declaration, "", "class R {"]
+    for res_type, names in sorted(collect_resource_names(res_directory).items()):
+        lines.append(f"    class {res_type} {{")
+        lines.append("        companion object {")
+        lines.extend(f"            const val `{name}`: Int = 0" for name in sorted(names))
+        lines.append("        }")
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+class _CompilerProcess:
+    """一个编译 JVM 进程，同一时间只处理一个请求"""
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.checks = 0
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+            self.process.wait()
+
+
+class KotlinCompileServer:
+    """
+    常驻 Kotlin 编译进程池（线程安全）
+    :param state_directory: 存放编译服务 helper class 的目录
+    :param max_processes:   编译进程数上限，也就是同时进行的编译数；超出的请求排队等空闲进程
+
+    classpath 每个服务只解析一次（warm_up 或第一次请求），只持有 _prepare_lock，不占用编译进程
+    """
+
+    def __init__(self, state_directory: str, max_processes: int = 1):
+        self._state_directory = state_directory
+        self._max_processes = max(1, max_processes)
+        self._prepare_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._idle: List[_CompilerProcess] = []
+        self._started = 0
+        self._libraries: List[str] = []
+        self._plugins: List[str] = []
+        self._compiler: List[str] = []
+        self._java_home: Optional[str] = None
+        self._helper_directory: Optional[str] = None
+
+    # ---------- 公共 API ----------
+    def warm_up(self, workspace_dir: str):
+        """解析 classpath、编译 helper 并启动一个编译进程，已经预热过时直接返回；失败只记录日志，请求时会再试"""
+        if self._helper_directory:
+            return
+        try:
+            self._prepare(workspace_dir)
+            self._release(self._acquire())
+            tlogger().info("kotlin compile server warmed up")
+        except Exception as e:
+            tlogger().info(f"kotlin compile server warm up failed: {e}")
+
+    def check(self, workspace_dir: str) -> Tuple[Optional[bool], str]:
+        """
+        编译 workspace_dir 的 app main 源码
+        返回 (是否通过, 诊断输出)；编译服务不可用时返回 (None, 原因)，调用方应退回 Gradle
+        """
+        try:
+            self._prepare(workspace_dir)
+            compiler = self._acquire()
+        except Exception as e:
+            tlogger().info(f"kotlin compile server unavailable: {e}")
+            return None, f"kotlin compile server unavailable: {e}"
+        exit_code = None
+        try:
+            output_directory = tempfile.mkdtemp(prefix="d2c_kotlinc_")
+            try:
+                stub_path = os.path.join(output_directory, "R.kt")
+                with open(stub_path, "w", encoding="utf-8") as f:
+                    f.write(generate_r_stub(os.path.join(workspace_dir, "app/src/main/res"), d2c_config.Package_Declaration))
+                args = self._compiler_args(workspace_dir, stub_path, output_directory)
+                with get_build_scheduler().admit("quick_compile"):
+                    exit_code, output = self._request(compiler.process, args)
+            finally:
+                shutil.rmtree(output_directory, ignore_errors=True)
+            compiler.checks += 1
+        finally:
+            if exit_code is None or compiler.checks >= d2c_config.KotlinCompileServerMaxChecks:
+                compiler.kill()
+            self._release(compiler)
+        if exit_code is None:
+            return None, output
+        # 诊断里的临时 R.kt 路径对修复没有帮助
+        output = output.replace(stub_path, "R.kt")
+        return exit_code == "OK", output.strip()
+
+    def stop(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+            self._cond.notify_all()
+        for compiler in idle:
+            compiler.kill()
+
+    # ---------- 内部 ----------
+    def _prepare(self, workspace_dir: str):
+        """解析 classpath 并编译 helper，只做一次"""
+        with self._prepare_lock:
+            if self._helper_directory:
+                return
+            if not self._compiler:
+                self._resolve_classpath(workspace_dir)
+            self._java_home = self._java_home or _find_java_home()
+            if not self._java_home:
+                raise Exception("no JDK with javac found")
+            helper_directory = os.path.join(self._state_directory, "classes")
+            if not os.path.isfile(os.path.join(helper_directory, f"{SERVER_CLASS}.class")):
+                os.makedirs(helper_directory, exist_ok=True)
+                source_path = os.path.join(self._state_directory, f"{SERVER_CLASS}.java")
+                with open(source_path, "w", encoding="utf-8") as f:
+                    f.write(SERVER_SOURCE)
+                result = subprocess.run([os.path.join(self._java_home, "bin", "javac"), "-cp", os.pathsep.join(self._compiler),
+                                         "-d", helper_directory, source_path], capture_output=True, text=True)
+                if result.returncode != 0:
+                    raise Exception(f"compile helper failed: {result.stderr}")
+            self._helper_directory = helper_directory
+
+    def _acquire(self) -> _CompilerProcess:
+        """取一个空闲的编译进程，没有空闲且未达上限时启动新进程，否则等待"""
+        with self._cond:
+            while True:
+                while self._idle:
+                    compiler = self._idle.pop()
+                    if compiler.alive():
+                        return compiler
+                    self._started -= 1
+                if self._started < self._max_processes:
+                    self._started += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._start_process()
+        except Exception:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, compiler: _CompilerProcess):
+        with self._cond:
+            if compiler.alive():
+                self._idle.append(compiler)
+            else:
+                self._started -= 1
+            self._cond.notify()
+
+    def _start_process(self) -> _CompilerProcess:
+        classpath = os.pathsep.join([self._helper_directory, *self._compiler])
+        process = subprocess.Popen(
+            [os.path.join(self._java_home, "bin", "java"), f"-Xmx{d2c_config.KotlinCompileServerHeapMb}m",
+             "-Didea.io.use.nio2=true", "-cp", classpath, SERVER_CLASS],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, encoding="utf-8")
+        tlogger().info(f"kotlin compile server started, pid: {process.pid}")
+        return _CompilerProcess(process)
+
+    def _resolve_classpath(self, workspace_dir: str):
+        os.makedirs(self._state_directory, exist_ok=True)
+        init_script = os.path.join(self._state_directory, "print_kotlin_classpath.gradle")
+        with open(init_script, "w", encoding="utf-8") as f:
+            f.write(CLASSPATH_INIT_SCRIPT)
+        result = run_gradle(workspace_dir, ["--init-script", init_script, ":app:d2cPrintKotlinClasspath", "-q"],
+                            configuration_cache=False)
+        if result.returncode != 0:
+            raise Exception(f"resolve kotlin classpath failed: {result.stderr}")
+        values = {}
+        for line in result.stdout.splitlines():
+            if line.startswith("D2C_") and "=" in line:
+                key, value = line.split("=", 1)
+                values[key] = [p for p in value.split(os.pathsep) if p]
+        # 构建生成的 R 类会和桩代码冲突，而且不包含任务中新增的资源
+        self._libraries = [p for p in values.get("D2C_BOOTCLASSPATH", []) + values.get("D2C_LIBRARIES", [])
+                           if "r_class_jar" not in p and os.path.basename(p) != "R.jar"]
+        self._plugins = values.get("D2C_PLUGINS", [])
+        self._compiler = values.get("D2C_COMPILER", [])
+        if not self._compiler:
+            raise Exception("kotlin compiler classpath not found")
+        tlogger().info(f"kotlin compile classpath resolved, libraries: {len(self._libraries)}, plugins: {len(self._plugins)}")
+
+    def _compiler_args(self, workspace_dir: str, stub_path: str, output_directory: str) -> List[str]:
+        sources = [stub_path]
+        for source_root in ["app/src/main/java", "app/src/main/kotlin"]:
+            for root, _, files in os.walk(os.path.join(workspace_dir, source_root)):
+                sources.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(".kt"))
+        args = ["-no-stdlib", "-no-reflect", "-jvm-target", "17", "-module-name", "app",
+                "-d", output_directory, "-classpath", os.pathsep.join(self._libraries)]
+        args.extend(f"-Xplugin={plugin}" for plugin in self._plugins)
+        return args + sources
+
+    @staticmethod
+    def _request(process: subprocess.Popen, args: List[str]) -> Tuple[Optional[str], str]:
+        """发送一次编译请求，返回 (ExitCode 名称, 输出)；进程退出或超时返回 (None, 输出)"""
+        watchdog = threading.Timer(d2c_config.KotlinCompileServerTimeoutSeconds, process.kill)
+        watchdog.start()
+        lines = []
+        try:
+            process.stdin.write("\t".join(args) + "\n")
+            process.stdin.flush()
+            for line in process.stdout:
+                if line.startswith(END_MARKER):
+                    return line[len(END_MARKER):].strip(), "".join(lines)
+                lines.append(line)
+        except (BrokenPipeError, OSError) as e:
+            lines.append(str(e))
+        finally:
+            watchdog.cancel()
+        return None, "kotlin compile server exited unexpectedly\n" + "".join(lines[-50:])
+
+
+# ---------- 进程内共享的编译服务 ----------
+_server_lock = threading.Lock()
+_server: Optional[KotlinCompileServer] = None
+
+
+def get_kotlin_compile_server() -> KotlinCompileServer:
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = KotlinCompileServer(os.path.join(d2c_config.OUTPUT_DIR, d2c_config.KotlinCompileServerDirName),
+                                          d2c_config.KotlinCompileServerProcesses)
+        return _server
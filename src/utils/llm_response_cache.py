@@ -0,0 +1,274 @@
+"""
+LLM 响应的磁盘缓存：同一个 Figma 页面重跑、下游失败后的重试、重复的 icon block 识别都会发出相同的请求，命中后直接返回。
+
+- key 是模型参数、工具 schema、结构化输出 schema 和规范化后的消息的 sha256，由 Gemini3Wrapper 提供 cache_identity，
+  没有 cache_identity 的 chain 不缓存
+- 每条缓存一个 JSON 文件，按创建时间过期（TTL），总大小超过上限时按最近使用时间淘汰
+- 普通消息（AIMessage）和结构化输出（pydantic 对象）都可以缓存
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+import d2c_config
+from d2c_logger import tlogger
+from utils.llm_telemetry import record_response_cache_hit
+
+CACHE_VERSION = 1
+ROLE_ALIASES = {"human": "user", "ai": "assistant"}
+
+
+def _normalize_text(text: str) -> str:
+    # 行尾空白和首尾空行不影响语义，不应该导致缓存不命中
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return _normalize_text(content)
+    if isinstance(content, list):
+        return [_normalize_content(part) for part in content]
+    if isinstance(content, dict):
+        return {k: _normalize_content(v) for k, v in content.items()}
+    return content
+
+
+def normalize_messages(messages: List[Any]) -> List[dict]:
+    """把 (role, content) 元组、dict 和 BaseMessage 统一成 {"role", "content", ...}"""
+    normalized = []
+    for message in messages:
+        if isinstance(message, BaseMessage):
+            item = {"role": ROLE_ALIASES.get(message.type, message.type), "content": _normalize_content(message.content)}
+            if getattr(message, "tool_calls", None):
+                item["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in message.tool_calls]
+            if getattr(message, "tool_call_id", None):
+                item["tool_call_id"] = message.tool_call_id
+        elif isinstance(message, (tuple, list)):
+            role, content = message
+            item = {"role": ROLE_ALIASES.get(role, role), "content": _normalize_content(content)}
+        elif isinstance(message, dict):
+            item = {"role": ROLE_ALIASES.get(message.get("role"), message.get("role")),
+                    "content": _normalize_content(message.get("content"))}
+        else:
+            item = {"role": "user", "content": _normalize_content(str(message))}
+        normalized.append(item)
+    return normalized
+
+
+class LLMResponseCache:
+    """
+    LLM 响应缓存（线程安全，多进程共享目录时写入是原子的）
+    :param cache_directory: 缓存目录
+    :param ttl:             缓存有效期(秒)
+    :param max_bytes:       缓存总大小上限，超过时淘汰最久未使用的条目
+    :param sweep_interval:  两次清理之间的最小间隔(秒)
+    """
+
+    def __init__(self, cache_directory: str, ttl: float, max_bytes: int, sweep_interval: float = 60):
+        self._cache_directory = cache_directory
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._hits = 0
+        self._misses = 0
+
+    # ---------- 公共 API ----------
+    @staticmethod
+    def key(chain: Any, messages: List[Any]) -> Optional[str]:
+        """chain 没有 cache_identity 时返回 None，表示不缓存"""
+        identity = getattr(chain, "cache_identity", None)
+        if identity is None:
+            return None
+        payload = {"version": CACHE_VERSION, "identity": identity, "messages": normalize_messages(messages)}
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, chain: Any) -> Tuple[bool, Any]:
+        """返回 (是否命中, 结果)"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if time.time() - entry["created_at"] > self._ttl:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            value = self._decode(entry, chain)
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self._misses += 1
+            return False, None
+        # mtime 记录最近一次使用，用于按大小淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._hits += 1
+        tlogger().info(f"llm response cache hit: {key[:16]}")
+        return True, value
+
+    def put(self, key: str, value: Any):
+        entry = self._encode(value)
+        if entry is None:
+            return
+        entry["created_at"] = time.time()
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            tlogger().info(f"write llm response cache failed: {e}")
+            return
+        self._maybe_sweep()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses}
+
+    def sweep(self):
+        """删除过期条目，并在超过大小上限时按最近使用时间淘汰"""
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self._cache_directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                # 最近使用时间都超过 TTL 的条目一定已经过期
+                if now - st.st_mtime > self._ttl or (name.endswith(".tmp") and now - st.st_mtime > 3600):
+                    self._remove(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+        if evicted:
+            tlogger().info(f"llm response cache evicted {evicted} entries, size: {total / 1024 / 1024:.1f}MB")
+
+    # ---------- 内部 ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self._cache_directory, key[:2], f"{key}.json")
+
+    def _maybe_sweep(self):
+        with self._lock:
+            if time.time() - self._last_sweep < self._sweep_interval:
+                return
+            self._last_sweep = time.time()
+        try:
+            self.sweep()
+        except OSError as e:
+            tlogger().info(f"llm response cache sweep failed: {e}")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _encode(value: Any) -> Optional[dict]:
+        if isinstance(value, BaseMessage):
+            return {"kind": "message", "data": message_to_dict(value)}
+        if hasattr(value, "dict") and callable(value.dict):
+            return {"kind": "pydantic", "data": value.dict()}
+        if isinstance(value, (str, dict, list)):
+            return {"kind": "json", "data": value}
+        return None
+
+    @staticmethod
+    def _decode(entry: dict, chain: Any) -> Any:
+        kind, data = entry["kind"], entry["data"]
+        if kind == "message":
+            return messages_from_dict([data])[0]
+        if kind == "pydantic":
+            schema = getattr(chain, "structured_schema", None)
+            if schema is None or not hasattr(schema, "parse_obj"):
+                raise TypeError("structured schema unknown")
+            return schema.parse_obj(data)
+        return data
+
+
+# ---------- 进程内共享的缓存 ----------
+_cache_lock = threading.Lock()
+_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_response_cache() -> Optional[LLMResponseCache]:
+    """LLMResponseCache 关闭时返回 None"""
+    global _cache
+    if not d2c_config.LLMResponseCache:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(d2c_config.LLMResponseCacheDir, d2c_config.LLMResponseCacheTTLSeconds,
+                                      d2c_config.LLMResponseCacheMaxBytes)
+        return _cache
+
+
+def response_cache_key(chain: Any, messages: List[Any]) -> Optional[str]:
+    """缓存关闭或 chain 不可缓存时返回 None；和 cache_response 一起用于结果确认可用之后才写入的阶段"""
+    response_cache = get_llm_response_cache()
+    return response_cache.key(chain, messages) if response_cache else None
+
+
+def cache_response(key: Optional[str], value: Any):
+    """写入 response_cache_key 得到的 key"""
+    response_cache = get_llm_response_cache()
+    if key and response_cache and value is not None:
+        response_cache.put(key, value)
+
+
+def call_with_cache(chain: Any, messages: List[Any], invoke: Callable[[], Any], cache: bool = True,
+                    refresh_cache: bool = False, cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+    """
+    先查缓存，未命中时调用 invoke() 并写入缓存
+    :param cache:         False 时完全不使用缓存（不确定性的阶段）
+    :param refresh_cache: 跳过读取但写入新结果，用于对上一次结果不满意的重试
+    :param cacheable:     判断结果是否可以写入缓存，例如校验不通过的代码不缓存
+    """
+    response_cache = get_llm_response_cache() if cache else None
+    key = response_cache.key(chain, messages) if response_cache else None
+    if key and not refresh_cache:
+        hit, value = response_cache.get(key, chain)
+        if hit:
+            record_response_cache_hit()
+            return value
+    result = invoke()
+    if key and result is not None and (cacheable is None or cacheable(result)):
+        response_cache.put(key, result)
+    return result
+
+
+async def acall_with_cache(chain: Any, messages: List[Any], ainvoke: Callable[[], Awaitable[Any]], cache: bool = True,
+                           refresh_cache: bool = False, cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+    """call_with_cache 的协程版本，读写缓存文件放到线程里，不阻塞事件循环"""
+    response_cache = get_llm_response_cache() if cache else None
+    key = response_cache.key(chain, messages) if response_cache else None
+    if key and not refresh_cache:
+        hit, value = await asyncio.to_thread(response_cache.get, key, chain)
+        if hit:
+            record_response_cache_hit()
+            return value
+    result = await ainvoke()
+    if key and result is not None and (cacheable is None or cacheable(result)):
+        await asyncio.to_thread(response_cache.put, key, result)
+    return result
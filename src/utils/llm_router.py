@@ -0,0 +1,263 @@
+"""
+多个 LLM 后端之间的路由：每个阶段配置一组可互换的后端（按偏好排序），按滚动窗口内的延迟和错误率挑选，
+当前后端慢、限流或出错时切换到下一个，Gemini 抖动时保护尾延迟；对尾延迟敏感的阶段（coder）还可以发对冲请求。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+from openai import RateLimitError
+
+import d2c_config
+from d2c_logger import tlogger
+from utils.async_llm import run_async
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class BackendHealth:
+    """
+    一个后端在滚动时间窗口内的延迟和错误率（线程安全），所有阶段共享
+    :param window_seconds: 只统计最近这段时间内的请求，旧的记录过期后后端自然恢复
+    """
+
+    def __init__(self, name: str, window_seconds: float):
+        self.name = name
+        self._window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._samples = deque()     # (结束时间, 延迟, 是否成功)
+        self._cooldown_until = 0.0
+
+    # ---------- 公共 API ----------
+    def record(self, latency: float, ok: bool, rate_limited: bool = False):
+        with self._lock:
+            self._samples.append((time.time(), latency, ok))
+            if rate_limited:
+                self._cooldown_until = time.time() + d2c_config.LLMRouterRateLimitCooldownSeconds
+            self._prune()
+
+    def latency(self, q: float) -> Optional[float]:
+        """成功请求延迟的分位数，没有样本返回 None"""
+        with self._lock:
+            self._prune()
+            return percentile([latency for _, latency, ok in self._samples if ok], q)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            self._prune()
+            if len(self._samples) < d2c_config.LLMRouterMinSamples:
+                return 0.0
+            return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def degraded(self, latency_budget: float) -> bool:
+        """限流冷却中、错误率过高或 p95 超过阶段的延迟预算"""
+        if time.time() < self._cooldown_until:
+            return True
+        if self.error_rate() > d2c_config.LLMRouterMaxErrorRate:
+            return True
+        p95 = self.latency(0.95)
+        return p95 is not None and p95 > latency_budget
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._prune()
+            latencies = [latency for _, latency, ok in self._samples if ok]
+            return {
+                "requests": len(self._samples),
+                "errors": sum(1 for _, _, ok in self._samples if not ok),
+                "p50_seconds": percentile(latencies, 0.5),
+                "p95_seconds": percentile(latencies, 0.95),
+                "cooldown_seconds": max(0.0, self._cooldown_until - time.time()),
+            }
+
+    # ---------- 内部 ----------
+    def _prune(self):
+        expire = time.time() - self._window_seconds
+        while self._samples and self._samples[0][0] < expire:
+            self._samples.popleft()
+
+
+_health_lock = threading.Lock()
+_health: Dict[str, BackendHealth] = {}
+
+
+def get_backend_health(name: str) -> BackendHealth:
+    with _health_lock:
+        if name not in _health:
+            _health[name] = BackendHealth(name, d2c_config.LLMRouterWindowSeconds)
+        return _health[name]
+
+
+def backend_health_stats() -> Dict[str, dict]:
+    with _health_lock:
+        health = dict(_health)
+    return {name: h.stats() for name, h in health.items()}
+
+
+class HedgeBudget:
+    """滚动窗口内对冲请求占请求数的比例上限（线程安全）"""
+
+    def __init__(self, ratio: float, window_seconds: float):
+        self._ratio = ratio
+        self._window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._requests = deque()
+        self._hedges = deque()
+
+    def record_request(self):
+        with self._lock:
+            self._requests.append(time.time())
+
+    def try_take(self) -> bool:
+        with self._lock:
+            expire = time.time() - self._window_seconds
+            for samples in (self._requests, self._hedges):
+                while samples and samples[0] < expire:
+                    samples.popleft()
+            # 至少允许一次，之后按比例
+            if len(self._hedges) >= max(1.0, self._ratio * len(self._requests)):
+                return False
+            self._hedges.append(time.time())
+            return True
+
+
+_budget_lock = threading.Lock()
+_hedge_budgets: Dict[str, HedgeBudget] = {}
+
+
+def get_hedge_budget(stage: str) -> HedgeBudget:
+    with _budget_lock:
+        if stage not in _hedge_budgets:
+            _hedge_budgets[stage] = HedgeBudget(d2c_config.LLMHedging[stage]["budget_ratio"], d2c_config.LLMRouterWindowSeconds)
+        return _hedge_budgets[stage]
+
+
+class LLMRouter(Runnable):
+    """
+    按健康状况在多个后端之间路由的 Runnable，接口与 Gemini3Wrapper 相同（bind_tools / with_structured_output / invoke / ainvoke）
+    :param stage:     阶段名，决定延迟预算、单次尝试的超时和对冲策略
+    :param backends:  [(后端名, Runnable)]，按偏好排序
+    :param validator: 判断结果是否可用，对冲时取第一个可用的结果
+
+    健康的后端按配置顺序优先，降级的后端排到后面；除最后一个后端外，每次尝试超过阶段超时就取消并切换到下一个。
+    配置了对冲（d2c_config.LLMHedging）的阶段，请求超过该阶段滚动 p90 延迟后再发一个副本（优先其他后端），
+    先返回可用结果的一方胜出，另一方被取消；对冲次数受阶段预算限制。
+    """
+
+    def __init__(self, stage: str, backends: List[Tuple[str, Runnable]], validator: Optional[Callable[[Any], bool]] = None):
+        self.stage = stage
+        self.backends = backends
+        self.validator = validator
+        self.cache_identity = {"router": [getattr(backend, "cache_identity", name) for name, backend in backends]}
+        self.structured_schema = getattr(backends[0][1], "structured_schema", None)
+
+    def bind_tools(self, tools, **kwargs):
+        return LLMRouter(self.stage, [(name, backend.bind_tools(tools, **kwargs)) for name, backend in self.backends],
+                         self.validator)
+
+    def with_structured_output(self, schema, **kwargs):
+        return LLMRouter(self.stage, [(name, backend.with_structured_output(schema, **kwargs))
+                                      for name, backend in self.backends], self.validator)
+
+    def with_validator(self, validator: Callable[[Any], bool]):
+        return LLMRouter(self.stage, self.backends, validator)
+
+    def map_backends(self, fn: Callable[[Runnable], Runnable]):
+        """对每个后端套一层 fn（例如流式结构化输出），路由、超时切换和对冲不变"""
+        return LLMRouter(self.stage, [(name, fn(backend)) for name, backend in self.backends], self.validator)
+
+    def ordered_backends(self) -> List[Tuple[str, Runnable]]:
+        budget = d2c_config.LLMRouterLatencyBudgetSeconds.get(self.stage, d2c_config.LLMRouterLatencyBudgetSeconds["default"])
+        ranked = sorted(enumerate(self.backends), key=lambda item: (get_backend_health(item[1][0]).degraded(budget), item[0]))
+        return [backend for _, backend in ranked]
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        backends = self.ordered_backends()
+        if self.stage not in d2c_config.LLMHedging:
+            return await self._ainvoke_failover(backends, input, config, kwargs)
+        return await self._ainvoke_hedged(backends, input, config, kwargs)
+
+    def invoke(self, input, config=None, **kwargs):
+        # 超时切换和对冲需要能取消进行中的请求，所以放到共享事件循环上执行
+        return run_async(self.ainvoke(input, config, **kwargs))
+
+    # ---------- 内部 ----------
+    def _valid(self, result) -> bool:
+        return self.validator is None or bool(self.validator(result))
+
+    async def _ainvoke_failover(self, backends: List[Tuple[str, Runnable]], input, config, kwargs):
+        timeout = d2c_config.LLMRouterAttemptTimeoutSeconds.get(self.stage, d2c_config.LLMRouterAttemptTimeoutSeconds["default"])
+        stage_latency = get_backend_health(f"stage:{self.stage}")
+        last_error = None
+        for index, (name, backend) in enumerate(backends):
+            health = get_backend_health(name)
+            # 最后一个后端不设超时，避免所有后端都慢时整个请求失败
+            attempt_timeout = timeout if index < len(backends) - 1 else None
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(backend.ainvoke(input, config=config, **kwargs), attempt_timeout)
+            except asyncio.TimeoutError as e:
+                health.record(time.perf_counter() - start, ok=False)
+                tlogger().info(f"llm backend {name} exceeded {attempt_timeout}s for {self.stage}, fail over")
+                last_error = e
+                continue
+            except asyncio.CancelledError:
+                # 被对冲的另一方取消：耗时是这次请求延迟的下限，仍计入阶段延迟，避免 p90 只统计快的请求
+                stage_latency.record(time.perf_counter() - start, ok=True)
+                raise
+            except Exception as e:
+                # 路由的后端不自己重试 429（见 llm.get_stage_model），第一次 429 就冷却这个后端并切换
+                health.record(time.perf_counter() - start, ok=False, rate_limited=isinstance(e, RateLimitError))
+                tlogger().info(f"llm backend {name} failed for {self.stage}: {e}, fail over")
+                last_error = e
+                continue
+            latency = time.perf_counter() - start
+            health.record(latency, ok=True)
+            stage_latency.record(latency, ok=True)
+            if index > 0:
+                tlogger().info(f"llm request for {self.stage} served by fallback backend {name}")
+            return result
+        raise last_error
+
+    def _hedge_delay(self) -> float:
+        policy = d2c_config.LLMHedging[self.stage]
+        stage_latency = get_backend_health(f"stage:{self.stage}")
+        samples = stage_latency.stats()["requests"]
+        quantile = stage_latency.latency(policy["quantile"]) if samples >= d2c_config.LLMRouterMinSamples else None
+        if quantile is None:
+            return policy["default_delay_seconds"]
+        return max(policy["min_delay_seconds"], quantile)
+
+    async def _ainvoke_hedged(self, backends: List[Tuple[str, Runnable]], input, config, kwargs):
+        budget = get_hedge_budget(self.stage)
+        budget.record_request()
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._ainvoke_failover(backends, input, config, kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not budget.try_take():
+            return await primary
+        # 副本优先发给其他后端，只有一个后端时发给同一个
+        hedge_backends = backends[1:] + backends[:1]
+        tlogger().info(f"llm request for {self.stage} slower than {delay:.1f}s, hedge on {hedge_backends[0][0]}")
+        hedge = asyncio.ensure_future(self._ainvoke_failover(hedge_backends, input, config, kwargs))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and self._valid(task.result()):
+                        tlogger().info(f"llm request for {self.stage} won by {'hedge' if task is hedge else 'primary'}")
+                        return task.result()
+            # 两边都失败或都不可用：按主请求的结果返回
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
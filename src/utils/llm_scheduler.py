@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import d2c_config
+import d2c_datautil
+from d2c_logger import tlogger, logger_task_id
+
+
+class _Waiter:
+    def __init__(self, seq: int, priority: float, app_name: str, deadline: Optional[float]):
+        self.seq = seq
+        self.priority = priority
+        self.app_name = app_name
+        self.deadline = deadline
+        self.enqueued_at = time.time()
+        self.task_id = None
+
+
+def request_context(task_id) -> Tuple[str, float, str, Optional[float]]:
+    """当前请求所属任务的 (stage, 优先级, app, 截止时间)；不在任务线程中时使用默认值"""
+    task = d2c_datautil.get_task_by_id(task_id) if isinstance(task_id, int) else None
+    if not task:
+        return "", d2c_config.LLMDefaultPriority, "", None
+    stages = d2c_datautil.get_task_stage(task_id) or []
+    stage = stages[-1] if stages else ""
+    priority = d2c_config.LLMStagePriority.get(stage, d2c_config.LLMDefaultPriority)
+    deadline = task["create_time"].timestamp() + d2c_config.LLMTaskDeadlineSeconds if task.get("create_time") else None
+    return stage, priority, task.get("app_name", ""), deadline
+
+
+class LLMRequestScheduler:
+    """
+    同一个上游配额的 LLM 请求调度（线程安全）
+    :param quota:         配额名，用于日志和统计
+    :param rate_limiter:  配额的 rate limiter，由调度器决定下一个令牌给谁
+    :param max_in_flight: 同时进行的请求数上限
+
+    排队的请求按以下顺序取令牌：
+    1. 有效优先级高的先走：阶段优先级（越靠后的阶段越高，先把进行中的任务做完）+ 等待时间老化 + 临近截止时间的加成
+    2. 同优先级时，进行中请求少、最久没有被服务的 app 先走，一个 app 的突发请求不会挤占其他 app
+    3. 再按先来先服务
+    """
+
+    def __init__(self, quota: str, rate_limiter, max_in_flight: int):
+        self._quota = quota
+        self._rate_limiter = rate_limiter
+        self._max_in_flight = max_in_flight
+        self._cond = threading.Condition()
+        self._waiters: List[_Waiter] = []
+        self._seq = 0
+        self._in_flight = 0
+        self._app_in_flight: Dict[str, int] = {}
+        self._app_last_admitted: Dict[str, float] = {}
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    # ---------- 公共 API ----------
+    @contextmanager
+    def admit(self):
+        """排队直到拿到令牌，with 块结束时释放并发名额"""
+        waiter, stage = self._enqueue()
+        with self._cond:
+            while not self._try_admit(waiter):
+                # 令牌按时间补充，定时重新检查
+                self._cond.wait(timeout=0.05)
+            wait = self._on_admitted(waiter)
+        self._record(waiter, stage, wait)
+        try:
+            yield wait
+        finally:
+            self._release(waiter)
+
+    @asynccontextmanager
+    async def aadmit(self):
+        """admit 的协程版本，排队时不占用线程；排队中被取消会退出队列"""
+        waiter, stage = self._enqueue()
+        try:
+            while True:
+                with self._cond:
+                    if self._try_admit(waiter):
+                        wait = self._on_admitted(waiter)
+                        break
+                await asyncio.sleep(0.05)
+        except BaseException:
+            with self._cond:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._cond.notify_all()
+            raise
+        self._record(waiter, stage, wait)
+        try:
+            yield wait
+        finally:
+            self._release(waiter)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "queued": len(self._waiters),
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "avg_wait_seconds": self._total_wait / self._admitted if self._admitted else 0.0,
+                "max_wait_seconds": self._max_wait,
+                "oldest_wait_seconds": max((time.time() - w.enqueued_at for w in self._waiters), default=0.0),
+            }
+
+    # ---------- 内部 ----------
+    def _enqueue(self) -> Tuple[_Waiter, str]:
+        task_id = logger_task_id()
+        stage, priority, app_name, deadline = request_context(task_id)
+        with self._cond:
+            waiter = _Waiter(self._seq, priority, app_name, deadline)
+            waiter.task_id = task_id
+            self._seq += 1
+            self._waiters.append(waiter)
+        return waiter, stage
+
+    def _on_admitted(self, waiter: _Waiter) -> float:
+        """调用方持有 self._cond"""
+        self._waiters.remove(waiter)
+        self._in_flight += 1
+        self._app_in_flight[waiter.app_name] = self._app_in_flight.get(waiter.app_name, 0) + 1
+        self._app_last_admitted[waiter.app_name] = time.time()
+        wait = time.time() - waiter.enqueued_at
+        self._admitted += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._cond.notify_all()
+        return wait
+
+    def _record(self, waiter: _Waiter, stage: str, wait: float):
+        # 按任务的排队时间由调用方（utils.llm_telemetry）记录
+        if wait > 1:
+            tlogger().info(f"llm request ({self._quota}, stage: {stage}, priority: {waiter.priority}) admitted, "
+                           f"queue wait: {wait:.3f}s, queued: {len(self._waiters)}, in flight: {self._in_flight}")
+
+    def _release(self, waiter: _Waiter):
+        with self._cond:
+            self._in_flight -= 1
+            self._app_in_flight[waiter.app_name] -= 1
+            if self._app_in_flight[waiter.app_name] == 0:
+                del self._app_in_flight[waiter.app_name]
+            self._cond.notify_all()
+
+    def _effective_priority(self, waiter: _Waiter, now: float) -> float:
+        # 老化按整级提升，同一级内才轮得到 app 公平和先来先服务
+        priority = waiter.priority + int((now - waiter.enqueued_at) // d2c_config.LLMPriorityAgingSeconds)
+        if waiter.deadline is not None and waiter.deadline - now < d2c_config.LLMDeadlineSlackSeconds:
+            priority += d2c_config.LLMDeadlineBoost
+        return priority
+
+    def _try_admit(self, waiter: _Waiter) -> bool:
+        """调用方持有 self._cond；只有排在最前面的请求去取令牌"""
+        if self._in_flight >= self._max_in_flight:
+            return False
+        now = time.time()
+        best = min(self._waiters, key=lambda w: (-self._effective_priority(w, now),
+                                                 self._app_in_flight.get(w.app_name, 0),
+                                                 self._app_last_admitted.get(w.app_name, 0.0), w.seq))
+        return best is waiter and self._rate_limiter.acquire(blocking=False)
@@ -0,0 +1,144 @@
+"""
+LLM 调用的 token、成本和延迟统计。
+
+所有 LLM 请求（safe_call_llm、react agent、evaluator，以及路由、对冲发出的请求）都经过 SafeAzureChatOpenAI，
+在那里对每次请求（一次尝试）记录：输入/输出/命中缓存的 token、估算成本、排队等待、首 token 延迟（流式请求）、
+总延迟和结果；429 重试和响应缓存命中单独计数。统计按任务和阶段累计到 d2c_datautil，由任务查询接口返回。
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import d2c_config
+import d2c_datautil
+from d2c_logger import tlogger, logger_task_id
+from utils.llm_scheduler import request_context
+from utils.prompt_cache import record_token_usage, token_usage
+
+# 按调用次数求平均的字段：总量字段 -> (平均值字段, 计数字段)
+AVERAGES = {
+    "latency_seconds": ("avg_latency_seconds", "calls"),
+    "queue_wait_seconds": ("avg_queue_wait_seconds", "calls"),
+    "first_token_seconds": ("avg_first_token_seconds", "streamed_calls"),
+}
+
+
+def estimate_cost(model_name: str, usage: Dict[str, int]) -> float:
+    """按 d2c_config.LLMTokenPrices 估算的成本（美元），没有配置价格的模型记 0"""
+    prices = d2c_config.LLMTokenPrices.get(model_name)
+    if not prices or not usage:
+        return 0.0
+    return (usage["uncached"] * prices["input"] + usage["cached"] * prices["cached_input"]
+            + usage["output"] * prices["output"]) / 1_000_000
+
+
+class LLMCall:
+    """
+    一次 LLM 请求的度量，在调用线程/协程里创建，从当前任务上下文取任务和阶段
+    :param model_name: 模型名，用于成本估算和按模型的统计
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.task_id = logger_task_id()
+        self.stage = request_context(self.task_id)[0] or "other"
+        self.queue_wait = 0.0
+        self.first_token_latency: Optional[float] = None
+        self.usage: Optional[Dict[str, int]] = None
+        self._start = None
+
+    # ---------- 公共 API ----------
+    @contextmanager
+    def measure(self, queue_wait: float):
+        """包住拿到调度名额之后的请求；正常结束、出错和被取消（对冲输掉、流被提前关闭）都会记录"""
+        self.queue_wait = queue_wait
+        self._start = time.perf_counter()
+        try:
+            yield self
+        except (GeneratorExit, asyncio.CancelledError):
+            self._finish("cancelled")
+            raise
+        except BaseException:
+            self._finish("error")
+            raise
+        self._finish("ok")
+
+    def on_chunk(self, message):
+        """流式响应的每个 chunk"""
+        if self.first_token_latency is None and (message.content or getattr(message, "tool_call_chunks", None)):
+            self.first_token_latency = time.perf_counter() - self._start
+        # stream_usage 打开时，用量在最后一个 chunk 上
+        self.on_result(message)
+
+    def on_result(self, message):
+        usage = token_usage(getattr(message, "usage_metadata", None))
+        if usage:
+            self.usage = usage
+
+    # ---------- 内部 ----------
+    def _finish(self, outcome: str):
+        latency = time.perf_counter() - self._start
+        usage = self.usage or {"input": 0, "cached": 0, "uncached": 0, "output": 0}
+        cost = estimate_cost(self.model_name, usage)
+        metrics = {
+            "calls": 1,
+            "errors": int(outcome == "error"),
+            "cancelled": int(outcome == "cancelled"),
+            "input_tokens": usage["input"],
+            "cached_tokens": usage["cached"],
+            "uncached_tokens": usage["uncached"],
+            "output_tokens": usage["output"],
+            "cost_usd": cost,
+            "queue_wait_seconds": self.queue_wait,
+            "latency_seconds": latency,
+            "max_latency_seconds": latency,
+        }
+        if self.first_token_latency is not None:
+            metrics["streamed_calls"] = 1
+            metrics["first_token_seconds"] = self.first_token_latency
+        _add(self.task_id, self.stage, metrics)
+        record_token_usage(self.model_name, self.usage)
+        first_token = f", first token: {self.first_token_latency:.2f}s" if self.first_token_latency is not None else ""
+        tlogger().info(f"llm call ({self.model_name}, stage: {self.stage}) {outcome}: input {usage['input']} tokens "
+                       f"(cached {usage['cached']}), output {usage['output']}, cost ${cost:.4f}, "
+                       f"queue wait: {self.queue_wait:.2f}s{first_token}, latency: {latency:.2f}s")
+
+
+def record_llm_retry():
+    """llm_retry 的一次重试（限流）"""
+    task_id = logger_task_id()
+    _add(task_id, request_context(task_id)[0] or "other", {"retries": 1})
+
+
+def record_response_cache_hit():
+    """命中 LLM 响应缓存，没有发出请求"""
+    task_id = logger_task_id()
+    _add(task_id, request_context(task_id)[0] or "other", {"response_cache_hits": 1})
+
+
+def task_llm_usage(task_id: int) -> dict:
+    """任务的 LLM 统计：{"total": {...}, "stages": {阶段: {...}}}，附带平均延迟和缓存命中率"""
+    stages = d2c_datautil.get_task_llm_usage(task_id)
+    total: Dict[str, float] = {}
+    for metrics in stages.values():
+        for field, value in metrics.items():
+            total[field] = max(total.get(field, 0), value) if field.startswith("max_") else total.get(field, 0) + value
+    return {"total": _summarize(total), "stages": {stage: _summarize(metrics) for stage, metrics in stages.items()}}
+
+
+# ---------- 内部 ----------
+def _add(task_id, stage: str, metrics: Dict[str, float]):
+    if isinstance(task_id, int):
+        d2c_datautil.add_task_llm_usage(task_id, stage, metrics)
+
+
+def _summarize(metrics: Dict[str, float]) -> dict:
+    summary = dict(metrics)
+    for field, (average, count) in AVERAGES.items():
+        if summary.get(count):
+            summary[average] = summary.get(field, 0) / summary[count]
+    if summary.get("input_tokens"):
+        summary["cache_hit_rate"] = summary.get("cached_tokens", 0) / summary["input_tokens"]
+    return {field: round(value, 6 if field == "cost_usd" else 3) if isinstance(value, float) else value
+            for field, value in summary.items()}
@@ -1,70 +1,188 @@
 from langchain_core.tools import tool
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type, before_sleep_log
+from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 from openai import RateLimitError
+import asyncio
 import base64
 import os
 import shutil
 import base64
 from typing import Dict, Set
 from d2c_logger import tlogger, logger_task_id
-from utils.spec_tool_utils import fetch_image_links, fetch_ref_image_links, get_safe_filename, get_unique_path, download_and_save_icon
+from utils.spec_tool_utils import fetch_image_links, fetch_ref_image_links, get_safe_filename, get_unique_path, download_and_save_icon, download_and_save_vector_icon
 from utils.retry_pool_tools import RetryPool
+from utils.workspace_template import ensure_private_copy
+from utils.kotlin_compile_server import get_kotlin_compile_server
+from utils.build_output_parser import summarize_build_output
+from utils.llm_response_cache import call_with_cache, acall_with_cache
+from utils.llm_telemetry import record_llm_retry
 
-@tool
-def export_figma_icon(figma_nodes: Dict[str, str], image_refs: Set[str],
-                      figma_file_key: str, root_node_id: str, figma_token: str, resource_directory: str) -> set:
-    """通过 Figma API 导出 icon png 资源"""
+def _icon_file_name(resource_directory: str, raw_name: str, ext: str) -> str:
+    """icon 文件名：统一扩展名，并在资源目录内去重"""
+    stem = os.path.splitext(get_safe_filename(raw_name))[0]
+    return os.path.basename(get_unique_path(resource_directory, stem + ext))
 
-    # todo: 优化，加速，每个 figma 文件只导出一次
+
+def _run_downloads(download_tasks: Dict[str, tuple]) -> Set[str]:
+    """
+    并发执行下载任务，返回失败任务的 key
+    download_tasks: key -> (download_fn, image_url, save_path)
+    """
+    if not download_tasks:
+        return set()
+    max_download_workers = min(5, len(download_tasks))  # 控制并发数，避免触发Figma API限流
+    retry_pool = RetryPool(max_workers=max_download_workers, task_id=logger_task_id())
+    future_download_task = {}
+    for key, (download_fn, image_url, save_image_path) in download_tasks.items():
+        future_download_task[retry_pool.submit(download_fn, save_image_path, image_url)] = key
+
+    failed = set()
+    for future_task, key in future_download_task.items():
+        if not future_task.result():
+            _, download_image_url, save_local_path = download_tasks[key]
+            tlogger().info(f"down load from: {download_image_url}, save in: {save_local_path} failed")
+            failed.add(key)
+    retry_pool.shutdown(wait=False)
+    return failed
+
+
+ICON_RESOURCE_PREFIX = "app/src/main/res/drawable-xxhdpi"
+
+
+def resolve_icon_downloads(figma_nodes: Dict[str, str], image_refs: Set[str],
+                           figma_file_key: str, root_node_id: str, figma_token: str, resource_directory: str,
+                           icon_formats: Dict[str, str] = None, resolve_urls: bool = True) -> Dict[str, dict]:
+    """
+    分配资源文件名，不下载。
+    返回下载计划 {资源相对路径: {"node_id": figma 节点 id（图片填充为 None）, "url": 下载链接, "format": "svg"/"png"}}
+    :param resolve_urls: False 时不请求节点的渲染链接（url 为 None），由 materialize_icon_downloads 只为用到的节点获取；
+                         图片填充的链接来自文件级接口，不消耗渲染额度，总是在这里获取
+    """
     if not figma_file_key:
         raise Exception("请设置 figma_file_key")
     tlogger().info(f"export figma icons:f{figma_nodes.values()} ")
-    # 1. 获取图片下载链接
-    figma_node_ids = figma_nodes.keys()
-    tlogger().info(f"Get icon url")
-    image_links_map = fetch_image_links(figma_file_key, figma_node_ids, figma_token, root_node_id)
-    tlogger().info(f"Get icon url")
+    icon_formats = icon_formats or {}
+    svg_node_ids = [node_id for node_id in figma_nodes if icon_formats.get(node_id) == "svg"]
+    png_node_ids = [node_id for node_id in figma_nodes if icon_formats.get(node_id) != "svg"]
+    image_links_map, svg_links_map = {}, {}
+    if resolve_urls:
+        # 1. 获取图片下载链接
+        tlogger().info(f"Get icon url, png: {len(png_node_ids)}, svg: {len(svg_node_ids)}")
+        image_links_map = fetch_image_links(figma_file_key, png_node_ids, figma_token, root_node_id)
+        svg_links_map = fetch_image_links(figma_file_key, svg_node_ids, figma_token, root_node_id, image_format="svg")
+    tlogger().info(f"Get ref image url")
     ref_image_links_map = fetch_ref_image_links(figma_file_key, image_refs, figma_token, root_node_id)
 
-    download_tasks = {}
-    saved_paths = set() 
+    download_plan = {}
     for figma_node_id in figma_nodes.keys():
-        image_url = image_links_map.get(figma_node_id)
-        if not image_url:
+        image_format = "svg" if figma_node_id in svg_node_ids else "png"
+        image_url = (svg_links_map if image_format == "svg" else image_links_map).get(figma_node_id)
+        if resolve_urls and not image_url:
             tlogger().info(f"Get image url failed, node id: {figma_node_id}, icon_name: {figma_nodes[figma_node_id]}")
             continue
-        filepath = get_unique_path(resource_directory, get_safe_filename(figma_nodes[figma_node_id]))
-        if not filepath.endswith(".png"):
-            filepath = figma_nodes[figma_node_id] + ".png"
-        save_path = os.path.join(resource_directory, filepath)
-        saved_paths.add(f"app/src/main/res/drawable-xxhdpi/{filepath}")
-        download_tasks[image_url] = save_path
+        file_name = _icon_file_name(resource_directory, figma_nodes[figma_node_id], ".xml" if image_format == "svg" else ".png")
+        download_plan[f"{ICON_RESOURCE_PREFIX}/{file_name}"] = {"node_id": figma_node_id, "url": image_url, "format": image_format}
 
     for image_ref_id, image_ref_url in ref_image_links_map.items():
         if not image_ref_url:
             tlogger().info(f"Get ref image url failed, node id: {image_ref_id}")
             continue
-        image_file_name = f"img_{image_ref_id}.png"
-        save_path = os.path.join(resource_directory, image_file_name)
-        saved_paths.add(f"app/src/main/res/drawable-xxhdpi/{image_file_name}")
-        download_tasks[image_ref_url] = save_path
-    
-    max_download_workers = min(5, len(download_tasks))  # 控制并发数，避免触发Figma API限流
-    retry_pool = RetryPool(max_workers=max_download_workers, task_id=logger_task_id())
-    future_download_task = {}
-    for image_url, save_image_path in download_tasks.items():
-        download_task = retry_pool.submit(download_and_save_icon, save_image_path, image_url)
-        future_download_task[download_task] = [image_url, save_image_path]
+        download_plan[f"{ICON_RESOURCE_PREFIX}/img_{image_ref_id}.png"] = {"node_id": None, "url": image_ref_url, "format": "png"}
+    return download_plan
 
-    for future_task in future_download_task:
-        if not future_task.result():
-            download_image_url = future_download_task[future_task][0]
-            save_local_path = future_download_task[future_task][1]
-            tlogger().info(f"down load from: {download_image_url}, save in: {save_local_path} failed")
+
+def _resolve_missing_urls(download_plan: Dict[str, dict], figma_file_key: str, root_node_id: str,
+                          figma_token: str) -> Dict[str, dict]:
+    """为计划中没有链接的节点获取渲染链接，png 和 svg 各一次请求；返回新的计划，取不到链接的条目被去掉"""
+    missing = {"png": [], "svg": []}
+    for item in download_plan.values():
+        if not item["url"] and item["node_id"]:
+            missing[item["format"]].append(item["node_id"])
+    if not missing["png"] and not missing["svg"]:
+        return download_plan
+    tlogger().info(f"Get icon url, png: {len(missing['png'])}, svg: {len(missing['svg'])}")
+    links_map = {image_format: fetch_image_links(figma_file_key, node_ids, figma_token, root_node_id, image_format=image_format)
+                 for image_format, node_ids in missing.items()}
+    resolved = {}
+    for rel_path, item in download_plan.items():
+        if not item["url"]:
+            image_url = links_map[item["format"]].get(item["node_id"]) if item["node_id"] else None
+            if not image_url:
+                tlogger().info(f"Get image url failed, node id: {item['node_id']}, path: {rel_path}")
+                continue
+            item = dict(item, url=image_url)
+        resolved[rel_path] = item
+    return resolved
+
+
+def materialize_icon_downloads(download_plan: Dict[str, dict], resource_directory: str,
+                               figma_file_key: str, root_node_id: str, figma_token: str, manifest=None) -> set:
+    """
+    按下载计划下载 icon，svg 下载或转换失败的节点回退为 png（资源名不变，只替换扩展名），返回保存的资源相对路径
+    :param manifest: IconExportManifest，传入时跳过清单中已完成的下载，并记录本次完成的下载
+    """
+    pending_downloads = {}
+    resumed_fallbacks = set()
+    for rel_path, item in download_plan.items():
+        save_path = os.path.join(resource_directory, os.path.basename(rel_path))
+        if manifest and manifest.is_downloaded(rel_path, save_path):
+            continue
+        png_path = os.path.splitext(rel_path)[0] + ".png"
+        if manifest and item["format"] == "svg" and manifest.is_downloaded(png_path, os.path.splitext(save_path)[0] + ".png"):
+            # 上次已回退为 png
+            resumed_fallbacks.add(rel_path)
+            continue
+        pending_downloads[rel_path] = item
+    # 延迟下载的计划只有节点 id，这里只为真正要下载的节点获取链接
+    resolved_downloads = _resolve_missing_urls(pending_downloads, figma_file_key, root_node_id, figma_token)
+    unresolved = set(pending_downloads.keys()) - set(resolved_downloads.keys())
+    download_tasks = {}
+    for rel_path, item in resolved_downloads.items():
+        save_path = os.path.join(resource_directory, os.path.basename(rel_path))
+        download_fn = download_and_save_vector_icon if item["format"] == "svg" else download_and_save_icon
+        download_tasks[rel_path] = (download_fn, item["url"], save_path)
+    skipped = len(download_plan) - len(download_tasks) - len(unresolved)
+    if skipped:
+        tlogger().info(f"skip {skipped} icons already downloaded")
+    failed_downloads = _run_downloads(download_tasks)
+    if manifest:
+        manifest.mark_downloaded(set(download_tasks.keys()) - failed_downloads)
+    saved_paths = set(download_plan.keys()) - resumed_fallbacks - unresolved
+    saved_paths.update(os.path.splitext(rel_path)[0] + ".png" for rel_path in resumed_fallbacks)
+
+    fallback_paths = {rel_path: download_plan[rel_path]["node_id"] for rel_path in failed_downloads
+                      if download_plan[rel_path]["format"] == "svg"}
+    if fallback_paths:
+        tlogger().info(f"fallback to png for vector nodes: {list(fallback_paths.values())}")
+        fallback_links_map = fetch_image_links(figma_file_key, list(fallback_paths.values()), figma_token, root_node_id)
+        fallback_tasks = {}
+        for xml_path, figma_node_id in fallback_paths.items():
+            saved_paths.discard(xml_path)
+            image_url = fallback_links_map.get(figma_node_id)
+            if not image_url:
+                tlogger().info(f"Get png fallback url failed, node id: {figma_node_id}")
+                continue
+            png_path = os.path.splitext(xml_path)[0] + ".png"
+            saved_paths.add(png_path)
+            fallback_tasks[png_path] = (download_and_save_icon, image_url, os.path.join(resource_directory, os.path.basename(png_path)))
+        failed_fallbacks = _run_downloads(fallback_tasks)
+        if manifest:
+            manifest.mark_downloaded(set(fallback_tasks.keys()) - failed_fallbacks)
     tlogger().info(f"down load all image over!!!")
     return saved_paths
 
 
+@tool
+def export_figma_icon(figma_nodes: Dict[str, str], image_refs: Set[str],
+                      figma_file_key: str, root_node_id: str, figma_token: str, resource_directory: str,
+                      icon_formats: Dict[str, str] = None) -> set:
+    """通过 Figma API 导出 icon 资源：纯矢量节点导出 svg 并转换为 VectorDrawable xml，其他导出 png"""
+
+    # todo: 优化，加速，每个 figma 文件只导出一次
+    download_plan = resolve_icon_downloads(figma_nodes, image_refs, figma_file_key, root_node_id,
+                                           figma_token, resource_directory, icon_formats)
+    return materialize_icon_downloads(download_plan, resource_directory, figma_file_key, root_node_id, figma_token)
+
+
 @tool
 def list_icons(resource_dir: str):
     """List the icon files in the resource folder.
@@ -160,6 +278,7 @@ def edit_file(file_path: str, old_string: str, new_string: str, replace_all: boo
         tlogger().info(f"edit file: {file_path}, old string: {old_string} is too short, {len(old_string)}, strip length: {len(old_string.strip())}")
         raise Exception(f"The string {old_string} to be replaced is too short to match precisely; please provide more context.")
     content = content.replace(old_string.strip(), new_string.strip())
+    ensure_private_copy(file_path)
     with open(file_path, "w") as f:
         f.write(content)
 
@@ -183,9 +302,26 @@ def replace_all(abs_path: str, old_string: str, new_string: str):
     if replace_cnt > 200:
         tlogger().info(f"replace file: {abs_path};\n, old string: {old_string.strip()};\n, replace string:{new_string.strip()};\n, replace count: {replace_cnt} will cause big file")
     content = content.replace(old_string.strip(), new_string.strip())
+    ensure_private_copy(abs_path)
     with open(abs_path, "w") as f:
         f.write(content)
 
+@tool
+def check_compile(workspace_dir: str) -> str:
+    """Quickly compile the Kotlin sources of the app (including Greeting.kt) and return the compiler diagnostics.
+    It takes about a second, use it after editing to verify the fix before finishing.
+
+    Args:
+        workspace_dir (str): the compose project directory.
+
+    Returns:
+        str: "OK" if the code compiles, otherwise the compiler errors.
+    """
+    success, output = get_kotlin_compile_server().check(workspace_dir)
+    if success is None:
+        return "Quick compile is not available now, double check the code by reading it."
+    return "OK" if success else summarize_build_output(output, workspace_dir)
+
 @tool
 def encode_image(image_path: str) -> str:
     """
@@ -206,20 +342,58 @@ MIN_WAIT    = 1             # 最少等 1 秒
 MAX_WAIT    = 60            # 最多等 60 秒
 
 
+def _before_retry_sleep(retry_state):
+    # 记录到当前任务的日志和 LLM 统计里
+    tlogger().info(f"retry {retry_state.fn.__name__} in {retry_state.next_action.sleep:.1f}s "
+                   f"after attempt {retry_state.attempt_number}: {retry_state.outcome.exception()}")
+    record_llm_retry()
+
+
 def llm_retry(func):
     return retry(
         wait=wait_exponential(multiplier=MULTIPLIER, min=MIN_WAIT, max=MAX_WAIT),
         stop=stop_after_attempt(MAX_RETRY),
         retry=retry_if_exception_type(RateLimitError),
         reraise=True,
-        before_sleep=before_sleep_log(tlogger(), tlogger().level)
+        before_sleep=_before_retry_sleep
     )(func)
 
 # ========== 3. 通用 safe invoke ==========
 @llm_retry
-def safe_call_llm(chain, messages):
+def _invoke_llm(chain, messages):
+    return chain.invoke(messages)
+
+
+def safe_call_llm(chain, messages, cache: bool = True, refresh_cache: bool = False, cacheable=None):
     """
     chain: 任意 LangChain Runnable（bind_tools 后的 ChatModel 也行）
     messages: 列表格式的消息
+    cache: 是否使用响应缓存，不确定性的阶段传 False
+    refresh_cache: 不读缓存但写入新结果，用于对上一次结果不满意的重试
+    cacheable: 判断结果能否写入缓存
     """
-    return chain.invoke(messages)
+    return call_with_cache(chain, messages, lambda: _invoke_llm(chain, messages), cache, refresh_cache, cacheable)
+
+
+@llm_retry
+async def _ainvoke_llm(chain, messages):
+    return await chain.ainvoke(messages)
+
+
+async def asafe_call_llm(chain, messages, cache: bool = True, refresh_cache: bool = False, cacheable=None):
+    """
+    safe_call_llm 的协程版本，参数相同；在共享事件循环上执行，等待 LLM 时不占用线程
+    """
+    return await acall_with_cache(chain, messages, lambda: _ainvoke_llm(chain, messages), cache, refresh_cache, cacheable)
+
+
+async def astream_agent(agent, inputs, pause_seconds: float = 0):
+    """
+    异步执行 react agent，逐步记录每个节点的输出
+    agent: create_react_agent 创建的图
+    pause_seconds: 每步之后暂停的时间(秒)，不占用线程
+    """
+    async for chunk in agent.astream(inputs, stream_mode="updates"):
+        tlogger().info(chunk)
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
@@ -0,0 +1,60 @@
+import os
+import threading
+from typing import Dict, Set
+
+
+class NameRegistry:
+    """
+    目录级别的内存文件名分配器（线程安全）
+    :param directory: 分配文件名的目录，创建时读取一次目录下已有文件，之后不再访问文件系统
+
+    以资源名（去掉扩展名）为单位保留名称：Android 中 icon.png 与 icon.xml 都对应 R.drawable.icon，
+    不能同时存在。每个基础名记录下一个可用后缀，大量同名 icon 时分配仍为常数时间。
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._reserved: Set[str] = set()
+        self._next_suffix: Dict[str, int] = {}
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                self._reserved.add(os.path.splitext(file_name)[0])
+
+    def reserve(self, base_name: str) -> str:
+        """
+        保留一个不冲突的文件名并返回，冲突时依次加 _1、_2...
+        """
+        name, ext = os.path.splitext(base_name)
+        with self._lock:
+            unique = name
+            counter = self._next_suffix.get(name, 1)
+            while unique in self._reserved:
+                unique = f"{name}_{counter}"
+                counter += 1
+            self._next_suffix[name] = counter
+            self._reserved.add(unique)
+        return unique + ext
+
+
+# ---------- 按目录共享的 registry ----------
+_registries_lock = threading.Lock()
+_registries: Dict[str, NameRegistry] = {}
+
+
+def get_name_registry(directory: str) -> NameRegistry:
+    key = os.path.abspath(directory)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = NameRegistry(key)
+            _registries[key] = registry
+        return registry
+
+
+def release_name_registries(workspace_directory: str):
+    """任务结束时释放工作区下所有目录的 registry"""
+    prefix = os.path.abspath(workspace_directory)
+    with _registries_lock:
+        for key in [k for k in _registries if k == prefix or k.startswith(prefix + os.sep)]:
+            del _registries[key]
@@ -0,0 +1,79 @@
+"""
+Prompt 前缀缓存和 token 用量统计。
+
+- 各阶段的 system prompt 不含随任务变化的内容（工作目录、组件知识、figma json 都在 user 消息里），
+  每次请求的开头（工具定义 + system prompt）完全相同，Gemini 的隐式缓存和 OpenAI 的自动前缀缓存可以跨任务命中
+- 需要显式标记缓存的后端（Claude，见 d2c_config.LLMPromptCacheControl），在最后一条 system 消息上加 cache_control 断点
+- 每次调用输入 token 中命中缓存和未命中的数量累计到进程内的按模型统计，按任务和阶段的统计见 utils.llm_telemetry
+"""
+import threading
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# 进程内按模型累计的用量
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+# ---------- 公共 API ----------
+def mark_cache_breakpoint(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """在最后一条 system 消息的末尾加 cache_control，返回新的消息列表，不修改原消息"""
+    index = max((i for i, message in enumerate(messages) if message.type == "system"), default=None)
+    if index is None:
+        return messages
+    message = messages[index]
+    if isinstance(message.content, str):
+        blocks = [{"type": "text", "text": message.content, "cache_control": CACHE_CONTROL}]
+    else:
+        blocks = [dict(block) if isinstance(block, dict) else {"type": "text", "text": block} for block in message.content]
+        if not blocks:
+            return messages
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+    messages = list(messages)
+    messages[index] = message.model_copy(update={"content": blocks})
+    return messages
+
+
+def token_usage(usage_metadata: Optional[dict]) -> Optional[Dict[str, int]]:
+    """LangChain 的 usage_metadata 转成 {input, cached, uncached, output}，没有用量信息返回 None"""
+    if not usage_metadata:
+        return None
+    input_tokens = usage_metadata.get("input_tokens") or 0
+    cached = (usage_metadata.get("input_token_details") or {}).get("cache_read") or 0
+    return {"input": input_tokens, "cached": cached, "uncached": max(0, input_tokens - cached),
+            "output": usage_metadata.get("output_tokens") or 0}
+
+
+def completion_token_usage(completion) -> Optional[Dict[str, int]]:
+    """openai 客户端 chat.completions 返回值的用量"""
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    input_tokens = usage.prompt_tokens or 0
+    return {"input": input_tokens, "cached": cached, "uncached": max(0, input_tokens - cached),
+            "output": usage.completion_tokens or 0}
+
+
+def record_token_usage(model_name: str, usage: Optional[Dict[str, int]]):
+    """累计一次调用的用量到按模型的统计；按任务和阶段的统计见 utils.llm_telemetry"""
+    if not usage:
+        return
+    with _stats_lock:
+        stats = _stats.setdefault(model_name, {"calls": 0, "input": 0, "cached": 0, "uncached": 0, "output": 0})
+        stats["calls"] += 1
+        for field in ("input", "cached", "uncached", "output"):
+            stats[field] += usage[field]
+
+
+def prompt_cache_stats() -> Dict[str, dict]:
+    """各模型的累计 token 用量和前缀缓存命中率"""
+    with _stats_lock:
+        stats = {name: dict(s) for name, s in _stats.items()}
+    for s in stats.values():
+        s["cache_hit_rate"] = round(s["cached"] / s["input"], 3) if s["input"] else 0.0
+    return stats
@@ -0,0 +1,184 @@
+"""
+构建沙箱：给 Gradle/Paparazzi 这类外部构建加上墙钟超时、进程组终止、cgroup v2 CPU/内存限制，并记录每次构建的资源占用。
+
+- 子进程在新的会话中启动，超时后先 SIGTERM 整个进程组，宽限期后 SIGKILL，挂住的构建不会一直占着工作线程
+- 开启 cgroup 限制时每次构建一个子 cgroup（cpu.max / memory.max），结束后读取 memory.peak、cpu.stat 并删除
+- 资源占用来自 os.wait4 返回的 rusage，只统计这一次构建的子进程，并发构建之间互不干扰
+- 子进程由一个 sh 启动器先把自己写入 cgroup.procs 再 exec 目标命令，第一条指令起就在 cgroup 里，
+  它的所有后代也都在；不用 preexec_fn，多线程进程里 fork 之后执行 Python 代码不安全
+
+这些限制只约束被启动的进程树。Gradle 使用 daemon 时构建在 daemon 里执行，超时、rusage、cgroup 都只作用于
+gradlew 客户端，客户端被杀后 daemon 还会继续编译；所以配置了 cgroup 时 gradle_tools 使用 --no-daemon，
+使用 daemon 时构建超时由 GradleDaemonManager 回收（gradlew --stop）所有 daemon 来停止。
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from d2c_logger import tlogger
+
+CGROUP_CPU_PERIOD_US = 100000
+# $1 是 cgroup.procs 路径，其余参数是要执行的命令；加入 cgroup 失败时不带限制继续执行
+CGROUP_LAUNCHER = 'echo $$ > "$1" || echo "sandbox: join cgroup $1 failed, run without limits" >&2; shift; exec "$@"'
+
+
+class SandboxResult:
+    """
+    一次沙箱执行的结果，与 subprocess.CompletedProcess 一样提供 returncode/stdout/stderr
+    """
+
+    def __init__(self, args: List[str], returncode: int, stdout: str, stderr: str, timed_out: bool,
+                 wall_seconds: float, usage: Dict[str, float]):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.wall_seconds = wall_seconds
+        self.usage = usage
+
+
+def cgroup_available(cgroup_root: str) -> bool:
+    parent = os.path.dirname(cgroup_root.rstrip("/"))
+    return os.path.isfile(os.path.join(parent, "cgroup.controllers")) and os.access(parent, os.W_OK)
+
+
+def _create_cgroup(cgroup_root: str, cpus: Optional[float], memory_mb: Optional[int]) -> Optional[str]:
+    try:
+        if not os.path.isdir(cgroup_root):
+            os.makedirs(cgroup_root)
+            # 打开子 cgroup 需要的控制器
+            with open(os.path.join(cgroup_root, "cgroup.subtree_control"), "w") as f:
+                f.write("+cpu +memory")
+        path = os.path.join(cgroup_root, f"build_{uuid.uuid4().hex[:12]}")
+        os.makedirs(path)
+        if cpus:
+            with open(os.path.join(path, "cpu.max"), "w") as f:
+                f.write(f"{int(cpus * CGROUP_CPU_PERIOD_US)} {CGROUP_CPU_PERIOD_US}")
+        if memory_mb:
+            with open(os.path.join(path, "memory.max"), "w") as f:
+                f.write(str(memory_mb * 1024 * 1024))
+        return path
+    except OSError as e:
+        tlogger().info(f"create cgroup failed, run without limits: {e}")
+        return None
+
+
+def _read_cgroup_usage(path: str) -> Dict[str, float]:
+    usage = {}
+    try:
+        with open(os.path.join(path, "memory.peak")) as f:
+            usage["cgroup_memory_peak_mb"] = int(f.read().strip()) / 1024 / 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(path, "cpu.stat")) as f:
+            for line in f:
+                key, value = line.split()
+                if key == "usage_usec":
+                    usage["cgroup_cpu_seconds"] = int(value) / 1e6
+                elif key == "nr_throttled":
+                    usage["cgroup_throttled"] = int(value)
+    except (OSError, ValueError):
+        pass
+    return usage
+
+
+def _remove_cgroup(path: str):
+    # 超时被杀的进程可能还没退出，写 cgroup.kill（5.14+）确保 cgroup 为空
+    try:
+        with open(os.path.join(path, "cgroup.kill"), "w") as f:
+            f.write("1")
+    except OSError:
+        pass
+    for _ in range(50):
+        try:
+            os.rmdir(path)
+            return
+        except OSError:
+            time.sleep(0.1)
+    tlogger().info(f"remove cgroup failed: {path}")
+
+
+def _kill_group(pid: int, grace_seconds: float, finished: threading.Event):
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    if finished.wait(grace_seconds):
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_sandboxed(args: List[str], cwd: str, env: Optional[dict] = None, timeout: Optional[float] = None,
+                  cpus: Optional[float] = None, memory_mb: Optional[int] = None,
+                  cgroup_root: Optional[str] = None, kill_grace_seconds: float = 10.0) -> SandboxResult:
+    """
+    在沙箱中执行命令，等待结束并返回 SandboxResult
+    :param timeout:    墙钟超时(秒)，None 不限制
+    :param cpus:       cgroup CPU 限制（核数），需同时提供 cgroup_root
+    :param memory_mb:  cgroup 内存限制(MB)，需同时提供 cgroup_root
+    """
+    cgroup = _create_cgroup(cgroup_root, cpus, memory_mb) if cgroup_root and (cpus or memory_mb) else None
+    start = time.perf_counter()
+    command = ["sh", "-c", CGROUP_LAUNCHER, "sandbox", os.path.join(cgroup, "cgroup.procs"), *args] if cgroup else args
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, start_new_session=True)
+
+    outputs = {"stdout": [], "stderr": []}
+
+    def drain(stream, key):
+        for chunk in iter(lambda: stream.read(8192), ""):
+            outputs[key].append(chunk)
+        stream.close()
+
+    readers = [threading.Thread(target=drain, args=(process.stdout, "stdout"), daemon=True),
+               threading.Thread(target=drain, args=(process.stderr, "stderr"), daemon=True)]
+    for reader in readers:
+        reader.start()
+
+    finished = threading.Event()
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        tlogger().info(f"build timed out after {timeout}s, kill process group {process.pid}: {' '.join(args)}")
+        _kill_group(process.pid, kill_grace_seconds, finished)
+
+    watchdog = threading.Timer(timeout, on_timeout) if timeout else None
+    if watchdog:
+        watchdog.start()
+    # wait4 只统计这个子进程（及其已回收的后代）的资源占用
+    _, status, rusage = os.wait4(process.pid, 0)
+    finished.set()
+    if watchdog:
+        watchdog.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if timed_out.is_set():
+        # 客户端被杀后脱离的后代进程可能还持有管道，确保整个进程组退出
+        _kill_group(process.pid, 0, finished)
+    for reader in readers:
+        reader.join(timeout=kill_grace_seconds)
+    wall_seconds = time.perf_counter() - start
+
+    usage = {
+        "cpu_user_seconds": rusage.ru_utime,
+        "cpu_system_seconds": rusage.ru_stime,
+        # Linux 下 ru_maxrss 单位是 KB
+        "max_rss_mb": rusage.ru_maxrss / 1024,
+    }
+    if cgroup:
+        usage.update(_read_cgroup_usage(cgroup))
+        _remove_cgroup(cgroup)
+    stderr = "".join(outputs["stderr"])
+    if timed_out.is_set():
+        stderr += f"\nBUILD TIMED OUT: the build was killed after {timeout} seconds without finishing.\n"
+    return SandboxResult(args, process.returncode, "".join(outputs["stdout"]), stderr,
+                         timed_out.is_set(), wall_seconds, usage)
@@ -39,9 +39,12 @@ class AgentState(TypedDict):
     workspace_directory: str
     resource_directory: Optional[str]
     icon_list: set[str]
+    icon_aliases: Dict[str, str]
+    pending_icons: Dict[str, dict]
     components: list
     comp_knowledges: Dict[str, dict]
     coder_compose_code: str
+    coder_cache_entry: Optional[tuple]
     latest_compose_code: str
     compile_error: Optional[str]
     compile_success: bool
@@ -1,26 +1,36 @@
 import os
 import json
-import subprocess
 import requests
 import re
 import time
 import d2c_config
 from d2c_logger import tlogger
-from typing import Dict, List, Any, Set
+from typing import Dict, List, Any, Set, Optional
 from utils.figma_request_cache import read_json_cache, write_json_cache, read_image_json_cache, write_image_json_cache
+from utils.vector_drawable_tools import svg_to_vector_drawable, UnsupportedSvgError
+from utils.icon_dedupe_tools import resolve_icon_alias
+from utils.name_registry import get_name_registry
+from utils.gradle_tools import run_gradle
+from utils.build_output_parser import summarize_build_output
 from copy import deepcopy
 
 
 def fetch_image_links(file_key: str,
                       node_ids: List[str],
                       token: str, 
-                      root_node_id: str) -> Dict[str, str]:
+                      root_node_id: str,
+                      image_format: str = "png") -> Dict[str, str]:
+    if not node_ids:
+        return {}
     if d2c_config.FIGMA_REQUEST_CACHE:
-        cached = read_image_json_cache(file_key, root_node_id, node_ids)
+        cached = read_image_json_cache(file_key, root_node_id, node_ids, image_format)
         if cached is not None:
            return cached
     url = f"https://api.figma.com/v1/images/{file_key}"
-    params = {"ids": ",".join(node_ids), "format": "png", "scale": 3}
+    params = {"ids": ",".join(node_ids), "format": image_format}
+    if image_format == "png":
+        # svg 为矢量格式，不需要 scale
+        params["scale"] = 3
     headers = {"X-Figma-Token": token}
     resp = requests.get(url, headers=headers, params=params, timeout=30)
 
@@ -33,7 +43,7 @@ def fetch_image_links(file_key: str,
         return {}
     images: Dict[str, str] = resp.json().get("images", {})
     if d2c_config.FIGMA_REQUEST_CACHE:
-        write_image_json_cache(file_key, root_node_id, images)
+        write_image_json_cache(file_key, root_node_id, images, image_format)
     return images
 
 
@@ -121,6 +131,73 @@ def get_image_ref(figma_json: dict) -> set:
     walk(figma_json)
     return refs
 
+# 可以无损导出为 svg 的叶子节点类型
+VECTOR_LEAF_TYPES = {"VECTOR", "BOOLEAN_OPERATION", "STAR", "LINE", "ELLIPSE", "REGULAR_POLYGON", "RECTANGLE"}
+# 只负责组织子节点的容器类型
+VECTOR_CONTAINER_TYPES = {"GROUP", "FRAME", "COMPONENT", "INSTANCE"}
+
+
+def is_vector_subtree(node: dict) -> bool:
+    """
+    判断节点能否以 svg 导出并转换为 VectorDrawable：
+    子树中至少有一个 VECTOR/BOOLEAN_OPERATION，且没有图片填充、渐变、文字和阴影/模糊等效果。
+    """
+    has_vector = False
+
+    def walk(current: dict) -> bool:
+        nonlocal has_vector
+        node_type = current.get("type")
+        for paint in current.get("fills", []) + current.get("strokes", []):
+            if paint.get("visible") is not False and paint.get("type") != "SOLID":
+                return False
+        if any(effect.get("visible") is not False for effect in current.get("effects", [])):
+            return False
+        if current.get("isMask"):
+            return False
+        if node_type in ("VECTOR", "BOOLEAN_OPERATION"):
+            has_vector = True
+            return True
+        if node_type in VECTOR_LEAF_TYPES:
+            return True
+        if node_type in VECTOR_CONTAINER_TYPES:
+            return all(walk(child) for child in current.get("children", []))
+        return False
+
+    return walk(node) and has_vector
+
+
+def select_icon_formats(document: dict, node_ids) -> Dict[str, str]:
+    """按节点内容选择导出格式：纯矢量子树导出 svg，其他（位图填充等）导出 png"""
+    wanted = set(node_ids)
+    formats = {node_id: "png" for node_id in wanted}
+    if not d2c_config.ExportVectorIconsAsSvg:
+        return formats
+
+    def walk(node: dict):
+        node_id = node.get("id")
+        if node_id in wanted and is_vector_subtree(node):
+            formats[node_id] = "svg"
+        for child in node.get("children", []):
+            walk(child)
+    walk(document)
+    return formats
+
+
+def get_node_sizes(document: dict, node_ids) -> Dict[str, tuple]:
+    """节点在设计稿中的尺寸 {node_id: (width, height)}，单位 dp"""
+    wanted = set(node_ids)
+    sizes = {}
+    def walk(node: dict):
+        if node.get("id") in wanted:
+            abb = node.get("absoluteBoundingBox") or {}
+            if abb.get("width") and abb.get("height"):
+                sizes[node["id"]] = (round(abb["width"]), round(abb["height"]))
+        for child in node.get("children", []):
+            walk(child)
+    walk(document)
+    return sizes
+
+
 def read_component_knowledge():
     return {}
     with open("resources/component_knowledge.json", "r") as f:
@@ -134,6 +211,14 @@ def clean_generated_code(compose_code: str) -> str:
     """clean the generated compose code to void the wrong format in Greeting.kt"""
     return compose_code.lstrip("```").lstrip("```kotlin").rstrip("```")
 
+def _build_error_message(result, workspace_dir: str) -> str:
+    """the raw output is already logged, bugfix only gets the parsed diagnostics"""
+    if not d2c_config.ParseBuildDiagnostics:
+        return result.stderr
+    summary = summarize_build_output(f"{result.stdout}\n{result.stderr}", workspace_dir)
+    tlogger().info(f"build diagnostics:\n{summary}")
+    return summary
+
 def compile(workspace_dir: str) -> tuple[bool, str]:
     """Compiles the project.
     
@@ -142,21 +227,19 @@ def compile(workspace_dir: str) -> tuple[bool, str]:
         and a string containing the error message if the compilation failed.
     """
     tlogger().info("--- COMPILE CODE WITH GRADLEW ---")
-    command = ["./gradlew", "updateDebugScreenshotTest"]
-    
-    try:
-        result = subprocess.run(
-            command,
-            cwd=workspace_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+    if d2c_config.CompileOnlyCheck:
+        # only compile Kotlin (main + unit test sources), the screenshot is rendered once by the previewer
+        result = run_gradle(workspace_dir, [*d2c_config.CompileCheckTasks, "--offline"], kind="compile")
+        if result.returncode != 0 and ("No cached version" in result.stderr or "offline mode" in result.stderr):
+            tlogger().info("offline compile misses dependencies, retry online")
+            result = run_gradle(workspace_dir, d2c_config.CompileCheckTasks, kind="compile")
+    else:
+        result = run_gradle(workspace_dir, ["updateDebugScreenshotTest"], kind="compile")
+    if result.returncode == 0:
         tlogger().info(result.stdout)
         return True, ""
-    except subprocess.CalledProcessError as e:
-        tlogger().info(f"Compilation failed with error: {e.stderr}")
-        return False, e.stderr
+    tlogger().info(f"Compilation failed with error: {result.stderr}")
+    return False, _build_error_message(result, workspace_dir)
 
 def preview(workspace_dir: str) -> tuple[bool, str, str]:
     """Previews the project.
@@ -167,20 +250,12 @@ def preview(workspace_dir: str) -> tuple[bool, str, str]:
         a string containing the path of the screenshot.
     """
     tlogger().info("--- PREVIEW PROJECT WITH GRADLEW ---")
-    command = ["./gradlew", ":app:recordPaparazziDebug"]
-    try:
-        result = subprocess.run(
-            command,
-            cwd=workspace_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+    result = run_gradle(workspace_dir, [":app:recordPaparazziDebug"], kind="preview")
+    if result.returncode == 0:
         tlogger().info(result.stdout)
         return True, "", os.path.join(workspace_dir, "app/src/test/snapshots/images/com.example.myapplication_ResourcesTest_compose[Default].png")
-    except subprocess.CalledProcessError as e:
-        tlogger().info(f"Preview failed with error: {e.stderr}")
-        return False, e.stderr, ""
+    tlogger().info(f"Preview failed with error: {result.stderr}")
+    return False, _build_error_message(result, workspace_dir), ""
 
 def find_used_icons(kotlin_code:str) -> list[str]:
     """
@@ -192,8 +267,27 @@ def find_used_icons(kotlin_code:str) -> list[str]:
     icons = re.findall(pattern, kotlin_code)
     return ["app/src/main/res/drawable-xxhdpi/" + icon + ".png" for icon in list(set(icons))]
 
+def apply_icon_aliases(kotlin_code: str, icon_aliases: Dict[str, str]) -> str:
+    """
+    把代码中引用的重复 icon 替换为去重后保留的 icon。
+
+    icon_aliases: {重复 icon 路径: 保留 icon 路径}，链式别名（A -> B -> C）替换为最终保留的 C
+    """
+    if not icon_aliases:
+        return kotlin_code
+    name_aliases = {icon_resource_name(dup): icon_resource_name(keep) for dup, keep in icon_aliases.items()}
+    name_aliases = {dup: resolve_icon_alias(name_aliases, keep) for dup, keep in name_aliases.items()}
+    def replace(match):
+        return "R.drawable." + name_aliases.get(match.group(1), match.group(1))
+    return re.sub(r"R\.drawable\.([a-zA-Z0-9_]+)\b", replace, kotlin_code)
+
+def icon_resource_name(icon_path: str) -> str:
+    """资源路径对应的 R.drawable 名称，icon.png 与 icon.xml 都是 icon"""
+    return os.path.splitext(os.path.basename(icon_path))[0]
+
 def remove_useless_icon_files(exported_icons, used_icons, workspace_dir: str):
-    need_delete_icons = set(exported_icons) - set(used_icons)
+    used_names = {icon_resource_name(icon) for icon in used_icons}
+    need_delete_icons = [icon for icon in set(exported_icons) if icon_resource_name(icon) not in used_names]
     for icon in need_delete_icons:
         icon_abs_path = os.path.join(workspace_dir, icon)
         if os.path.exists(icon_abs_path):
@@ -210,16 +304,11 @@ def get_safe_filename(raw_name: str):
 
 def get_unique_path(directory, base_name):
     """
-    若 directory/base_name 已存在，自动加 _1、_2... 直到不冲突。
+    若 directory/base_name 已存在或已被分配，自动加 _1、_2... 直到不冲突。
+    名称在内存中保留（见 NameRegistry），并发调用也不会得到相同路径。
     返回最终可用的绝对路径。
     """
-    name, ext = os.path.splitext(base_name)
-    counter = 1
-    unique = base_name
-    while os.path.exists(os.path.join(directory, unique)):
-        unique = f"{name}_{counter}{ext}"
-        counter += 1
-    return os.path.join(directory, unique)
+    return os.path.join(directory, get_name_registry(directory).reserve(base_name))
 
 def purge_figma(figma_json: Any) -> Any:
     document = figma_json.get("document", {})
@@ -289,7 +378,8 @@ def split_tree(figma_json: dict):
     return sub_figma_list
 
 
-def download_and_save_icon(save_path: str, image_url: str, max_retries: int = 3) -> str:
+def download_image_bytes(image_url: str, max_retries: int = 3) -> Optional[bytes]:
+    """下载图片内容，失败按指数退避重试，最终失败返回 None"""
     # 指数退避延迟（每次重试延迟时间：0.5s → 1s → 2s）
     retry_delays = [0.5, 1, 2]
     
@@ -302,27 +392,52 @@ def download_and_save_icon(save_path: str, image_url: str, max_retries: int = 3)
                 headers={"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"}
             )
             img_resp.raise_for_status()  # 主动抛出HTTP错误
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            with open(save_path, "wb") as f:
-                f.write(img_resp.content)
-            
             if retry > 0:
-                tlogger().info(f"Save image success after {retry} retries, save_path: {save_path}")
-            else:
-                tlogger().info(f"Save image success, save_path: {save_path}")
-            return True
+                tlogger().info(f"Download image success after {retry} retries, image_url: {image_url}")
+            return img_resp.content
         
         except Exception as e:
             # 最后一次重试失败，记录错误并返回None
             if retry == max_retries:
                 if isinstance(e, requests.exceptions.Timeout):
-                    tlogger().error(f"Download timeout after {max_retries} retries, image_url: {image_url}, save path: {save_path}")
+                    tlogger().error(f"Download timeout after {max_retries} retries, image_url: {image_url}")
                 elif isinstance(e, requests.exceptions.HTTPError):
-                    tlogger().error(f"Download failed (HTTP error) after {max_retries} retries, image_url: {image_url}, save path: {save_path}, error: {e}")
+                    tlogger().error(f"Download failed (HTTP error) after {max_retries} retries, image_url: {image_url}, error: {e}")
                 else:
-                    tlogger().error(f"Save image failed after {max_retries} retries, image_url: {image_url}, save path: {save_path}, error: {str(e)}")
-                return False
+                    tlogger().error(f"Download image failed after {max_retries} retries, image_url: {image_url}, error: {str(e)}")
+                return None
             # 非最后一次重试，记录警告并延迟重试
             delay = retry_delays[retry]
             tlogger().warning(f"Attempt {retry + 1} failed, retry after {delay}s. image_url: {image_url}, error: {str(e)}")
             time.sleep(delay)
+
+
+def download_and_save_icon(save_path: str, image_url: str, max_retries: int = 3) -> bool:
+    content = download_image_bytes(image_url, max_retries)
+    if content is None:
+        tlogger().error(f"Save image failed, image_url: {image_url}, save path: {save_path}")
+        return False
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    with open(save_path, "wb") as f:
+        f.write(content)
+    tlogger().info(f"Save image success, save_path: {save_path}")
+    return True
+
+
+def download_and_save_vector_icon(save_path: str, image_url: str, max_retries: int = 3) -> bool:
+    """下载 svg 并转换为 VectorDrawable xml 保存；下载或转换失败返回 False，由调用方回退为 png"""
+    content = download_image_bytes(image_url, max_retries)
+    if content is None:
+        tlogger().error(f"Save vector failed, image_url: {image_url}, save path: {save_path}")
+        return False
+    try:
+        vector_xml = svg_to_vector_drawable(content.decode("utf-8"))
+    except (UnsupportedSvgError, UnicodeDecodeError, ValueError) as e:
+        # any conversion error only affects this icon, it falls back to png
+        tlogger().info(f"Convert svg to vector drawable failed, save path: {save_path}, error: {e}")
+        return False
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    with open(save_path, "w", encoding="utf-8") as f:
+        f.write(vector_xml)
+    tlogger().info(f"Save vector success, save_path: {save_path}, svg bytes: {len(content)}, xml bytes: {len(vector_xml)}")
+    return True
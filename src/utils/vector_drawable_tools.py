@@ -0,0 +1,437 @@
+"""
+把 Figma 导出的 SVG 转换为 Android VectorDrawable xml（纯 Python 实现，无第三方依赖）
+
+只覆盖 Figma icon 导出中常见的子集：path/rect/circle/ellipse/line/polyline/polygon、
+g 分组及 transform、clip-path、纯色填充/描边。渐变、滤镜、位图、蒙版等 VectorDrawable
+无法等价表达的特性会抛出 UnsupportedSvgError，由调用方回退为 png 导出。
+"""
+import math
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+
+ET.register_namespace("android", ANDROID_NS)
+
+Matrix = Tuple[float, float, float, float, float, float]
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# 会被子节点继承的表现属性
+INHERITED_ATTRS = (
+    "fill", "fill-opacity", "fill-rule",
+    "stroke", "stroke-opacity", "stroke-width",
+    "stroke-linecap", "stroke-linejoin", "stroke-miterlimit",
+)
+SHAPE_TAGS = {"path", "rect", "circle", "ellipse", "line", "polyline", "polygon"}
+IGNORED_TAGS = {"defs", "title", "desc", "metadata", "clipPath", "style"}
+UNSUPPORTED_TAGS = {
+    "image", "text", "use", "mask", "pattern", "filter", "foreignObject",
+    "linearGradient", "radialGradient", "symbol", "switch",
+}
+NAMED_COLORS = {
+    "black": "#000000",
+    "white": "#FFFFFF",
+    "red": "#FF0000",
+    "green": "#008000",
+    "blue": "#0000FF",
+    "gray": "#808080",
+    "grey": "#808080",
+    "currentcolor": "#000000",
+}
+PATH_PARAM_COUNT = {
+    "m": 2, "l": 2, "h": 1, "v": 1, "c": 6, "s": 4, "q": 4, "t": 2, "a": 7, "z": 0,
+}
+HEX_COLOR_RE = re.compile(r"#(?:[0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})")
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+class UnsupportedSvgError(Exception):
+    """SVG 中包含 VectorDrawable 无法表达的特性"""
+
+
+def _local(tag: str) -> str:
+    return tag.split("}", 1)[-1]
+
+
+def _android(name: str) -> str:
+    return f"{{{ANDROID_NS}}}{name}"
+
+
+def _fmt(value: float) -> str:
+    text = f"{value:.4f}".rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
+
+
+def _length(raw: Optional[str], default: float = 0.0) -> float:
+    if raw is None or not raw.strip():
+        return default
+    match = NUMBER_RE.match(raw.strip())
+    if not match:
+        raise UnsupportedSvgError(f"invalid length: {raw}")
+    if raw.strip().endswith("%"):
+        raise UnsupportedSvgError(f"percentage length not supported: {raw}")
+    return float(match.group(0))
+
+
+def _opacity(raw: Optional[str]) -> float:
+    """opacity / fill-opacity / stroke-opacity，支持 0.5 和 50% 两种写法，结果限制在 [0, 1]"""
+    if raw is None or not raw.strip():
+        return 1.0
+    value = raw.strip()
+    try:
+        number = float(value[:-1]) / 100 if value.endswith("%") else float(value)
+    except ValueError:
+        raise UnsupportedSvgError(f"invalid opacity: {raw}") from None
+    return max(0.0, min(1.0, number))
+
+
+def _numbers(raw: str) -> List[float]:
+    return [float(n) for n in NUMBER_RE.findall(raw or "")]
+
+
+def _element_attrs(element: ET.Element) -> Dict[str, str]:
+    """合并 xml 属性与 style 属性（style 优先）"""
+    attrs = {_local(k): v.strip() for k, v in element.attrib.items()}
+    for item in attrs.pop("style", "").split(";"):
+        if ":" in item:
+            key, value = item.split(":", 1)
+            attrs[key.strip()] = value.strip()
+    return attrs
+
+
+# ---------- 颜色 ----------
+def _parse_color(raw: str) -> Optional[Tuple[str, float]]:
+    """返回 (#RRGGBB, alpha)，none/transparent 返回 None"""
+    value = raw.strip()
+    lower = value.lower()
+    if lower in ("none", "transparent"):
+        return None
+    if lower.startswith("url("):
+        raise UnsupportedSvgError(f"paint server not supported: {raw}")
+    if lower in NAMED_COLORS:
+        return NAMED_COLORS[lower], 1.0
+    if HEX_COLOR_RE.fullmatch(value):
+        hex_value = value[1:]
+        if len(hex_value) in (3, 4):
+            hex_value = "".join(c * 2 for c in hex_value)
+        if len(hex_value) == 6:
+            return f"#{hex_value.upper()}", 1.0
+        return f"#{hex_value[:6].upper()}", int(hex_value[6:], 16) / 255.0
+    if lower.startswith(("rgb(", "rgba(")) and value.endswith(")"):
+        parts = [p.strip() for p in value[value.index("(") + 1:-1].split(",")]
+        if len(parts) not in (3, 4):
+            raise UnsupportedSvgError(f"unsupported color: {raw}")
+        try:
+            channels = []
+            for part in parts[:3]:
+                channel = float(part[:-1]) * 2.55 if part.endswith("%") else float(part)
+                channels.append(max(0, min(255, round(channel))))
+        except ValueError:
+            raise UnsupportedSvgError(f"unsupported color: {raw}") from None
+        alpha = _opacity(parts[3]) if len(parts) > 3 else 1.0
+        return "#{:02X}{:02X}{:02X}".format(*channels), alpha
+    raise UnsupportedSvgError(f"unsupported color: {raw}")
+
+
+def _android_color(rgb: str, alpha: float) -> str:
+    if alpha >= 1.0:
+        return rgb
+    return "#{:02X}{}".format(max(0, min(255, round(alpha * 255))), rgb[1:])
+
+
+# ---------- transform ----------
+def _multiply(m1: Matrix, m2: Matrix) -> Matrix:
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def parse_transform(raw: str) -> Matrix:
+    matrix = IDENTITY
+    for name, args in re.findall(r"(\w+)\s*\(([^)]*)\)", raw or ""):
+        values = _numbers(args)
+        if name == "matrix" and len(values) == 6:
+            current = tuple(values)
+        elif name == "translate" and values:
+            current = (1.0, 0.0, 0.0, 1.0, values[0], values[1] if len(values) > 1 else 0.0)
+        elif name == "scale" and values:
+            sy = values[1] if len(values) > 1 else values[0]
+            current = (values[0], 0.0, 0.0, sy, 0.0, 0.0)
+        elif name == "rotate" and values:
+            rad = math.radians(values[0])
+            cos, sin = math.cos(rad), math.sin(rad)
+            current = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(values) == 3:
+                cx, cy = values[1], values[2]
+                current = _multiply(_multiply((1.0, 0.0, 0.0, 1.0, cx, cy), current), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == "skewX" and values:
+            current = (1.0, 0.0, math.tan(math.radians(values[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and values:
+            current = (1.0, math.tan(math.radians(values[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            raise UnsupportedSvgError(f"invalid transform: {name}({args})")
+        matrix = _multiply(matrix, current)
+    return matrix
+
+
+def _group_transform_attrs(matrix: Matrix) -> Dict[str, str]:
+    """
+    把仿射矩阵分解为 VectorDrawable group 支持的 scale -> rotate -> translate，
+    含 skew 的矩阵无法表达，直接抛出异常。
+    """
+    a, b, c, d, e, f = matrix
+    sx = math.hypot(a, b)
+    if sx < 1e-9:
+        raise UnsupportedSvgError("degenerate transform")
+    rotation = math.atan2(b, a)
+    sy = (a * d - b * c) / sx
+    if abs(c + math.sin(rotation) * sy) > 1e-4 or abs(d - math.cos(rotation) * sy) > 1e-4:
+        raise UnsupportedSvgError("skew transform not supported")
+    attrs = {}
+    if abs(e) > 1e-9:
+        attrs[_android("translateX")] = _fmt(e)
+    if abs(f) > 1e-9:
+        attrs[_android("translateY")] = _fmt(f)
+    if abs(rotation) > 1e-9:
+        attrs[_android("rotation")] = _fmt(math.degrees(rotation))
+    if abs(sx - 1) > 1e-9:
+        attrs[_android("scaleX")] = _fmt(sx)
+    if abs(sy - 1) > 1e-9:
+        attrs[_android("scaleY")] = _fmt(sy)
+    return attrs
+
+
+# ---------- path ----------
+def normalize_path_data(raw: str) -> str:
+    """
+    规范化 path d 属性：显式分隔每个参数，arc 的 flag 单独拆分，
+    避免低版本 Android PathParser 解析 `a1 1 0 011 1` 这类紧凑写法出错。
+    """
+    tokens = re.findall(r"[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[01]", raw or "")
+    output = []
+    command = None
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token.isalpha():
+            command = token
+            output.append(command)
+            index += 1
+            if command.lower() == "z":
+                continue
+        elif command is None:
+            raise UnsupportedSvgError(f"path data must start with a command: {raw[:30]}")
+        count = PATH_PARAM_COUNT[command.lower()]
+        if count == 0:
+            if index < len(tokens) and not tokens[index].isalpha():
+                raise UnsupportedSvgError("unexpected number after close path")
+            continue
+        params = []
+        while len(params) < count and index < len(tokens) and not tokens[index].isalpha():
+            token = tokens[index]
+            if command.lower() == "a" and len(params) in (3, 4) and len(token) > 1:
+                # 紧凑 flag：`011` -> `0` `1` `1`
+                params.append(token[0])
+                tokens[index] = token[1:]
+                continue
+            params.append(token)
+            index += 1
+        if len(params) != count:
+            raise UnsupportedSvgError(f"incomplete path segment for command {command}")
+        output.append(" ".join(_fmt(float(p)) for p in params))
+    return " ".join(output)
+
+
+def _rect_path(attrs: Dict[str, str]) -> str:
+    x, y = _length(attrs.get("x")), _length(attrs.get("y"))
+    w, h = _length(attrs.get("width")), _length(attrs.get("height"))
+    if w <= 0 or h <= 0:
+        return ""
+    rx_raw, ry_raw = attrs.get("rx"), attrs.get("ry")
+    rx = _length(rx_raw if rx_raw is not None else ry_raw)
+    ry = _length(ry_raw if ry_raw is not None else rx_raw)
+    rx, ry = min(rx, w / 2), min(ry, h / 2)
+    if rx <= 0 or ry <= 0:
+        return f"M{_fmt(x)} {_fmt(y)}H{_fmt(x + w)}V{_fmt(y + h)}H{_fmt(x)}Z"
+    arc = f"A{_fmt(rx)} {_fmt(ry)} 0 0 1"
+    return (
+        f"M{_fmt(x + rx)} {_fmt(y)}H{_fmt(x + w - rx)}{arc} {_fmt(x + w)} {_fmt(y + ry)}"
+        f"V{_fmt(y + h - ry)}{arc} {_fmt(x + w - rx)} {_fmt(y + h)}"
+        f"H{_fmt(x + rx)}{arc} {_fmt(x)} {_fmt(y + h - ry)}"
+        f"V{_fmt(y + ry)}{arc} {_fmt(x + rx)} {_fmt(y)}Z"
+    )
+
+
+def _ellipse_path(cx: float, cy: float, rx: float, ry: float) -> str:
+    if rx <= 0 or ry <= 0:
+        return ""
+    arc = f"A{_fmt(rx)} {_fmt(ry)} 0 1 1"
+    return f"M{_fmt(cx - rx)} {_fmt(cy)}{arc} {_fmt(cx + rx)} {_fmt(cy)}{arc} {_fmt(cx - rx)} {_fmt(cy)}Z"
+
+
+def _shape_path(tag: str, attrs: Dict[str, str]) -> str:
+    if tag == "path":
+        return normalize_path_data(attrs.get("d", ""))
+    if tag == "rect":
+        return _rect_path(attrs)
+    if tag == "circle":
+        r = _length(attrs.get("r"))
+        return _ellipse_path(_length(attrs.get("cx")), _length(attrs.get("cy")), r, r)
+    if tag == "ellipse":
+        return _ellipse_path(_length(attrs.get("cx")), _length(attrs.get("cy")),
+                             _length(attrs.get("rx")), _length(attrs.get("ry")))
+    if tag == "line":
+        return (f"M{_fmt(_length(attrs.get('x1')))} {_fmt(_length(attrs.get('y1')))}"
+                f"L{_fmt(_length(attrs.get('x2')))} {_fmt(_length(attrs.get('y2')))}")
+    if tag in ("polyline", "polygon"):
+        points = _numbers(attrs.get("points", ""))
+        if len(points) < 4:
+            return ""
+        pairs = [f"{_fmt(points[i])} {_fmt(points[i + 1])}" for i in range(0, len(points) - 1, 2)]
+        return "M" + "L".join(pairs) + ("Z" if tag == "polygon" else "")
+    raise UnsupportedSvgError(f"unsupported shape: {tag}")
+
+
+class _Converter:
+    def __init__(self, root: ET.Element):
+        self.root = root
+        self.clip_paths: Dict[str, ET.Element] = {}
+        for element in root.iter():
+            if _local(element.tag) == "clipPath" and element.get("id"):
+                self.clip_paths[element.get("id")] = element
+        self.path_count = 0
+
+    def convert(self) -> ET.Element:
+        attrs = _element_attrs(self.root)
+        view_box = _numbers(attrs.get("viewBox", ""))
+        width = _length(attrs.get("width"), view_box[2] if len(view_box) == 4 else 0)
+        height = _length(attrs.get("height"), view_box[3] if len(view_box) == 4 else 0)
+        if len(view_box) != 4:
+            view_box = [0.0, 0.0, width, height]
+        if width <= 0 or height <= 0 or view_box[2] <= 0 or view_box[3] <= 0:
+            raise UnsupportedSvgError("svg has no valid size")
+
+        vector = ET.Element("vector", {
+            _android("width"): f"{_fmt(width)}dp",
+            _android("height"): f"{_fmt(height)}dp",
+            _android("viewportWidth"): _fmt(view_box[2]),
+            _android("viewportHeight"): _fmt(view_box[3]),
+        })
+        parent = vector
+        if view_box[0] or view_box[1]:
+            parent = ET.SubElement(vector, "group", {
+                _android("translateX"): _fmt(-view_box[0]),
+                _android("translateY"): _fmt(-view_box[1]),
+            })
+        inherited = {"fill": "#000000"}
+        inherited.update({k: attrs[k] for k in INHERITED_ATTRS if k in attrs})
+        opacity = _opacity(attrs.get("opacity"))
+        for child in self.root:
+            self._convert_node(child, parent, inherited, opacity)
+        if self.path_count == 0:
+            raise UnsupportedSvgError("svg contains no drawable path")
+        return vector
+
+    def _clip_path_data(self, reference: str) -> str:
+        match = re.fullmatch(r"url\(\s*#([^)]+?)\s*\)", reference.strip())
+        if not match or match.group(1) not in self.clip_paths:
+            raise UnsupportedSvgError(f"clip-path not resolved: {reference}")
+        parts = []
+        for child in self.clip_paths[match.group(1)]:
+            tag = _local(child.tag)
+            attrs = _element_attrs(child)
+            if tag not in SHAPE_TAGS or "transform" in attrs:
+                raise UnsupportedSvgError(f"unsupported clip-path child: {tag}")
+            parts.append(_shape_path(tag, attrs))
+        return " ".join(p for p in parts if p)
+
+    def _wrap_group(self, parent: ET.Element, attrs: Dict[str, str]) -> ET.Element:
+        """transform / clip-path 需要一个 group 承载"""
+        group_attrs = {}
+        if attrs.get("transform"):
+            group_attrs = _group_transform_attrs(parse_transform(attrs["transform"]))
+        clip = attrs.get("clip-path")
+        if not group_attrs and (not clip or clip == "none"):
+            return parent
+        group = ET.SubElement(parent, "group", group_attrs)
+        if clip and clip != "none":
+            clip_data = self._clip_path_data(clip)
+            if clip_data:
+                ET.SubElement(group, "clip-path", {_android("pathData"): clip_data})
+        return group
+
+    def _convert_node(self, element: ET.Element, parent: ET.Element, inherited: Dict[str, str], opacity: float):
+        tag = _local(element.tag)
+        if tag in IGNORED_TAGS:
+            return
+        if tag in UNSUPPORTED_TAGS:
+            raise UnsupportedSvgError(f"unsupported element: {tag}")
+        attrs = _element_attrs(element)
+        for key in ("mask", "filter"):
+            if attrs.get(key) and attrs[key] != "none":
+                raise UnsupportedSvgError(f"unsupported attribute: {key}")
+        if attrs.get("display") == "none" or attrs.get("visibility") == "hidden":
+            return
+        current = dict(inherited)
+        current.update({k: attrs[k] for k in INHERITED_ATTRS if k in attrs})
+        # VectorDrawable 的 group 不支持 alpha，把 opacity 乘到子 path 上
+        current_opacity = opacity * _opacity(attrs.get("opacity"))
+        target = self._wrap_group(parent, attrs)
+        if tag in ("g", "svg", "a"):
+            for child in element:
+                self._convert_node(child, target, current, current_opacity)
+        elif tag in SHAPE_TAGS:
+            self._emit_path(_shape_path(tag, attrs), target, current, current_opacity)
+        else:
+            raise UnsupportedSvgError(f"unsupported element: {tag}")
+
+    def _emit_path(self, path_data: str, parent: ET.Element, paint: Dict[str, str], opacity: float):
+        if not path_data:
+            return
+        path_attrs = {_android("pathData"): path_data}
+        fill = _parse_color(paint.get("fill", "none"))
+        if fill:
+            alpha = fill[1] * _opacity(paint.get("fill-opacity")) * opacity
+            path_attrs[_android("fillColor")] = _android_color(fill[0], alpha)
+            if paint.get("fill-rule") == "evenodd":
+                path_attrs[_android("fillType")] = "evenOdd"
+        stroke = _parse_color(paint.get("stroke", "none"))
+        stroke_width = _length(paint.get("stroke-width"), 1.0)
+        if stroke and stroke_width > 0:
+            alpha = stroke[1] * _opacity(paint.get("stroke-opacity")) * opacity
+            path_attrs[_android("strokeColor")] = _android_color(stroke[0], alpha)
+            path_attrs[_android("strokeWidth")] = _fmt(stroke_width)
+            if paint.get("stroke-linecap") in ("round", "square"):
+                path_attrs[_android("strokeLineCap")] = paint["stroke-linecap"]
+            if paint.get("stroke-linejoin") in ("round", "bevel"):
+                path_attrs[_android("strokeLineJoin")] = paint["stroke-linejoin"]
+            if paint.get("stroke-miterlimit"):
+                path_attrs[_android("strokeMiterLimit")] = _fmt(_length(paint["stroke-miterlimit"]))
+        if len(path_attrs) == 1:
+            return
+        ET.SubElement(parent, "path", path_attrs)
+        self.path_count += 1
+
+
+def svg_to_vector_drawable(svg_content: str) -> str:
+    """
+    把 svg 字符串转换为 VectorDrawable xml 字符串。
+    无法等价转换时抛出 UnsupportedSvgError。
+    """
+    try:
+        root = ET.fromstring(svg_content)
+    except ET.ParseError as e:
+        raise UnsupportedSvgError(f"invalid svg: {e}") from e
+    if _local(root.tag) != "svg":
+        raise UnsupportedSvgError(f"root element is not svg: {root.tag}")
+    vector = _Converter(root).convert()
+    ET.indent(vector, space="    ")
+    return ET.tostring(vector, encoding="unicode") + "\n"
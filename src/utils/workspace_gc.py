@@ -0,0 +1,171 @@
+"""
+OUTPUT_DIR 垃圾回收：按保留时间和磁盘配额清理已结束任务的工作区、输出目录、压缩包和日志。
+
+OUTPUT_DIR 下与任务相关的条目：
+- <task_id>/                                运行中或失败的任务工作区
+- <task_id>.log, <task_id>.log.1 ...         任务日志
+- <figma_title>_<node_id>_<task_id>/, .zip   成功任务重命名后的输出目录和压缩包
+以 "." 开头的目录（工作区池、黄金模板、编译服务等）不属于任务，不会被清理。
+"""
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import d2c_config
+import d2c_datautil
+from d2c_logger import tlogger
+
+TASK_ID_PREFIX = re.compile(r"^(\d+)(?:\.log(?:\.\d+)?)?$")
+TASK_ID_SUFFIX = re.compile(r"_(\d+)(?:\.zip)?$")
+
+
+def task_id_of(entry_name: str) -> Optional[int]:
+    """从 OUTPUT_DIR 下的条目名解析任务 id，不是任务条目返回 None"""
+    if entry_name.startswith("."):
+        return None
+    match = TASK_ID_PREFIX.match(entry_name) or TASK_ID_SUFFIX.search(entry_name)
+    return int(match.group(1)) if match else None
+
+
+def disk_usage(path: str, seen_inodes: Set[tuple]) -> int:
+    """实际占用的字节数；硬链接共享的 inode 只计一次（写时复制工作区）"""
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            st = os.lstat(current)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) in seen_inodes:
+            continue
+        seen_inodes.add((st.st_dev, st.st_ino))
+        total += st.st_blocks * 512
+        if os.path.isdir(current) and not os.path.islink(current):
+            try:
+                stack.extend(os.path.join(current, name) for name in os.listdir(current))
+            except OSError:
+                continue
+    return total
+
+
+class TaskEntries:
+    """同一个任务在 OUTPUT_DIR 下的所有条目"""
+
+    def __init__(self, task_id: int):
+        self.task_id = task_id
+        self.paths: List[str] = []
+        self.size = 0
+        self.last_modified = 0.0
+
+    def add(self, path: str, size: int):
+        self.paths.append(path)
+        self.size += size
+        try:
+            self.last_modified = max(self.last_modified, os.lstat(path).st_mtime)
+        except OSError:
+            pass
+
+
+class WorkspaceGC:
+    """
+    OUTPUT_DIR 垃圾回收
+    :param output_directory: 任务输出根目录
+    :param retention:        已结束任务的保留时间(秒)，超过即删除
+    :param quota_bytes:      OUTPUT_DIR 的磁盘配额，超过时从最旧的已结束任务开始删除，直到低于配额
+    :param min_age:          最近修改时间在该时间(秒)内的条目不删除，保护刚结束或由其他进程创建的任务
+    """
+
+    def __init__(self, output_directory: str, retention: float, quota_bytes: int, min_age: float):
+        self._output_directory = output_directory
+        self._retention = retention
+        self._quota_bytes = quota_bytes
+        self._min_age = min_age
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- 公共 API ----------
+    def collect(self) -> Dict[str, int]:
+        """执行一次回收，返回统计信息"""
+        if not os.path.isdir(self._output_directory):
+            return {"removed_tasks": 0, "reclaimed_bytes": 0, "used_bytes": 0}
+        running = set(d2c_datautil.list_running_task_ids())
+        seen_inodes: Set[tuple] = set()
+        used_bytes = 0
+        tasks: Dict[int, TaskEntries] = {}
+        for name in os.listdir(self._output_directory):
+            path = os.path.join(self._output_directory, name)
+            size = disk_usage(path, seen_inodes)
+            used_bytes += size
+            task_id = task_id_of(name)
+            if task_id is None:
+                continue
+            tasks.setdefault(task_id, TaskEntries(task_id)).add(path, size)
+
+        now = time.time()
+        candidates = sorted((t for t in tasks.values()
+                             if t.task_id not in running and now - t.last_modified > self._min_age),
+                            key=lambda t: t.last_modified)
+        removed, reclaimed = 0, 0
+        for entries in candidates:
+            expired = now - entries.last_modified > self._retention
+            over_quota = used_bytes - reclaimed > self._quota_bytes
+            if not expired and not over_quota:
+                continue
+            reason = "expired" if expired else "over quota"
+            tlogger().info(f"gc task {entries.task_id} ({reason}), {entries.size} bytes: {entries.paths}")
+            for path in entries.paths:
+                self._remove(path)
+            removed += 1
+            reclaimed += entries.size
+        stats = {"removed_tasks": removed, "reclaimed_bytes": reclaimed, "used_bytes": used_bytes - reclaimed}
+        tlogger().info(f"workspace gc done, removed tasks: {removed}, reclaimed: {reclaimed / 1024 / 1024:.1f}MB, "
+                       f"used: {stats['used_bytes'] / 1024 / 1024:.1f}MB / quota {self._quota_bytes / 1024 / 1024:.1f}MB")
+        return stats
+
+    def start(self, interval: float):
+        """启动后台回收线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="workspace_gc", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # ---------- 内部 ----------
+    def _loop(self, interval: float):
+        while not self._stop_event.is_set():
+            try:
+                self.collect()
+            except Exception as e:
+                tlogger().info(f"workspace gc failed: {e}")
+            self._stop_event.wait(interval)
+
+    @staticmethod
+    def _remove(path: str):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+
+# ---------- 进程内共享的回收器 ----------
+_gc_lock = threading.Lock()
+_gc: Optional[WorkspaceGC] = None
+
+
+def start_workspace_gc() -> Optional[WorkspaceGC]:
+    """WorkspaceGcIntervalSeconds 为 0 时不启用"""
+    global _gc
+    if d2c_config.WorkspaceGcIntervalSeconds <= 0:
+        return None
+    with _gc_lock:
+        if _gc is None:
+            _gc = WorkspaceGC(d2c_config.OUTPUT_DIR, d2c_config.WorkspaceRetentionSeconds,
+                              d2c_config.OutputDirQuotaBytes, d2c_config.WorkspaceGcMinAgeSeconds)
+            _gc.start(d2c_config.WorkspaceGcIntervalSeconds)
+        return _gc
@@ -0,0 +1,162 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Optional, Tuple
+
+import d2c_config
+from d2c_logger import tlogger
+from utils.container_tools import prepare_container, warm_up_gradle, reset_workspace
+
+# 就绪标记放在工作区旁边而不是里面，避免被任务的 git add 提交
+READY_SUFFIX = ".ready"
+
+
+class WorkspacePool:
+    """
+    预热工作区池（线程安全）
+    :param pool_directory: 存放预热工作区的目录，需与任务工作区在同一文件系统，领取时直接 rename
+    :param size:           保持就绪的工作区数量
+    :param max_age:        就绪工作区的最长保留时间(秒)，过期后丢弃重建，避免模板仓库落后太多
+
+    每个预热工作区都已克隆模板仓库、准备好 JDK 并执行过一次 Gradle 构建。
+    任务领取后后台自动补充；用完的工作区可以交回，后台 git checkout/clean 后重新入池。
+    """
+
+    def __init__(self, pool_directory: str, size: int, max_age: float):
+        self._pool_directory = pool_directory
+        self._size = size
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        # (工作区路径, 就绪时间)
+        self._ready: Deque[Tuple[str, float]] = deque()
+        self._warming = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix="workspace_pool")
+
+    # ---------- 公共 API ----------
+    def start(self):
+        """加载上次进程留下的就绪工作区，清理未完成的，然后补满"""
+        os.makedirs(self._pool_directory, exist_ok=True)
+        for name in sorted(os.listdir(self._pool_directory)):
+            path = os.path.join(self._pool_directory, name)
+            if name.endswith(READY_SUFFIX) or not os.path.isdir(path):
+                continue
+            marker = path + READY_SUFFIX
+            if os.path.isfile(marker):
+                self._ready.append((path, os.path.getmtime(marker)))
+            else:
+                self._discard(path)
+        tlogger().info(f"workspace pool start, ready: {len(self._ready)}, size: {self._size}")
+        self._refill()
+
+    def acquire(self, target_directory: str) -> bool:
+        """
+        领取一个就绪工作区并移动到 target_directory（不能已存在），没有可用的返回 False，由调用方冷启动
+        """
+        workspace = self._pop_ready()
+        self._refill()
+        if workspace is None:
+            tlogger().info("no pre-warmed workspace available")
+            return False
+        os.remove(workspace + READY_SUFFIX)
+        os.rename(workspace, target_directory)
+        tlogger().info(f"acquire pre-warmed workspace {workspace} -> {target_directory}")
+        return True
+
+    def recycle(self, workspace_directory: str):
+        """交回用过的工作区，后台重置后入池；池已满时直接删除"""
+        self._executor.submit(self._recycle, workspace_directory)
+
+    def ready_count(self) -> int:
+        with self._lock:
+            return len(self._ready)
+
+    # ---------- 内部 ----------
+    def _pop_ready(self) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            while self._ready:
+                path, ready_at = self._ready.popleft()
+                if now - ready_at <= self._max_age:
+                    return path
+                tlogger().info(f"pre-warmed workspace expired: {path}")
+                self._executor.submit(self._discard, path)
+        return None
+
+    def _refill(self):
+        with self._lock:
+            missing = self._size - len(self._ready) - self._warming
+            if missing <= 0:
+                return
+            self._warming += missing
+        for _ in range(missing):
+            self._executor.submit(self._warm)
+
+    def _new_path(self) -> str:
+        return os.path.join(self._pool_directory, f"ws_{uuid.uuid4().hex[:12]}")
+
+    def _warm(self):
+        path = self._new_path()
+        start = time.perf_counter()
+        try:
+            os.makedirs(path)
+            prepare_container(path)
+            warm_up_gradle(path)
+            self._mark_ready(path)
+            tlogger().info(f"workspace warmed: {path}, 耗时: {time.perf_counter() - start:.3f}s")
+        except Exception as e:
+            tlogger().info(f"warm workspace failed: {e}")
+            self._discard(path)
+        finally:
+            with self._lock:
+                self._warming -= 1
+
+    def _recycle(self, workspace_directory: str):
+        with self._lock:
+            full = len(self._ready) + self._warming >= self._size
+        if full or not os.path.isdir(os.path.join(workspace_directory, ".git")):
+            self._discard(workspace_directory)
+            return
+        path = self._new_path()
+        try:
+            os.rename(workspace_directory, path)
+            reset_workspace(path)
+            self._mark_ready(path)
+            tlogger().info(f"workspace recycled: {workspace_directory} -> {path}")
+        except Exception as e:
+            tlogger().info(f"recycle workspace failed: {e}")
+            self._discard(path)
+            self._discard(workspace_directory)
+
+    def _mark_ready(self, path: str):
+        with open(path + READY_SUFFIX, "w") as f:
+            f.write(str(time.time()))
+        with self._lock:
+            self._ready.append((path, time.time()))
+
+    @staticmethod
+    def _discard(path: str):
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(path + READY_SUFFIX):
+            os.remove(path + READY_SUFFIX)
+
+
+# ---------- 进程内共享的工作区池 ----------
+_pool_lock = threading.Lock()
+_pool: Optional[WorkspacePool] = None
+
+
+def get_workspace_pool() -> Optional[WorkspacePool]:
+    """WorkspacePoolSize 为 0 或使用写时复制工作区时不启用，返回 None"""
+    global _pool
+    if d2c_config.WorkspacePoolSize <= 0 or d2c_config.WorkspaceCopyOnWrite:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkspacePool(os.path.join(d2c_config.OUTPUT_DIR, d2c_config.WorkspacePoolDirName),
+                                  d2c_config.WorkspacePoolSize, d2c_config.WorkspacePoolMaxAgeSeconds)
+            _pool.start()
+        return _pool
@@ -0,0 +1,199 @@
+"""
+写时复制的任务工作区：主机上只保留一份不可变的黄金模板（已克隆、JDK 就绪、执行过一次 Gradle 构建），
+每个任务的工作区从模板快照得到，磁盘占用只随任务自己的改动增长。
+
+快照方式：
+- reflink: cp -a --reflink=always，文件数据块共享，写入时由文件系统复制（btrfs/xfs 等）
+- hardlink: 硬链接农场，模板文件去掉写权限防止被原地修改；任务会写入的目录（WorkspaceCowCopiedDirs）整体复制，
+  其余文件在本进程写入前用 ensure_private_copy 断开硬链接。Gradle 会原地改写构建输出，app/build、build、.gradle
+  只能整体复制，每个工作区固定多占这几个目录的大小（通常是模板里最大的部分），磁盘占用不只随任务的改动增长
+- auto: 优先 reflink，文件系统不支持时退回 hardlink
+
+快照期间持有模板的共享租约（模板旁的 .<模板目录名>.lease 文件锁），重建后删除旧模板前要拿到独占租约，
+仍有任务在快照的旧模板留到之后的 ensure_template 再删。
+"""
+import fcntl
+import os
+import shutil
+import stat
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import d2c_config
+from d2c_logger import tlogger
+from utils.container_tools import prepare_container, warm_up_gradle
+
+TEMPLATE_LINK = "current"
+TEMPLATE_LOCK = ".lock"
+
+_template_lock = threading.Lock()
+
+
+def _template_root() -> str:
+    return os.path.join(d2c_config.OUTPUT_DIR, d2c_config.WorkspaceTemplateDirName)
+
+
+def _is_copied_dir(rel_path: str) -> bool:
+    return any(rel_path == d or rel_path.startswith(d + os.sep) for d in d2c_config.WorkspaceCowCopiedDirs)
+
+
+def _protect_template(template_directory: str):
+    """去掉会被硬链接共享的文件的写权限，任何原地写入都会失败，而不是悄悄改坏模板"""
+    for root, dirs, files in os.walk(template_directory):
+        rel_root = os.path.relpath(root, template_directory)
+        if rel_root != "." and _is_copied_dir(rel_root):
+            dirs[:] = []
+            continue
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            if _is_copied_dir(os.path.relpath(path, template_directory)) or os.path.islink(path):
+                continue
+            mode = os.stat(path).st_mode
+            os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _build_template(template_root: str) -> str:
+    template_directory = os.path.join(template_root, f"template_{int(time.time())}")
+    start = time.perf_counter()
+    os.makedirs(template_directory)
+    try:
+        prepare_container(template_directory)
+        warm_up_gradle(template_directory)
+        _protect_template(template_directory)
+    except Exception:
+        shutil.rmtree(template_directory, ignore_errors=True)
+        raise
+    # 用符号链接原子切换，正在从旧模板快照的任务不受影响
+    tmp_link = os.path.join(template_root, f"{TEMPLATE_LINK}.tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.basename(template_directory), tmp_link)
+    os.replace(tmp_link, os.path.join(template_root, TEMPLATE_LINK))
+    tlogger().info(f"workspace template built: {template_directory}, 耗时: {time.perf_counter() - start:.3f}s")
+    return template_directory
+
+
+def _lease_path(template_directory: str) -> str:
+    return os.path.join(os.path.dirname(template_directory), f".{os.path.basename(template_directory)}.lease")
+
+
+def _remove_stale_templates(template_root: str, current: str):
+    """删除旧模板；有任务正在从它快照（持有共享租约）时跳过，留到下次再删"""
+    for name in os.listdir(template_root):
+        path = os.path.join(template_root, name)
+        if not name.startswith("template_") or path == current or not os.path.isdir(path):
+            continue
+        with open(_lease_path(path), "a") as lease_file:
+            try:
+                fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                tlogger().info(f"stale workspace template still in use, remove it later: {path}")
+                continue
+            try:
+                tlogger().info(f"remove stale workspace template: {path}")
+                shutil.rmtree(path, ignore_errors=True)
+                os.remove(_lease_path(path))
+            finally:
+                fcntl.flock(lease_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def template_lease():
+    """
+    返回当前的黄金模板目录，不存在或超过 WorkspaceTemplateMaxAgeSeconds 时重建；with 块内持有模板的共享租约，模板不会被删除。
+    进程内用线程锁、进程间用文件锁，同一主机只会有一个构建者。
+    """
+    template_root = _template_root()
+    os.makedirs(template_root, exist_ok=True)
+    link = os.path.join(template_root, TEMPLATE_LINK)
+    with _template_lock, open(os.path.join(template_root, TEMPLATE_LOCK), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            current = os.path.realpath(link) if os.path.isdir(link) else None
+            if current and time.time() - os.path.getmtime(current) > d2c_config.WorkspaceTemplateMaxAgeSeconds:
+                tlogger().info(f"workspace template expired: {current}")
+                current = None
+            if current is None:
+                current = _build_template(template_root)
+            _remove_stale_templates(template_root, current)
+            # 在构建锁内拿到租约，释放构建锁之后的重建也不会删除这个模板
+            lease_file = open(_lease_path(current), "a")
+            fcntl.flock(lease_file, fcntl.LOCK_SH)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    try:
+        yield current
+    finally:
+        fcntl.flock(lease_file, fcntl.LOCK_UN)
+        lease_file.close()
+
+
+def ensure_template() -> str:
+    """返回当前的黄金模板目录（不持有租约，只用于预先构建模板）"""
+    with template_lease() as current:
+        return current
+
+
+def _reflink_snapshot(template_directory: str, workspace_directory: str) -> bool:
+    result = subprocess.run(["cp", "-a", "--reflink=always", template_directory, workspace_directory],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        tlogger().info(f"reflink snapshot not supported: {result.stderr.strip()}")
+        shutil.rmtree(workspace_directory, ignore_errors=True)
+        return False
+    # reflink 复制出来的是独立文件，恢复模板去掉的写权限
+    subprocess.run(["chmod", "-R", "u+w", workspace_directory], capture_output=True)
+    return True
+
+
+def _hardlink_snapshot(template_directory: str, workspace_directory: str) -> int:
+    """返回整体复制的字节数"""
+    copied_bytes = 0
+    for root, dirs, files in os.walk(template_directory):
+        rel_root = os.path.relpath(root, template_directory)
+        target_root = os.path.join(workspace_directory, rel_root) if rel_root != "." else workspace_directory
+        if rel_root != "." and _is_copied_dir(rel_root):
+            shutil.copytree(root, target_root, symlinks=True)
+            copied_bytes += sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(target_root)
+                                for f in fs if not os.path.islink(os.path.join(r, f)))
+            dirs[:] = []
+            continue
+        os.makedirs(target_root, exist_ok=True)
+        for file_name in files:
+            source = os.path.join(root, file_name)
+            target = os.path.join(target_root, file_name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), target)
+            else:
+                os.link(source, target)
+    return copied_bytes
+
+
+def create_workspace_from_template(workspace_directory: str, strategy: Optional[str] = None):
+    """从黄金模板创建任务工作区，workspace_directory 不能已存在"""
+    strategy = strategy or d2c_config.WorkspaceCowStrategy
+    with template_lease() as template_directory:
+        start = time.perf_counter()
+        if strategy in ("auto", "reflink") and _reflink_snapshot(template_directory, workspace_directory):
+            used = "reflink"
+        elif strategy in ("auto", "hardlink"):
+            copied_bytes = _hardlink_snapshot(template_directory, workspace_directory)
+            used = f"hardlink, {copied_bytes / 1024 / 1024:.1f}MB copied"
+        else:
+            raise Exception(f"create workspace by {strategy} failed")
+    tlogger().info(f"workspace created from template by {used}: {workspace_directory}, 耗时: {time.perf_counter() - start:.3f}s")
+
+
+def ensure_private_copy(file_path: str):
+    """
+    写入前断开硬链接：文件与模板共享 inode 时先复制一份私有文件再替换，写入不会影响模板和其他任务
+    """
+    if not os.path.isfile(file_path) or os.stat(file_path).st_nlink <= 1:
+        return
+    tmp_path = f"{file_path}.cow_tmp"
+    shutil.copy2(file_path, tmp_path)
+    os.chmod(tmp_path, os.stat(tmp_path).st_mode | stat.S_IWUSR)
+    os.replace(tmp_path, file_path)
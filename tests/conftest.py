@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 源码在 src 下，和服务运行时一样按顶层模块导入（d2c_config、utils.xxx）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
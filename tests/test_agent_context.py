@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+import d2c_config
+from utils.agent_context import compact_messages, compaction_hook
+
+GREETING = "\n".join(f"    Text(text = \"line {i}\")" for i in range(100))
+
+
+@pytest.fixture(autouse=True)
+def context_limits(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(d2c_config, "AgentContextKeepRecentToolResults", 1)
+    monkeypatch.setattr(d2c_config, "AgentContextToolResultMaxChars", 100)
+    monkeypatch.setattr(d2c_config, "AgentContextDiffMaxRatio", 0.5)
+    monkeypatch.setattr(d2c_config, "AgentContextMaxChars", 1_000_000)
+
+
+def _round(call_id, name, args, result, status="success"):
+    return [AIMessage(content="", tool_calls=[{"id": call_id, "name": name, "args": args}]),
+            ToolMessage(content=result, tool_call_id=call_id, status=status)]
+
+
+def _read(call_id, content, path="/w/Greeting.kt"):
+    return _round(call_id, "read_file", {"abs_path": path}, content)
+
+
+def _task():
+    return [SystemMessage(content="fix the build"), HumanMessage(content="build error: ...")]
+
+
+def test_reread_of_a_slightly_changed_file_becomes_a_diff():
+    changed = GREETING.replace('"line 50"', '"line fifty"')
+    messages = _task() + _read("1", GREETING) + _round("2", "edit_file", {}, "ok") + _read("3", changed)
+    compacted = compact_messages(messages)
+    # 作为 diff 基准的完整读取不截断
+    assert compacted[3].content == GREETING
+    assert compacted[7].content.startswith("[/w/Greeting.kt changed since the earlier read_file result")
+    assert '+    Text(text = "line fifty")' in compacted[7].content
+    # 不修改传入的消息
+    assert messages[7].content == changed
+
+
+def test_unchanged_and_heavily_changed_rereads():
+    rewritten = "\n".join(f"    Button(onClick = {{}}) {{ {i} }}" for i in range(100))
+    messages = _task() + _read("1", GREETING) + _read("2", GREETING) + _read("3", rewritten)
+    compacted = compact_messages(messages)
+    assert compacted[5].content == "[/w/Greeting.kt is unchanged since the earlier read_file result]"
+    assert compacted[3].content == "[outdated content of /w/Greeting.kt, it is read again below]"
+    assert compacted[7].content == rewritten
+
+
+def test_old_tool_results_are_truncated():
+    log = "e: error\n" * 50
+    messages = _task() + _round("1", "run_build", {}, log) + _round("2", "run_build", {}, log)
+    compacted = compact_messages(messages)
+    assert compacted[3].content.startswith(log[:100]) and "characters of an older tool result truncated" in compacted[3].content
+    assert compacted[5].content == log
+
+
+def test_failed_reads_are_not_diff_bases():
+    messages = _task() + _round("1", "read_file", {"abs_path": "/w/a.kt"}, "no such file", status="error") \
+        + _read("2", GREETING, path="/w/a.kt")
+    assert compact_messages(messages)[5].content == GREETING
+
+
+def test_oldest_rounds_are_dropped_over_the_limit(monkeypatch):
+    monkeypatch.setattr(d2c_config, "AgentContextMaxChars", 300)
+    messages = _task() + [m for i in range(5) for m in _round(str(i), "run_build", {}, f"result {i} " * 10)]
+    compacted = compact_messages(messages)
+    assert compacted[:2] == messages[:2]
+    assert "earlier tool call rounds are omitted" in compacted[2].content
+    assert compacted[-1].content == messages[-1].content
+    assert sum(len(m.content) for m in compacted) <= 300
+    # 最近一轮总是保留
+    monkeypatch.setattr(d2c_config, "AgentContextMaxChars", 1)
+    assert compact_messages(messages)[-2:] == messages[-2:]
+
+
+def test_compaction_hook_only_changes_the_model_input():
+    state = {"messages": _task() + _read("1", GREETING)}
+    assert list(compaction_hook(state)) == ["llm_input_messages"]
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+import d2c_logger
+from d2c_logger import logger_task_id
+from utils.async_llm import get_llm_event_loop, run_async
+
+
+async def _loop_and_task_id(delay=0.0):
+    await asyncio.sleep(delay)
+    return asyncio.get_running_loop(), logger_task_id()
+
+
+def _in_task_thread(task_id, results):
+    def run():
+        d2c_logger.task_context.logger = logging.getLogger(f"task_{task_id}")
+        d2c_logger.task_context.task_id = task_id
+        results[task_id] = run_async(_loop_and_task_id(0.2), timeout=5)
+
+    return threading.Thread(target=run)
+
+
+def test_run_async_returns_the_result_on_the_shared_loop():
+    loop, _ = run_async(_loop_and_task_id(), timeout=5)
+    assert loop is get_llm_event_loop()
+    assert loop is not None and loop.is_running()
+
+
+def test_coroutines_keep_the_callers_task_context():
+    results = {}
+    threads = [_in_task_thread(task_id, results) for task_id in (1, 2, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert {task_id: result[1] for task_id, result in results.items()} == {1: 1, 2: 2, 3: 3}
+    # 并发的请求共用同一个事件循环
+    assert len({id(result[0]) for result in results.values()}) == 1
+
+
+def test_exceptions_and_timeouts_reach_the_caller():
+    async def fail():
+        raise ValueError("bad response")
+
+    with pytest.raises(ValueError, match="bad response"):
+        run_async(fail(), timeout=5)
+    with pytest.raises(TimeoutError):
+        run_async(asyncio.sleep(1), timeout=0.05)
@@ -0,0 +1,63 @@
+import d2c_config
+from utils.build_output_parser import parse_build_output, summarize_build_output
+
+WORKSPACE = "/tmp/d2c_task_output/1"
+GREETING = f"{WORKSPACE}/app/src/main/java/com/example/myapplication/Greeting.kt"
+
+KOTLIN_OUTPUT = f"""
+> Task :app:compileDebugKotlin FAILED
+w: file://{GREETING}:3:1 Variable 'x' is never used
+e: file://{WORKSPACE}/app/src/test/java/ResourcesTest.kt:20:5 Unresolved reference: Greeting2
+e: file://{GREETING}:12:5 Unresolved reference: foo
+e: {GREETING}: (12, 5): Unresolved reference: foo
+{GREETING}:8:9: error: Type mismatch: inferred type is String but Int was expected
+
+FAILURE: Build failed with an exception.
+
+* What went wrong:
+Execution failed for task ':app:compileDebugKotlin'.
+> Compilation error. See log for more details
+"""
+
+
+def test_kotlin_errors_deduplicated_and_ranked():
+    diagnostics = parse_build_output(KOTLIN_OUTPUT, WORKSPACE)
+    assert [str(d) for d in diagnostics] == [
+        "app/src/main/java/com/example/myapplication/Greeting.kt:8:9: Type mismatch: inferred type is String but Int was expected",
+        "app/src/main/java/com/example/myapplication/Greeting.kt:12:5: Unresolved reference: foo",
+        "app/src/test/java/ResourcesTest.kt:20:5: Unresolved reference: Greeting2",
+    ]
+
+
+def test_paparazzi_failure_points_at_the_app_frame():
+    output = """
+ResourcesTest > compose FAILED
+    java.lang.IllegalStateException: Vertically scrollable component was measured with an infinity maximum height
+        at androidx.compose.foundation.CheckScrollableContainerConstraintsKt.checkScrollableContainerConstraints(CheckScrollableContainerConstraints.kt:35)
+        at com.example.myapplication.GreetingKt.Greeting(Greeting.kt:42)
+"""
+    diagnostic, = parse_build_output(output)
+    assert (diagnostic.source, diagnostic.file, diagnostic.line) == ("paparazzi", "Greeting.kt", 42)
+    assert "infinity maximum height" in diagnostic.message
+
+
+def test_gradle_summary_only_without_specific_errors():
+    output = """
+* What went wrong:
+Could not resolve all files for configuration ':app:debugCompileClasspath'.
+> Could not find androidx.compose.ui:ui:9.9.9.
+
+* Try:
+"""
+    diagnostic, = parse_build_output(output)
+    assert diagnostic.source == "gradle"
+    assert diagnostic.message.startswith("Could not resolve all files")
+
+
+def test_summary_limits_items_and_falls_back_to_the_tail(monkeypatch):
+    monkeypatch.setattr(d2c_config, "BuildDiagnosticsMaxItems", 1)
+    summary = summarize_build_output(KOTLIN_OUTPUT, WORKSPACE).splitlines()
+    assert summary[0].startswith("1. app/src/main/java/com/example/myapplication/Greeting.kt:8:9")
+    assert summary[1] == "... and 2 more errors, fix the ones above first"
+    monkeypatch.setattr(d2c_config, "BuildOutputTailLines", 2)
+    assert summarize_build_output("line 1\nline 2\n\nline 3\n") == "line 2\nline 3"
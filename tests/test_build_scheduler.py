@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+import d2c_config
+from utils import build_scheduler
+from utils.build_scheduler import BuildScheduler
+
+
+@pytest.fixture(autouse=True)
+def job_costs(monkeypatch):
+    monkeypatch.setattr(d2c_config, "BuildJobCost", {"build": (2, 1000), "small": (1, 500), "huge": (64, 100000)})
+    monkeypatch.setattr(build_scheduler, "read_mem_available_mb", lambda: None)
+
+
+def _start(scheduler, kind, events, release):
+    def run():
+        with scheduler.admit(kind):
+            events.append(kind)
+            release.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_for(predicate):
+    deadline = time.time() + 5
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_jobs_queue_when_the_budget_is_used_up():
+    scheduler = BuildScheduler(cpu_budget=4, memory_budget_mb=10000, memory_reserve_mb=0)
+    events, release = [], threading.Event()
+    threads = [_start(scheduler, "build", events, release) for _ in range(3)]
+    assert _wait_for(lambda: scheduler.stats()["running"] == 2 and scheduler.stats()["queued"] == 1)
+    assert len(events) == 2
+    release.set()
+    for thread in threads:
+        thread.join()
+    stats = scheduler.stats()
+    assert (stats["running"], stats["admitted"], stats["cpu_used"], stats["memory_used_mb"]) == (0, 3, 0, 0)
+
+
+def test_first_come_first_served():
+    scheduler = BuildScheduler(cpu_budget=3, memory_budget_mb=10000, memory_reserve_mb=0)
+    events, first_release, release = [], threading.Event(), threading.Event()
+    first = _start(scheduler, "build", events, first_release)
+    assert _wait_for(lambda: events == ["build"])
+    # the big job waits for budget, the small one queued behind it does not overtake it
+    big = _start(scheduler, "build", events, release)
+    assert _wait_for(lambda: scheduler.stats()["queued"] == 1)
+    small = _start(scheduler, "small", events, release)
+    assert _wait_for(lambda: scheduler.stats()["queued"] == 2)
+    first_release.set()
+    assert _wait_for(lambda: len(events) == 3)
+    assert events == ["build", "build", "small"]
+    release.set()
+    for thread in (first, big, small):
+        thread.join()
+
+
+def test_job_larger_than_the_budget_runs_alone():
+    scheduler = BuildScheduler(cpu_budget=4, memory_budget_mb=10000, memory_reserve_mb=0)
+    with scheduler.admit("huge"):
+        assert scheduler.stats()["cpu_used"] == 4
+
+
+def test_memory_reserve_blocks_new_jobs(monkeypatch):
+    scheduler = BuildScheduler(cpu_budget=8, memory_budget_mb=10000, memory_reserve_mb=2000)
+    monkeypatch.setattr(build_scheduler, "read_mem_available_mb", lambda: 2500)
+    with scheduler.admit("build"):
+        # 2500 - 1000 would go below the 2000MB reserve, a 500MB job still fits
+        assert not scheduler._fits(2, 1000)
+        assert scheduler._fits(1, 500)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import d2c_config
+from utils.coder_stream import ComposeCodeChecker, ProgressiveFile, StreamingStructuredOutput
+from utils.spec_data_schema import CoderOutput
+
+CODE = '''package com.example.myapplication
+
+import androidx.compose.runtime.Composable
+
+// a comment with an unmatched ) bracket
+@Composable
+fun Greeting() {
+    val text = "closing } in a string"
+    val quote = '"'
+    /* block ] comment */
+    val raw = """raw ) string"""
+    Text(text = listOf(text, raw)[0])
+}
+
+@Preview
+@Composable
+fun GreetingPreview() {
+    Greeting()
+}
+'''
+
+
+class _Model:
+    def __init__(self, code):
+        self.code = code
+        self.closed = False
+        self.streamed = 0
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    async def astream(self, input, config=None, **kwargs):
+        args = json.dumps({"thinking": "layout", "compose_code": self.code})
+        try:
+            for start in range(0, len(args), 20):
+                self.streamed = start + 20
+                yield SimpleNamespace(tool_call_chunks=[{"args": args[start:start + 20]}])
+        finally:
+            self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def stream_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(d2c_config, "MINValidComposeCodeLength", 100)
+    monkeypatch.setattr(d2c_config, "CoderStreamPackageWindow", 40)
+    monkeypatch.setattr(d2c_config, "CoderStreamParseChunkChars", 20)
+    monkeypatch.setattr(d2c_config, "CoderStreamWriteChunkChars", 50)
+
+
+def _feed_in_pieces(checker, code, step=7):
+    for end in range(step, len(code), step):
+        reason = checker.feed(code[:end])
+        if reason:
+            return reason
+    return checker.finish(code)
+
+
+def test_valid_code_passes_in_any_chunking():
+    for step in (1, 2, 3, 7, 50, len(CODE)):
+        assert _feed_in_pieces(ComposeCodeChecker(), CODE, step) is None
+
+
+def test_mismatched_bracket_aborts_early():
+    code = CODE.replace("listOf(text, raw)[0])", "listOf(text, raw]") + "\n// " + "x" * 500
+    reason = ComposeCodeChecker().feed(code)
+    assert reason and reason.startswith("unexpected ']'")
+
+
+def test_missing_package_declaration():
+    checker = ComposeCodeChecker()
+    assert checker.feed("```kotlin\n") is None
+    assert "no package declaration" in checker.feed("import androidx.compose.runtime.Composable\n" * 2)
+    assert ComposeCodeChecker().finish("```kotlin\n") == "missing package declaration"
+
+
+def test_finish_checks():
+    assert ComposeCodeChecker().finish(CODE.rstrip()[:-1]) == "unbalanced brackets, 1 not closed"
+    assert ComposeCodeChecker().finish(CODE.replace("@Preview", "")) == "missing @Preview"
+    assert ComposeCodeChecker().finish(d2c_config.Package_Declaration + "\n@Preview\nfun a() {}") == "compose code too short"
+
+
+def test_progressive_file_has_a_single_writer(tmp_path):
+    path = tmp_path / "Greeting.kt"
+    progressive = ProgressiveFile(str(path))
+    first, second = object(), object()
+    progressive.write(first, "a" * 60)
+    progressive.write(second, "b" * 200)
+    progressive.write(first, "a" * 80)
+    assert path.read_text() == "a" * 60
+    progressive.release(first)
+    progressive.write(second, "b" * 200)
+    assert path.read_text() == "b" * 200
+
+
+def test_streaming_output_parses_and_writes_progressively(tmp_path):
+    path = tmp_path / "Greeting.kt"
+    model = _Model(CODE)
+    output = StreamingStructuredOutput(model, CoderOutput, progressive=ProgressiveFile(str(path)))
+    result = asyncio.run(output.ainvoke("prompt"))
+    assert result.compose_code == CODE
+    assert path.exists() and CODE.startswith(path.read_text())
+    assert output.cache_identity["streaming"] is True
+
+
+def test_streaming_output_aborts_a_bad_generation():
+    code = "I cannot help with that request. " * 20 + CODE
+    model = _Model(code)
+    assert asyncio.run(StreamingStructuredOutput(model, CoderOutput).ainvoke("prompt")) is None
+    assert model.closed and model.streamed < len(json.dumps({"thinking": "layout", "compose_code": code}))
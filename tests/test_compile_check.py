@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("requests")
+
+import d2c_config
+from utils import spec_tool_utils
+from utils.sandbox_runner import SandboxResult
+
+
+class _Calls(list):
+    """gradle 调用记录，results 是依次返回的 (returncode, stderr)"""
+
+    def __init__(self):
+        super().__init__()
+        self.results = []
+
+
+@pytest.fixture
+def gradle_calls(monkeypatch):
+    calls = _Calls()
+    results = calls.results
+
+    def run_gradle(workspace_dir, tasks, configuration_cache=True, kind="build"):
+        calls.append((tasks, kind))
+        returncode, stderr = results.pop(0) if results else (0, "")
+        return SandboxResult(tasks, returncode, "", stderr, False, 0.1, {})
+
+    monkeypatch.setattr(spec_tool_utils, "run_gradle", run_gradle)
+    monkeypatch.setattr(d2c_config, "ParseBuildDiagnostics", False)
+    return calls
+
+
+def test_compile_only_check_runs_offline_kotlin_compile(monkeypatch, gradle_calls, tmp_path):
+    monkeypatch.setattr(d2c_config, "CompileOnlyCheck", True)
+    assert spec_tool_utils.compile(str(tmp_path)) == (True, "")
+    assert gradle_calls == [([*d2c_config.CompileCheckTasks, "--offline"], "compile")]
+
+
+def test_compile_only_check_retries_online_for_missing_dependencies(monkeypatch, gradle_calls, tmp_path):
+    monkeypatch.setattr(d2c_config, "CompileOnlyCheck", True)
+    gradle_calls.results.extend([(1, "No cached version of androidx.compose.ui available for offline mode"),
+                                 (1, "e: Greeting.kt:3:1 Unresolved reference")])
+    assert spec_tool_utils.compile(str(tmp_path)) == (False, "e: Greeting.kt:3:1 Unresolved reference")
+    assert [tasks for tasks, _ in gradle_calls] == [[*d2c_config.CompileCheckTasks, "--offline"],
+                                                    d2c_config.CompileCheckTasks]
+
+
+def test_full_screenshot_build_without_compile_only_check(monkeypatch, gradle_calls, tmp_path):
+    monkeypatch.setattr(d2c_config, "CompileOnlyCheck", False)
+    spec_tool_utils.compile(str(tmp_path))
+    assert gradle_calls == [(["updateDebugScreenshotTest"], "compile")]
@@ -0,0 +1,82 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+import d2c_config
+from utils import gradle_tools
+from utils.sandbox_runner import SandboxResult
+
+
+def _result(args, returncode=0, stdout="", timed_out=False):
+    return SandboxResult(args, returncode, stdout, "", timed_out, 0.1, {})
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    commands = []
+
+    def run_sandboxed(command, **kwargs):
+        commands.append(command)
+        return _result(command)
+
+    monkeypatch.setattr(gradle_tools, "run_sandboxed", run_sandboxed)
+    monkeypatch.setattr(d2c_config, "GradleSandboxCgroupRoot", None)
+    return commands
+
+
+def _lock_free(manager) -> bool:
+    """在另一个线程里尝试拿 manager._cond"""
+    acquired = []
+
+    def probe():
+        if manager._cond.acquire(timeout=1):
+            acquired.append(True)
+            manager._cond.release()
+
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return bool(acquired)
+
+
+def test_health_check_runs_outside_the_lock(monkeypatch, commands, tmp_path):
+    manager = gradle_tools.GradleDaemonManager(2, 100, health_check_interval=0)
+    manager._last_health_check = 0
+    checks = []
+
+    def is_healthy(workspace_dir):
+        checks.append(_lock_free(manager))
+        return False
+
+    monkeypatch.setattr(manager, "_is_healthy", is_healthy)
+    manager.run(str(tmp_path), ["assembleDebug"])
+    assert checks == [True]
+    # the failed health check recycles the daemons before the build
+    assert commands[0] == ["./gradlew", "--stop"]
+    assert commands[1][:2] == ["./gradlew", "assembleDebug"]
+    assert not manager._recycle_requested and not manager._maintaining
+
+
+def test_recycle_after_max_builds(commands, tmp_path):
+    manager = gradle_tools.GradleDaemonManager(2, 2, health_check_interval=3600)
+    for _ in range(3):
+        manager.run(str(tmp_path), ["assembleDebug"])
+    assert [c for c in commands if c[1] == "--stop"] == [["./gradlew", "--stop"]]
+    assert manager._builds == 1
+
+
+def test_slot_taken_before_build_budget(monkeypatch, commands, tmp_path):
+    manager = gradle_tools.GradleDaemonManager(1, 100, health_check_interval=3600)
+    order = []
+
+    class Scheduler:
+        @contextmanager
+        def admit(self, kind):
+            # the only daemon slot is already held by the time the budget is requested
+            order.append(("admit", manager._slots._value))
+            yield
+
+    monkeypatch.setattr(gradle_tools, "get_build_scheduler", lambda: Scheduler())
+    manager.run(str(tmp_path), ["assembleDebug"])
+    assert order == [("admit", 0)]
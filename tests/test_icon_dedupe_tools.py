@@ -0,0 +1,80 @@
+import os
+import struct
+import zlib
+
+import pytest
+
+from utils.icon_dedupe_tools import (decode_png_rgba, dedupe_icons, dhash, fingerprint_icon, merge_icon_aliases,
+                                     resolve_icon_alias)
+
+
+def _png(width, height, pixel) -> bytes:
+    """按 pixel(x, y) -> (r, g, b, a) 生成 8 位 RGBA png"""
+    rows = b"".join(b"\x00" + b"".join(bytes(pixel(x, y)) for x in range(width)) for y in range(height))
+
+    def chunk(chunk_type, data):
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+def _arrow(size, color=(0, 0, 0)):
+    """左半透明、右半实心的图形，缩放后 dHash 不变"""
+    return _png(size, size, lambda x, y: (*color, 255 if x >= size // 2 or y >= size // 2 else 0))
+
+
+def _save(workspace, name, content):
+    rel_path = f"app/src/main/res/drawable-xxhdpi/{name}"
+    os.makedirs(os.path.dirname(os.path.join(workspace, rel_path)), exist_ok=True)
+    with open(os.path.join(workspace, rel_path), "wb") as f:
+        f.write(content)
+    return rel_path
+
+
+def test_decode_png():
+    width, height, pixels = decode_png_rgba(_png(3, 2, lambda x, y: (x, y, 7, 255)))
+    assert (width, height) == (3, 2)
+    assert pixels[5] == (2, 1, 7, 255)
+    assert decode_png_rgba(b"not a png") is None
+
+
+def test_dhash_stable_across_scales():
+    small = fingerprint_icon("a.png", _arrow(18))
+    large = fingerprint_icon("b.png", _arrow(54))
+    assert small.phash == large.phash
+    flipped = _png(18, 18, lambda x, y: (0, 0, 0, 255 if x < 9 else 0))
+    assert dhash(*decode_png_rgba(flipped)) != small.phash
+
+
+def test_dedupe_keeps_largest_and_respects_color(tmp_path):
+    workspace = str(tmp_path)
+    small = _save(workspace, "ic_small.png", _arrow(18))
+    large = _save(workspace, "ic_large.png", _arrow(54))
+    copy = _save(workspace, "ic_copy.png", _arrow(54))
+    red = _save(workspace, "ic_red.png", _arrow(54, (255, 0, 0)))
+    screenshot = _save(workspace, "figma_screenshot_1.png", _arrow(54))
+    aliases = dedupe_icons(workspace, {small, large, copy, red, screenshot})
+    # same size: the first path in order is kept
+    assert aliases == {small: copy, large: copy}
+    assert all(not os.path.exists(os.path.join(workspace, dup)) for dup in aliases)
+    assert os.path.exists(os.path.join(workspace, red))
+    assert os.path.exists(os.path.join(workspace, screenshot))
+
+
+def test_merge_collapses_alias_chains():
+    first = {"a.png": "b.png"}
+    # a later dedupe run merges b into c and deletes b
+    merged = merge_icon_aliases(first, {"b.png": "c.png"})
+    assert merged == {"a.png": "c.png", "b.png": "c.png"}
+    # a cycle stops instead of looping forever
+    assert resolve_icon_alias({"a": "b", "b": "a"}, "b") == "a"
+
+
+def test_apply_icon_aliases_follows_chains():
+    spec_tool_utils = pytest.importorskip("utils.spec_tool_utils")
+    aliases = {"app/src/main/res/drawable-xxhdpi/a.png": "app/src/main/res/drawable-xxhdpi/b.png",
+               "app/src/main/res/drawable-xxhdpi/b.png": "app/src/main/res/drawable-xxhdpi/c.xml"}
+    code = "Image(painterResource(R.drawable.a)); Image(painterResource(R.drawable.b)); R.drawable.ab"
+    assert spec_tool_utils.apply_icon_aliases(code, aliases) == \
+        "Image(painterResource(R.drawable.c)); Image(painterResource(R.drawable.c)); R.drawable.ab"
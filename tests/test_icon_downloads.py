@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("openai")
+
+from utils import llm_tools
+
+
+@pytest.fixture
+def figma_calls(monkeypatch):
+    calls = []
+
+    def fetch_image_links(file_key, node_ids, token, root_node_id, image_format="png"):
+        calls.append((image_format, sorted(node_ids)))
+        return {node_id: f"https://figma/{image_format}/{node_id}" for node_id in node_ids}
+
+    monkeypatch.setattr(llm_tools, "fetch_image_links", fetch_image_links)
+    monkeypatch.setattr(llm_tools, "fetch_ref_image_links", lambda *args: {})
+    monkeypatch.setattr(llm_tools, "_run_downloads", lambda download_tasks: set())
+    return calls
+
+
+def test_lazy_plan_does_not_request_render_urls(figma_calls, tmp_path):
+    plan = llm_tools.resolve_icon_downloads({"1:1": "ic_a", "1:2": "ic_b"}, set(), "file", "0:1", "token",
+                                            str(tmp_path), {"1:2": "svg"}, resolve_urls=False)
+    assert figma_calls == []
+    assert {item["node_id"]: (item["url"], item["format"]) for item in plan.values()} == {
+        "1:1": (None, "png"), "1:2": (None, "svg")}
+
+
+def test_materialize_requests_urls_only_for_referenced_icons(figma_calls, tmp_path):
+    plan = llm_tools.resolve_icon_downloads({"1:1": "ic_a", "1:2": "ic_b", "1:3": "ic_c"}, set(), "file", "0:1",
+                                            "token", str(tmp_path), {"1:2": "svg"}, resolve_urls=False)
+    used = {rel_path: item for rel_path, item in plan.items() if item["node_id"] in ("1:2", "1:3")}
+    saved = llm_tools.materialize_icon_downloads(used, str(tmp_path), "file", "0:1", "token")
+    assert sorted(figma_calls) == [("png", ["1:3"]), ("svg", ["1:2"])]
+    assert saved == set(used.keys())
+    # the plan kept in the state is not modified
+    assert all(item["url"] is None for item in plan.values())
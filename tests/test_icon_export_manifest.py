@@ -0,0 +1,37 @@
+import os
+
+from utils.icon_export_manifest import MANIFEST_FILE, STATE_DIR, IconExportManifest
+
+
+def test_progress_survives_a_restart(tmp_path):
+    workspace = str(tmp_path)
+    manifest = IconExportManifest(workspace)
+    manifest.set_recognized("1:1", [{"figma_node_id": "1:2", "icon_file_name": "ic_back"}])
+    nodes = {"1:2": "ic_back"}
+    plan = {"drawable-xxhdpi/ic_back.png": {"node_id": "1:2", "url": None, "format": "png"}}
+    manifest.set_download_plan(nodes, plan)
+    (tmp_path / "ic_back.png").write_bytes(b"png")
+    manifest.mark_downloaded(["drawable-xxhdpi/ic_back.png"])
+
+    resumed = IconExportManifest(workspace)
+    assert resumed.get_recognized("1:1") == [{"figma_node_id": "1:2", "icon_file_name": "ic_back"}]
+    assert resumed.get_recognized("9:9") is None
+    assert resumed.get_download_plan(nodes) == plan
+    # a different set of nodes needs a new plan
+    assert resumed.get_download_plan({"1:3": "ic_home"}) is None
+    assert resumed.is_downloaded("drawable-xxhdpi/ic_back.png", str(tmp_path / "ic_back.png"))
+
+
+def test_downloaded_file_must_still_exist(tmp_path):
+    manifest = IconExportManifest(str(tmp_path))
+    manifest.mark_downloaded(["drawable-xxhdpi/ic_back.png"])
+    assert not manifest.is_downloaded("drawable-xxhdpi/ic_back.png", str(tmp_path / "ic_back.png"))
+
+
+def test_corrupt_manifest_starts_from_scratch(tmp_path):
+    os.makedirs(tmp_path / STATE_DIR)
+    (tmp_path / STATE_DIR / MANIFEST_FILE).write_text("{not json")
+    manifest = IconExportManifest(str(tmp_path))
+    assert manifest.get_recognized("1:1") is None
+    manifest.set_recognized("1:1", [])
+    assert IconExportManifest(str(tmp_path)).get_recognized("1:1") == []
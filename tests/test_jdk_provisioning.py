@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from utils import container_tools
+
+
+@pytest.fixture
+def host(monkeypatch, tmp_path):
+    target = tmp_path / "host"
+    target.mkdir()
+    monkeypatch.setattr(container_tools, "JDK_TARGET_FOLDER", str(target))
+    monkeypatch.setattr(container_tools, "JDK_LOCK_FILE", str(target / ".d2c_jdk.lock"))
+    monkeypatch.setattr(container_tools, "JDK_READY_MARKER", str(target / ".d2c_jdk_ready"))
+    zip_bytes = b"jdk zip"
+    (target / container_tools.JDK_ZIP).write_bytes(zip_bytes)
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    (workspace / container_tools.JDK_VERIFY_FILE).write_text(hashlib.md5(zip_bytes).hexdigest() + "\n")
+    unzipped = []
+
+    def unzip_jdk(jdk_zip_path):
+        unzipped.append(jdk_zip_path)
+        os.makedirs(jdk_zip_path.removesuffix(".zip"), exist_ok=True)
+
+    monkeypatch.setattr(container_tools, "unzip_jdk", unzip_jdk)
+    monkeypatch.setattr(container_tools, "download_jdk", lambda path: pytest.fail("jdk should not be downloaded"))
+    return str(workspace), unzipped
+
+
+def test_jdk_prepared_once_per_host(host):
+    workspace, unzipped = host
+    container_tools.prepare_jdk(workspace)
+    container_tools.prepare_jdk(workspace)
+    assert len(unzipped) == 1
+
+
+def test_jdk_prepared_again_when_the_repo_changes_md5(monkeypatch, host, tmp_path):
+    workspace, unzipped = host
+    container_tools.prepare_jdk(workspace)
+    new_zip = b"new jdk zip"
+
+    def download_jdk(path):
+        with open(path, "wb") as f:
+            f.write(new_zip)
+
+    monkeypatch.setattr(container_tools, "download_jdk", download_jdk)
+    with open(os.path.join(workspace, container_tools.JDK_VERIFY_FILE), "w") as f:
+        f.write(hashlib.md5(new_zip).hexdigest())
+    container_tools.prepare_jdk(workspace)
+    assert len(unzipped) == 2
+
+
+def test_missing_verify_file(host, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        container_tools.prepare_jdk(str(tmp_path))
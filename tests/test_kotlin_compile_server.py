@@ -0,0 +1,102 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import pytest
+
+pytest.importorskip("requests")
+
+import d2c_config
+from utils import kotlin_compile_server
+from utils.kotlin_compile_server import KotlinCompileServer, collect_resource_names, generate_r_stub
+
+
+def _write(path, content=""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def test_generate_r_stub(tmp_path):
+    res = tmp_path / "res"
+    _write(res / "drawable-xxhdpi/ic_back.png")
+    _write(res / "drawable/ic_vector.xml")
+    _write(res / "mipmap-hdpi/ic_launcher.webp")
+    _write(res / "values/strings.xml", '<resources><string name="app_name">A</string>'
+                                       '<style name="Theme.App"/><item type="id" name="anchor"/></resources>')
+    _write(res / "values/broken.xml", "<resources>")
+    assert collect_resource_names(str(res)) == {
+        "drawable": {"ic_back", "ic_vector"}, "mipmap": {"ic_launcher"}, "string": {"app_name"},
+        "style": {"Theme_App"}, "id": {"anchor"}}
+    stub = generate_r_stub(str(res), "package com.example.myapplication")
+    assert stub.startswith("package com.example.myapplication\n")
+    assert "    class drawable {\n        companion object {\n            const val `ic_back`: Int = 0\n" in stub
+
+
+class _FakeProcess:
+    def __init__(self):
+        self.killed = False
+
+    def poll(self):
+        return 1 if self.killed else None
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self):
+        return 1
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    server = KotlinCompileServer(str(tmp_path / "state"), max_processes=2)
+    started, prepared = [], []
+    monkeypatch.setattr(server, "_prepare", lambda workspace_dir: prepared.append(workspace_dir))
+    monkeypatch.setattr(server, "_start_process", lambda: started.append(_FakeProcess()) or
+                        kotlin_compile_server._CompilerProcess(started[-1]))
+    monkeypatch.setattr(server, "_compiler_args", lambda *args: [])
+    server.started = started
+    return server
+
+
+def test_checks_run_in_parallel_up_to_the_pool_size(monkeypatch, server, tmp_path):
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def request(process, args):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+        return "OK", ""
+
+    monkeypatch.setattr(server, "_request", request)
+    # the build budget of the test host is not what is tested here
+    monkeypatch.setattr(kotlin_compile_server, "get_build_scheduler",
+                        lambda: type("Scheduler", (), {"admit": lambda self, kind: nullcontext()})())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(server.check(str(tmp_path)))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [(True, "")] * 5
+    assert peak[0] == 2
+    assert len(server.started) == 2
+
+
+def test_failed_process_is_replaced(monkeypatch, server, tmp_path):
+    monkeypatch.setattr(server, "_request", lambda process, args: (None, "exited"))
+    assert server.check(str(tmp_path)) == (None, "exited")
+    assert server.started[0].killed
+    monkeypatch.setattr(server, "_request", lambda process, args: ("COMPILATION_ERROR", "e: error"))
+    assert server.check(str(tmp_path)) == (False, "e: error")
+    assert len(server.started) == 2
+
+
+def test_process_restarted_after_max_checks(monkeypatch, server, tmp_path):
+    monkeypatch.setattr(d2c_config, "KotlinCompileServerMaxChecks", 2)
+    monkeypatch.setattr(server, "_request", lambda process, args: ("OK", ""))
+    for _ in range(3):
+        server.check(str(tmp_path))
+    assert [process.killed for process in server.started] == [True, False]
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("openai")
+
+import d2c_config
+from utils import llm_router
+from utils.llm_router import HedgeBudget, LLMRouter, get_backend_health
+
+
+class _Backend:
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def hedging_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(d2c_config, "LLMRouterLatencyBudgetSeconds", {"default": 60})
+    monkeypatch.setattr(d2c_config, "LLMRouterAttemptTimeoutSeconds", {"default": 60})
+    monkeypatch.setattr(d2c_config, "LLMRouterMinSamples", 3)
+    monkeypatch.setattr(d2c_config, "LLMHedging", {"coder": {"quantile": 0.9, "min_delay_seconds": 0.05,
+                                                             "default_delay_seconds": 0.1, "budget_ratio": 0.5}})
+    monkeypatch.setattr(llm_router, "_health", {})
+    monkeypatch.setattr(llm_router, "_hedge_budgets", {})
+
+
+def test_hedge_budget_allows_one_then_a_ratio():
+    budget = HedgeBudget(ratio=0.5, window_seconds=60)
+    budget.record_request()
+    assert budget.try_take()
+    assert not budget.try_take()
+    for _ in range(3):
+        budget.record_request()
+    assert budget.try_take()
+    assert not budget.try_take()
+
+
+def test_hedge_delay_follows_the_stage_latency():
+    router = LLMRouter("coder", [("primary", _Backend("a"))])
+    assert router._hedge_delay() == 0.1
+    for latency in (0.01, 0.02, 0.03):
+        get_backend_health("stage:coder").record(latency, ok=True)
+    assert router._hedge_delay() == 0.05
+    for latency in (0.3, 0.4, 0.5):
+        get_backend_health("stage:coder").record(latency, ok=True)
+    assert router._hedge_delay() == 0.5
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = _Backend("primary", delay=0.01), _Backend("secondary")
+    router = LLMRouter("coder", [("primary", primary), ("secondary", secondary)])
+    assert asyncio.run(router.ainvoke("prompt")) == "primary"
+    assert secondary.calls == 0
+
+
+def test_slow_primary_is_hedged_on_another_backend_and_cancelled():
+    primary, secondary = _Backend("primary", delay=2), _Backend("secondary", delay=0.01)
+    router = LLMRouter("coder", [("primary", primary), ("secondary", secondary)])
+    assert asyncio.run(router.ainvoke("prompt")) == "secondary"
+    assert secondary.calls == 1 and primary.cancelled == 1
+    # 被取消的主请求的耗时也计入阶段延迟
+    assert get_backend_health("stage:coder").stats()["requests"] == 2
+
+
+def test_invalid_hedge_result_waits_for_the_primary():
+    primary, secondary = _Backend("valid", delay=0.3), _Backend("invalid", delay=0.01)
+    router = LLMRouter("coder", [("primary", primary), ("secondary", secondary)]).with_validator(lambda r: r == "valid")
+    assert asyncio.run(router.ainvoke("prompt")) == "valid"
+
+
+def test_no_hedge_without_budget():
+    primary, secondary = _Backend("primary", delay=0.2), _Backend("secondary")
+    router = LLMRouter("coder", [("primary", primary), ("secondary", secondary)])
+    llm_router.get_hedge_budget("coder").try_take()
+    assert asyncio.run(router.ainvoke("prompt")) == "primary"
+    assert secondary.calls == 0
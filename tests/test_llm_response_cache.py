@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import d2c_config
+from utils import llm_response_cache
+from utils.llm_response_cache import (LLMResponseCache, cache_response, call_with_cache, normalize_messages,
+                                      response_cache_key)
+
+
+class _Chain:
+    cache_identity = {"model": "gemini-2.5-pro", "tools": []}
+
+
+@pytest.fixture
+def response_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "LLMResponseCache", True)
+    monkeypatch.setattr(d2c_config, "LLMResponseCacheDir", str(tmp_path / "cache"))
+    monkeypatch.setattr(llm_response_cache, "_cache", None)
+    monkeypatch.setattr(llm_response_cache, "record_response_cache_hit", lambda: None)
+    return llm_response_cache.get_llm_response_cache()
+
+
+def test_key_ignores_message_format_and_trailing_whitespace():
+    tuples = [("system", "rules  \n"), ("human", "\nfigma json")]
+    messages = [SystemMessage(content="rules"), HumanMessage(content="figma json  ")]
+    assert normalize_messages(tuples) == normalize_messages(messages)
+    assert LLMResponseCache.key(_Chain(), tuples) == LLMResponseCache.key(_Chain(), messages)
+    assert LLMResponseCache.key(_Chain(), [("user", "other")]) != LLMResponseCache.key(_Chain(), tuples)
+    # a chain without cache_identity is not cached
+    assert LLMResponseCache.key(object(), tuples) is None
+
+
+def test_put_get_and_ttl(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), ttl=3600, max_bytes=1 << 20)
+    key = LLMResponseCache.key(_Chain(), [("user", "hi")])
+    assert cache.get(key, _Chain()) == (False, None)
+    cache.put(key, AIMessage(content="hello"))
+    hit, value = cache.get(key, _Chain())
+    assert hit and value.content == "hello"
+    expired = LLMResponseCache(str(tmp_path), ttl=-1, max_bytes=1 << 20)
+    assert expired.get(key, _Chain()) == (False, None)
+
+
+def test_sweep_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), ttl=3600, max_bytes=1 << 20)
+    keys = [LLMResponseCache.key(_Chain(), [("user", str(i))]) for i in range(3)]
+    for index, key in enumerate(keys):
+        cache.put(key, "x" * 1000)
+        past = time.time() - 100 + index
+        os.utime(cache._path(key), (past, past))
+    cache._max_bytes = 2500
+    cache.sweep()
+    assert [cache.get(key, _Chain())[0] for key in keys] == [False, True, True]
+
+
+def test_call_with_cache_refresh_and_cacheable(response_cache):
+    calls = []
+
+    def invoke(value):
+        calls.append(value)
+        return value
+
+    messages = [("user", "hi")]
+    assert call_with_cache(_Chain(), messages, lambda: invoke("first")) == "first"
+    assert call_with_cache(_Chain(), messages, lambda: invoke("second")) == "first"
+    # a refresh asks the model again and replaces the entry
+    assert call_with_cache(_Chain(), messages, lambda: invoke("third"), refresh_cache=True) == "third"
+    assert call_with_cache(_Chain(), messages, lambda: invoke("fourth"), refresh_cache=True,
+                           cacheable=lambda value: False) == "fourth"
+    assert call_with_cache(_Chain(), messages, lambda: invoke("fifth")) == "third"
+    assert call_with_cache(_Chain(), messages, lambda: invoke("sixth"), cache=False) == "sixth"
+    assert calls == ["first", "third", "fourth", "sixth"]
+
+
+def test_deferred_write_only_after_acceptance(response_cache):
+    messages = [("user", "generate code")]
+    # the coder does not write the cache, the evaluator writes the accepted output later
+    assert call_with_cache(_Chain(), messages, lambda: "rejected code", cacheable=lambda value: False) == "rejected code"
+    assert call_with_cache(_Chain(), messages, lambda: "accepted code", cacheable=lambda value: False) == "accepted code"
+    cache_response(response_cache_key(_Chain(), messages), "accepted code")
+    assert call_with_cache(_Chain(), messages, lambda: pytest.fail("should be cached")) == "accepted code"
+
+
+def test_cache_disabled(monkeypatch):
+    monkeypatch.setattr(d2c_config, "LLMResponseCache", False)
+    assert response_cache_key(_Chain(), [("user", "hi")]) is None
+    cache_response(None, "ignored")
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("openai")
+
+import d2c_config
+from utils import llm_router
+from utils.llm_router import BackendHealth, LLMRouter, get_backend_health, percentile
+
+
+class _Backend:
+    def __init__(self, result=None, delay=0.0, error=None):
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def router_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(d2c_config, "LLMRouterLatencyBudgetSeconds", {"default": 1})
+    monkeypatch.setattr(d2c_config, "LLMRouterAttemptTimeoutSeconds", {"default": 0.2})
+    monkeypatch.setattr(d2c_config, "LLMRouterMinSamples", 2)
+    monkeypatch.setattr(d2c_config, "LLMRouterMaxErrorRate", 0.3)
+    monkeypatch.setattr(d2c_config, "LLMRouterRateLimitCooldownSeconds", 60)
+    monkeypatch.setattr(d2c_config, "LLMHedging", {})
+    monkeypatch.setattr(llm_router, "_health", {})
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile([1, 2, 3, 4], 0.95) == 4
+
+
+def test_backend_health_degrades_on_errors_latency_and_rate_limits():
+    health = BackendHealth("gemini", window_seconds=60)
+    health.record(0.5, ok=True)
+    assert not health.degraded(latency_budget=1)
+    health.record(2.0, ok=True)
+    assert health.degraded(latency_budget=1)
+    errors = BackendHealth("azure", window_seconds=60)
+    errors.record(0.1, ok=True)
+    errors.record(0.1, ok=False)
+    assert errors.error_rate() == 0.5 and errors.degraded(latency_budget=1)
+    limited = BackendHealth("claude", window_seconds=60)
+    limited.record(0.1, ok=False, rate_limited=True)
+    assert limited.degraded(latency_budget=1) and limited.stats()["cooldown_seconds"] > 0
+    # 样本过期后后端恢复
+    expired = BackendHealth("old", window_seconds=-1)
+    expired.record(5.0, ok=False)
+    assert not expired.degraded(latency_budget=1) and expired.stats()["requests"] == 0
+
+
+def test_degraded_backends_are_tried_last():
+    router = LLMRouter("bugfix", [("primary", _Backend("a")), ("secondary", _Backend("b"))])
+    assert [name for name, _ in router.ordered_backends()] == ["primary", "secondary"]
+    get_backend_health("primary").record(0.1, ok=False, rate_limited=True)
+    assert [name for name, _ in router.ordered_backends()] == ["secondary", "primary"]
+
+
+def test_fail_over_on_error_and_timeout():
+    failing, slow, healthy = _Backend(error=RuntimeError("503")), _Backend("late", delay=1), _Backend("ok")
+    router = LLMRouter("bugfix", [("failing", failing), ("slow", slow), ("healthy", healthy)])
+    assert asyncio.run(router.ainvoke("prompt")) == "ok"
+    assert (failing.calls, slow.calls, healthy.calls) == (1, 1, 1)
+    assert get_backend_health("failing").stats()["errors"] == 1
+    assert get_backend_health("slow").stats()["errors"] == 1
+    assert get_backend_health("healthy").stats()["requests"] == 1
+
+
+def test_last_backend_has_no_timeout_and_errors_propagate():
+    router = LLMRouter("bugfix", [("fast", _Backend(error=RuntimeError("503"))), ("slow", _Backend("late", delay=0.4))])
+    assert asyncio.run(router.ainvoke("prompt")) == "late"
+    router = LLMRouter("bugfix", [("a", _Backend(error=RuntimeError("first"))), ("b", _Backend(error=ValueError("last")))])
+    with pytest.raises(ValueError, match="last"):
+        asyncio.run(router.ainvoke("prompt"))
+
+
+def test_invoke_runs_on_the_shared_loop():
+    router = LLMRouter("bugfix", [("primary", _Backend("sync result"))])
+    assert router.invoke("prompt") == "sync result"
+
+
+def _rate_limit_error():
+    import httpx
+    from openai import RateLimitError
+
+    response = httpx.Response(429, request=httpx.Request("POST", "https://example.invalid"))
+    return RateLimitError("429 Too Many Requests", response=response, body=None)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    for module in ("anthropic", "httpx", "langchain_openai", "langgraph"):
+        pytest.importorskip(module)
+    import llm
+    from utils import llm_tools
+
+    monkeypatch.setattr(d2c_config, "LLMRateLimits", {"default": {"requests_per_second": 1000, "max_bucket_size": 1000}})
+    monkeypatch.setattr(llm_tools, "MAX_RETRY", 3)
+    monkeypatch.setattr(llm_tools, "MIN_WAIT", 0)
+    monkeypatch.setattr(llm_tools, "MAX_WAIT", 0)
+    return llm
+
+
+@pytest.fixture
+def rate_limited_calls(llm, monkeypatch):
+    """上游每次请求都返回 429，记录请求次数"""
+    calls = []
+
+    async def rate_limited(self, messages, *args, **kwargs):
+        calls.append(self.model_name)
+        raise _rate_limit_error()
+
+    monkeypatch.setattr(llm.AzureChatOpenAI, "_agenerate", rate_limited)
+    return calls
+
+
+def _chat_model(llm, **options):
+    return llm.SafeAzureChatOpenAI(model="gemini-3-pro-preview-new", azure_endpoint="https://example.invalid",
+                                   api_version="2024-03-01-preview", api_key="test", quota="router-test",
+                                   streaming=False, **options)
+
+
+def test_routed_backends_do_not_retry_rate_limits(llm, monkeypatch):
+    monkeypatch.setattr(d2c_config, "LLMStageBackends", {"default": ["gemini-3-pro-preview-new"],
+                                                         "coder": ["gemini-3-pro-preview-new", "gemini-2.5-pro"]})
+    router = llm.get_stage_model("coder")
+    assert isinstance(router, LLMRouter)
+    for _, backend in router.backends:
+        assert backend.model.max_retries == 0 and backend.model.retry_rate_limits is False
+    single = llm.get_stage_model("bugfix").model
+    assert single.max_retries == 2 and single.retry_rate_limits is True
+
+
+def test_first_429_of_a_real_backend_fails_over(llm, rate_limited_calls):
+    # 不路由的模型自己重试 429
+    with pytest.raises(Exception, match="429"):
+        asyncio.run(_chat_model(llm).ainvoke("prompt"))
+    assert len(rate_limited_calls) == 3
+    rate_limited_calls.clear()
+    fallback = _Backend("ok")
+    router = LLMRouter("bugfix", [("limited", _chat_model(llm, max_retries=0, retry_rate_limits=False)),
+                                  ("fallback", fallback)])
+    assert asyncio.run(router.ainvoke("prompt")) == "ok"
+    assert len(rate_limited_calls) == 1 and fallback.calls == 1
+    assert get_backend_health("limited").stats()["cooldown_seconds"] > 0
+    assert [name for name, _ in router.ordered_backends()] == ["fallback", "limited"]
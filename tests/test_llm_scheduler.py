@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import d2c_config
+from utils import llm_scheduler
+from utils.llm_scheduler import LLMRequestScheduler, _Waiter
+
+_context = threading.local()
+
+
+class _Tokens:
+    """总是有令牌的 rate limiter"""
+
+    def acquire(self, blocking=True):
+        return True
+
+
+@pytest.fixture(autouse=True)
+def scheduling(monkeypatch):
+    monkeypatch.setattr(d2c_config, "LLMPriorityAgingSeconds", 60)
+    monkeypatch.setattr(d2c_config, "LLMDeadlineSlackSeconds", 300)
+    monkeypatch.setattr(d2c_config, "LLMDeadlineBoost", 3)
+    # 每个线程用 _context.value 指定 (stage, 优先级, app, 截止时间)
+    monkeypatch.setattr(llm_scheduler, "request_context",
+                        lambda task_id: getattr(_context, "value", ("", 2, "", None)))
+
+
+def _wait_for(predicate):
+    deadline = time.time() + 5
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def _request(scheduler, context, events, release):
+    def run():
+        _context.value = context
+        with scheduler.admit():
+            events.append(context)
+            release.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _next(scheduler, waiters):
+    scheduler._waiters = list(waiters)
+    return next(w for w in waiters if scheduler._try_admit(w))
+
+
+def test_max_in_flight_and_stats():
+    scheduler = LLMRequestScheduler("test", _Tokens(), max_in_flight=2)
+    events, release = [], threading.Event()
+    threads = [_request(scheduler, ("coder", 2, "app", None), events, release) for _ in range(3)]
+    assert _wait_for(lambda: scheduler.stats()["in_flight"] == 2 and scheduler.stats()["queued"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    stats = scheduler.stats()
+    assert len(events) == 3 and stats["admitted"] == 3 and stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_higher_priority_goes_first():
+    scheduler = LLMRequestScheduler("test", _Tokens(), max_in_flight=1)
+    low, high = _Waiter(0, 1, "a", None), _Waiter(1, 5, "b", None)
+    assert _next(scheduler, [low, high]) is high
+
+
+def test_waiting_requests_age_and_deadlines_boost():
+    scheduler = LLMRequestScheduler("test", _Tokens(), max_in_flight=1)
+    old, fresh = _Waiter(0, 1, "a", None), _Waiter(1, 2, "b", None)
+    old.enqueued_at -= 120
+    assert _next(scheduler, [fresh, old]) is old
+    late, normal = _Waiter(0, 1, "a", time.time() + 10), _Waiter(1, 3, "b", time.time() + 3600)
+    assert _next(scheduler, [normal, late]) is late
+
+
+def test_same_priority_is_fair_between_apps():
+    scheduler = LLMRequestScheduler("test", _Tokens(), max_in_flight=2)
+    scheduler._app_in_flight = {"busy": 1}
+    scheduler._in_flight = 1
+    burst, other = _Waiter(0, 2, "busy", None), _Waiter(1, 2, "other", None)
+    assert _next(scheduler, [burst, other]) is other
+    # 进行中的请求一样多时，最久没有被服务的 app 先走，再按先来先服务
+    scheduler = LLMRequestScheduler("test", _Tokens(), max_in_flight=1)
+    scheduler._app_last_admitted = {"recent": time.time()}
+    recent, idle = _Waiter(0, 2, "recent", None), _Waiter(1, 2, "idle", None)
+    assert _next(scheduler, [recent, idle]) is idle
+    first, second = _Waiter(0, 2, "idle", None), _Waiter(1, 2, "idle", None)
+    assert _next(scheduler, [second, first]) is first
+
+
+def test_no_token_means_no_admission():
+    class _Empty:
+        def acquire(self, blocking=True):
+            return False
+
+    scheduler = LLMRequestScheduler("test", _Empty(), max_in_flight=1)
+    waiter = _Waiter(0, 2, "a", None)
+    scheduler._waiters = [waiter]
+    assert not scheduler._try_admit(waiter)
+
+
+def test_cancelled_async_request_leaves_the_queue():
+    scheduler = LLMRequestScheduler("test", _Tokens(), max_in_flight=1)
+
+    async def run():
+        async with scheduler.aadmit():
+            waiting = asyncio.ensure_future(scheduler.aadmit().__aenter__())
+            await asyncio.sleep(0.1)
+            assert scheduler.stats()["queued"] == 1
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+        assert scheduler.stats()["queued"] == 0
+
+    asyncio.run(run())
+    assert scheduler.stats()["in_flight"] == 0
@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import d2c_config
+import d2c_datautil
+from utils import llm_telemetry, prompt_cache
+from utils.llm_telemetry import LLMCall, estimate_cost, record_llm_retry, record_response_cache_hit, task_llm_usage
+
+TASK_ID = 42
+
+
+@pytest.fixture(autouse=True)
+def telemetry(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(d2c_config, "LLMTokenPrices", {"model": {"input": 2.0, "cached_input": 0.5, "output": 10.0}})
+    monkeypatch.setattr(d2c_datautil, "_tasks_llm_usage", {})
+    monkeypatch.setattr(prompt_cache, "_stats", {})
+    monkeypatch.setattr(llm_telemetry, "logger_task_id", lambda: TASK_ID)
+    stage = {"value": "coder"}
+    monkeypatch.setattr(llm_telemetry, "request_context", lambda task_id: (stage["value"], 2, "app", None))
+    return stage
+
+
+def _message(input_tokens, cached, output, content="x"):
+    return SimpleNamespace(content=content, usage_metadata={"input_tokens": input_tokens, "output_tokens": output,
+                                                            "input_token_details": {"cache_read": cached}})
+
+
+def test_estimate_cost():
+    usage = {"input": 3_000_000, "cached": 1_000_000, "uncached": 2_000_000, "output": 100_000}
+    assert estimate_cost("model", usage) == pytest.approx(2 * 2.0 + 1 * 0.5 + 0.1 * 10.0)
+    assert estimate_cost("unknown", usage) == 0.0
+
+
+def test_calls_are_recorded_per_stage(telemetry):
+    call = LLMCall("model")
+    with call.measure(queue_wait=1.5):
+        call.on_result(_message(1000, 600, 100))
+    telemetry["value"] = "bugfix"
+    call = LLMCall("model")
+    with pytest.raises(RuntimeError):
+        with call.measure(queue_wait=0.5):
+            raise RuntimeError("503")
+    record_llm_retry()
+    record_response_cache_hit()
+    usage = task_llm_usage(TASK_ID)
+    coder = usage["stages"]["coder"]
+    assert coder["calls"] == 1 and coder["errors"] == 0
+    assert (coder["input_tokens"], coder["cached_tokens"], coder["uncached_tokens"], coder["output_tokens"]) == (1000, 600, 400, 100)
+    assert coder["cost_usd"] == pytest.approx((400 * 2.0 + 600 * 0.5 + 100 * 10.0) / 1_000_000)
+    assert coder["cache_hit_rate"] == 0.6 and coder["avg_queue_wait_seconds"] == 1.5
+    bugfix = usage["stages"]["bugfix"]
+    assert bugfix["errors"] == 1 and bugfix["retries"] == 1 and bugfix["response_cache_hits"] == 1
+    total = usage["total"]
+    assert total["calls"] == 2 and total["errors"] == 1 and total["avg_queue_wait_seconds"] == 1.0
+    assert total["max_latency_seconds"] == max(coder["max_latency_seconds"], bugfix["max_latency_seconds"])
+    assert prompt_cache.prompt_cache_stats()["model"]["calls"] == 1
+
+
+def test_streamed_call_records_first_token_and_cancellation():
+    call = LLMCall("model")
+    with pytest.raises(asyncio.CancelledError):
+        with call.measure(queue_wait=0):
+            call.on_chunk(SimpleNamespace(content="", tool_call_chunks=[], usage_metadata=None))
+            assert call.first_token_latency is None
+            call.on_chunk(SimpleNamespace(content="package", usage_metadata=None))
+            call.on_chunk(_message(10, 0, 5, content=""))
+            raise asyncio.CancelledError()
+    stage = task_llm_usage(TASK_ID)["stages"]["coder"]
+    assert stage["cancelled"] == 1 and stage["streamed_calls"] == 1 and stage["output_tokens"] == 5
+    assert "avg_first_token_seconds" in stage
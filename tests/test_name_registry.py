@@ -0,0 +1,47 @@
+import threading
+
+from utils.name_registry import NameRegistry, get_name_registry, release_name_registries
+
+
+def test_reserve_skips_existing_files(tmp_path):
+    (tmp_path / "ic_back.png").write_bytes(b"")
+    (tmp_path / "ic_back_1.xml").write_bytes(b"")
+    registry = NameRegistry(str(tmp_path))
+    assert registry.reserve("ic_back.xml") == "ic_back_2.xml"
+    assert registry.reserve("ic_home.png") == "ic_home.png"
+
+
+def test_png_and_xml_share_the_resource_name(tmp_path):
+    registry = NameRegistry(str(tmp_path))
+    assert registry.reserve("icon.png") == "icon.png"
+    # R.drawable.icon can only be one file
+    assert registry.reserve("icon.xml") == "icon_1.xml"
+    assert registry.reserve("icon_1.png") == "icon_1_1.png"
+
+
+def test_concurrent_reserve_is_unique(tmp_path):
+    registry = NameRegistry(str(tmp_path))
+    names = []
+
+    def reserve():
+        for _ in range(200):
+            names.append(registry.reserve("icon.png"))
+
+    threads = [threading.Thread(target=reserve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(names)) == 800
+
+
+def test_registries_released_with_the_workspace(tmp_path):
+    workspace = tmp_path / "1"
+    resource_directory = workspace / "app/src/main/res/drawable-xxhdpi"
+    registry = get_name_registry(str(resource_directory))
+    assert get_name_registry(str(resource_directory)) is registry
+    other = get_name_registry(str(tmp_path / "10"))
+    release_name_registries(str(workspace))
+    assert get_name_registry(str(resource_directory)) is not registry
+    # a workspace whose name only starts with the same digits is kept
+    assert get_name_registry(str(tmp_path / "10")) is other
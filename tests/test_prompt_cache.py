@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from utils import prompt_cache
+from utils.prompt_cache import (CACHE_CONTROL, completion_token_usage, mark_cache_breakpoint, prompt_cache_stats,
+                                record_token_usage, token_usage)
+
+
+def test_breakpoint_on_the_last_system_message():
+    messages = [SystemMessage(content="tools"), SystemMessage(content="rules"), HumanMessage(content="figma json")]
+    marked = mark_cache_breakpoint(messages)
+    assert marked[1].content == [{"type": "text", "text": "rules", "cache_control": CACHE_CONTROL}]
+    assert marked[0].content == "tools" and marked[2].content == "figma json"
+    # 原消息不变
+    assert messages[1].content == "rules"
+
+
+def test_breakpoint_on_block_content_and_without_system_message():
+    messages = [SystemMessage(content=["first", {"type": "text", "text": "second"}])]
+    marked = mark_cache_breakpoint(messages)
+    assert marked[0].content == [{"type": "text", "text": "first"},
+                                 {"type": "text", "text": "second", "cache_control": CACHE_CONTROL}]
+    assert "cache_control" not in messages[0].content[1]
+    user_only = [HumanMessage(content="hi")]
+    assert mark_cache_breakpoint(user_only) is user_only
+
+
+def test_token_usage():
+    assert token_usage(None) is None
+    usage = token_usage({"input_tokens": 1000, "output_tokens": 50, "input_token_details": {"cache_read": 800}})
+    assert usage == {"input": 1000, "cached": 800, "uncached": 200, "output": 50}
+    assert token_usage({"input_tokens": 10, "output_tokens": 2}) == {"input": 10, "cached": 0, "uncached": 10, "output": 2}
+
+
+def test_completion_token_usage():
+    assert completion_token_usage(SimpleNamespace()) is None
+    completion = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=500, completion_tokens=20,
+                                                       prompt_tokens_details=SimpleNamespace(cached_tokens=300)))
+    assert completion_token_usage(completion) == {"input": 500, "cached": 300, "uncached": 200, "output": 20}
+    no_details = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=5, completion_tokens=1, prompt_tokens_details=None))
+    assert completion_token_usage(no_details)["cached"] == 0
+
+
+def test_stats_per_model(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "_stats", {})
+    record_token_usage("gemini", {"input": 1000, "cached": 750, "uncached": 250, "output": 10})
+    record_token_usage("gemini", {"input": 1000, "cached": 250, "uncached": 750, "output": 10})
+    record_token_usage("gemini", None)
+    stats = prompt_cache_stats()["gemini"]
+    assert stats["calls"] == 2 and stats["input"] == 2000 and stats["output"] == 20
+    assert stats["cache_hit_rate"] == 0.5
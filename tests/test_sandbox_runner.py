@@ -0,0 +1,31 @@
+import time
+
+from utils import sandbox_runner
+from utils.sandbox_runner import run_sandboxed
+
+
+def test_result_and_usage(tmp_path):
+    result = run_sandboxed(["sh", "-c", "echo out; echo err >&2; exit 3"], cwd=str(tmp_path))
+    assert (result.returncode, result.stdout, result.stderr, result.timed_out) == (3, "out\n", "err\n", False)
+    assert {"cpu_user_seconds", "cpu_system_seconds", "max_rss_mb"} <= set(result.usage)
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    start = time.perf_counter()
+    # the background child keeps the pipes open, the whole group has to be killed
+    result = run_sandboxed(["sh", "-c", "sleep 30 & sleep 30"], cwd=str(tmp_path), timeout=0.5,
+                           kill_grace_seconds=1)
+    assert result.timed_out
+    assert time.perf_counter() - start < 10
+    assert "BUILD TIMED OUT" in result.stderr
+
+
+def test_process_joins_the_cgroup_before_exec(monkeypatch, tmp_path):
+    cgroup = tmp_path / "build_1"
+    cgroup.mkdir()
+    monkeypatch.setattr(sandbox_runner, "_create_cgroup", lambda root, cpus, memory_mb: str(cgroup))
+    monkeypatch.setattr(sandbox_runner, "_remove_cgroup", lambda path: None)
+    result = run_sandboxed(["sh", "-c", "echo $$"], cwd=str(tmp_path), cpus=1, cgroup_root=str(tmp_path))
+    # the launcher writes its own pid, which is the pid of the exec'd command
+    assert (cgroup / "cgroup.procs").read_text().strip() == result.stdout.strip()
+    assert result.args == ["sh", "-c", "echo $$"]
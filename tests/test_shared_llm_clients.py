@@ -0,0 +1,25 @@
+import pytest
+
+for module in ("openai", "anthropic", "httpx", "langchain_openai", "langgraph"):
+    pytest.importorskip(module)
+
+import llm
+
+OPTIONS = {"model": "gemini-2.5-pro", "azure_endpoint": "https://example.invalid", "api_version": "2024-03-01-preview",
+           "api_key": "test", "max_tokens": 100}
+
+
+def test_clients_shared_per_quota_and_options():
+    first = llm.get_shared_chat_model("gemini-2.5-pro", streaming=False, **OPTIONS)
+    assert llm.get_shared_chat_model("gemini-2.5-pro", streaming=False, **OPTIONS) is first
+    streaming = llm.get_shared_chat_model("gemini-2.5-pro", streaming=True, **OPTIONS)
+    assert streaming is not first
+    # all clients of one upstream quota are paced by its scheduler and share the http connection pool
+    assert streaming.quota == first.quota == "gemini-2.5-pro"
+    assert streaming.http_client is first.http_client
+
+
+def test_one_rate_limiter_per_quota():
+    assert llm.get_rate_limiter("gemini-2.5-pro") is llm.get_rate_limiter("gemini-2.5-pro")
+    assert llm.get_rate_limiter("unknown-quota") is not llm.get_rate_limiter("gemini-2.5-pro")
+    assert llm.get_llm_scheduler("gemini-2.5-pro") is llm.get_llm_scheduler("gemini-2.5-pro")
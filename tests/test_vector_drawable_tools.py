@@ -0,0 +1,77 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from utils.vector_drawable_tools import ANDROID_NS, UnsupportedSvgError, svg_to_vector_drawable
+
+
+def _paths(vector_xml: str):
+    return ET.fromstring(vector_xml).iter("path")
+
+
+def _attr(element, name: str):
+    return element.get(f"{{{ANDROID_NS}}}{name}")
+
+
+def _svg(body: str, **attrs) -> str:
+    extra = "".join(f' {k.replace("_", "-")}="{v}"' for k, v in attrs.items())
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24"{extra}>'
+            f'{body}</svg>')
+
+
+def test_convert_path_and_size():
+    vector = ET.fromstring(svg_to_vector_drawable(_svg('<path d="M0 0L24 24" fill="#ff0000"/>')))
+    assert vector.tag == "vector"
+    assert _attr(vector, "width") == "24dp"
+    assert _attr(vector, "viewportHeight") == "24"
+    path = next(vector.iter("path"))
+    assert _attr(path, "pathData") == "M 0 0 L 24 24"
+    assert _attr(path, "fillColor") == "#FF0000"
+
+
+def test_shape_converted_to_path():
+    path = next(_paths(svg_to_vector_drawable(_svg('<rect x="2" y="2" width="20" height="10" fill="black"/>'))))
+    assert _attr(path, "pathData")
+    assert _attr(path, "fillColor") == "#000000"
+
+
+def test_opacity_multiplied_into_colors():
+    svg = _svg('<g opacity="0.5"><path d="M0 0L1 1" fill="#000" fill-opacity="0.5"/></g>')
+    path = next(_paths(svg_to_vector_drawable(svg)))
+    assert _attr(path, "fillColor") == "#40000000"
+
+
+def test_percent_opacity():
+    svg = _svg('<path d="M0 0L1 1" fill="#FFFFFF" fill-opacity="50%"/>', opacity="50%")
+    path = next(_paths(svg_to_vector_drawable(svg)))
+    assert _attr(path, "fillColor") == "#40FFFFFF"
+
+
+@pytest.mark.parametrize("body", [
+    '<path d="M0 0L1 1" opacity="half"/>',
+    '<path d="M0 0L1 1" fill="#GGGGGG"/>',
+    '<path d="M0 0L1 1" fill="#12345"/>',
+    '<path d="M0 0L1 1" fill="rgb(1, x, 3)"/>',
+    '<path d="M0 0L1 1" fill="rgb(1, 2)"/>',
+    '<path d="M0 0L1 1" fill="hsl(0, 0%, 0%)"/>',
+    '<path d="M0 0L1 1" stroke="#000" stroke-opacity="?"/>',
+])
+def test_invalid_values_are_unsupported(body):
+    with pytest.raises(UnsupportedSvgError):
+        svg_to_vector_drawable(_svg(body))
+
+
+@pytest.mark.parametrize("body", [
+    '<image href="a.png" width="1" height="1"/>',
+    '<path d="M0 0L1 1" fill="url(#gradient)"/>',
+    '<path d="M0 0L1 1" mask="url(#m)"/>',
+    '',
+])
+def test_unsupported_features(body):
+    with pytest.raises(UnsupportedSvgError):
+        svg_to_vector_drawable(_svg(body))
+
+
+def test_invalid_xml():
+    with pytest.raises(UnsupportedSvgError):
+        svg_to_vector_drawable("<svg")
@@ -0,0 +1,71 @@
+import os
+import time
+
+import pytest
+
+import d2c_datautil
+from utils.workspace_gc import WorkspaceGC, task_id_of
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def running(monkeypatch):
+    running = set()
+    monkeypatch.setattr(d2c_datautil, "list_running_task_ids", lambda: running)
+    return running
+
+
+def _entry(output, name, age, size=4096, directory=False):
+    path = output / name
+    if directory:
+        path.mkdir()
+        (path / "Greeting.kt").write_bytes(b"x" * size)
+        target = path / "Greeting.kt"
+    else:
+        path.write_bytes(b"x" * size)
+        target = path
+    mtime = time.time() - age
+    os.utime(target, (mtime, mtime))
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_task_id_of():
+    assert task_id_of("10001") == 10001
+    assert task_id_of("10001.log.2") == 10001
+    assert task_id_of("Home_1-2_10001.zip") == 10001
+    assert task_id_of("Home_1-2_10001") == 10001
+    assert task_id_of(".workspace_template") is None
+    assert task_id_of("notes.txt") is None
+
+
+def test_expired_tasks_removed_running_and_internal_kept(tmp_path, running):
+    old = [_entry(tmp_path, "1", 5 * DAY, directory=True), _entry(tmp_path, "1.log", 5 * DAY),
+           _entry(tmp_path, "Home_1-2_1.zip", 5 * DAY)]
+    kept = [_entry(tmp_path, "2", 5 * DAY, directory=True), _entry(tmp_path, "3", DAY, directory=True),
+            _entry(tmp_path, ".workspace_template", 5 * DAY, directory=True)]
+    running.add(2)
+    stats = WorkspaceGC(str(tmp_path), retention=3 * DAY, quota_bytes=1 << 40, min_age=1800).collect()
+    assert stats["removed_tasks"] == 1
+    assert not any(path.exists() for path in old)
+    assert all(path.exists() for path in kept)
+
+
+def test_quota_removes_oldest_first_but_not_recent(tmp_path, running):
+    oldest = _entry(tmp_path, "1", 3 * 3600, size=100_000, directory=True)
+    older = _entry(tmp_path, "2", 2 * 3600, size=100_000, directory=True)
+    recent = _entry(tmp_path, "3", 60, size=100_000, directory=True)
+    gc = WorkspaceGC(str(tmp_path), retention=3 * DAY, quota_bytes=150_000, min_age=1800)
+    stats = gc.collect()
+    # removing the oldest task is not enough, the recent one is protected by min_age
+    assert (oldest.exists(), older.exists(), recent.exists()) == (False, False, True)
+    assert stats["removed_tasks"] == 2
+
+
+def test_hardlinked_files_counted_once(tmp_path, running):
+    _entry(tmp_path, "1", 60, size=100_000, directory=True)
+    (tmp_path / "2").mkdir()
+    os.link(tmp_path / "1" / "Greeting.kt", tmp_path / "2" / "Greeting.kt")
+    stats = WorkspaceGC(str(tmp_path), retention=3 * DAY, quota_bytes=1 << 40, min_age=1800).collect()
+    assert stats["used_bytes"] < 2 * 100_000
@@ -0,0 +1,55 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from utils import workspace_pool
+from utils.workspace_pool import READY_SUFFIX, WorkspacePool
+
+
+@pytest.fixture(autouse=True)
+def fake_warm_up(monkeypatch):
+    def prepare_container(path):
+        os.makedirs(os.path.join(path, ".git"), exist_ok=True)
+
+    monkeypatch.setattr(workspace_pool, "prepare_container", prepare_container)
+    monkeypatch.setattr(workspace_pool, "warm_up_gradle", lambda path: None)
+    monkeypatch.setattr(workspace_pool, "reset_workspace", lambda path: None)
+
+
+def _wait_ready(pool, count):
+    deadline = time.time() + 10
+    while pool.ready_count() < count and time.time() < deadline:
+        time.sleep(0.01)
+    return pool.ready_count()
+
+
+def test_acquire_moves_a_ready_workspace_and_refills(tmp_path):
+    pool = WorkspacePool(str(tmp_path / "pool"), size=1, max_age=3600)
+    pool.start()
+    assert _wait_ready(pool, 1) == 1
+    target = str(tmp_path / "task_1")
+    assert pool.acquire(target)
+    assert os.path.isdir(os.path.join(target, ".git"))
+    assert _wait_ready(pool, 1) == 1
+
+
+def test_expired_workspace_is_not_handed_out(tmp_path):
+    pool = WorkspacePool(str(tmp_path / "pool"), size=1, max_age=-1)
+    pool.start()
+    _wait_ready(pool, 1)
+    assert not pool.acquire(str(tmp_path / "task_1"))
+    assert not os.path.exists(tmp_path / "task_1")
+
+
+def test_start_reuses_ready_and_drops_unfinished(tmp_path):
+    pool_directory = tmp_path / "pool"
+    (pool_directory / "ws_ready/.git").mkdir(parents=True)
+    (pool_directory / f"ws_ready{READY_SUFFIX}").write_text("0")
+    (pool_directory / "ws_unfinished").mkdir()
+    pool = WorkspacePool(str(pool_directory), size=0, max_age=3600)
+    pool.start()
+    assert pool.ready_count() == 1
+    assert not (pool_directory / "ws_unfinished").exists()
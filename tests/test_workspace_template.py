@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+import d2c_config
+from utils import workspace_template
+
+
+@pytest.fixture
+def template_root(monkeypatch, tmp_path):
+    monkeypatch.setattr(d2c_config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(d2c_config, "WorkspaceCowCopiedDirs", ["app/build"])
+    builds = []
+
+    def build_template(root):
+        directory = os.path.join(root, f"template_{len(builds)}")
+        os.makedirs(os.path.join(directory, "app/build"))
+        with open(os.path.join(directory, "app/build/output.txt"), "w") as f:
+            f.write("output")
+        with open(os.path.join(directory, "Greeting.kt"), "w") as f:
+            f.write("code")
+        link = os.path.join(root, workspace_template.TEMPLATE_LINK)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(directory), link)
+        builds.append(directory)
+        return directory
+
+    monkeypatch.setattr(workspace_template, "_build_template", build_template)
+    return workspace_template._template_root()
+
+
+def test_stale_template_kept_while_leased(monkeypatch, template_root):
+    with workspace_template.template_lease() as old_template:
+        # the next call rebuilds, the old template is still being snapshotted
+        monkeypatch.setattr(d2c_config, "WorkspaceTemplateMaxAgeSeconds", -1)
+        new_template = workspace_template.ensure_template()
+        assert new_template != old_template
+        assert os.path.isdir(old_template)
+    monkeypatch.setattr(d2c_config, "WorkspaceTemplateMaxAgeSeconds", 3600)
+    assert workspace_template.ensure_template() == new_template
+    assert not os.path.exists(old_template)
+
+
+def test_hardlink_snapshot(template_root, tmp_path):
+    workspace = str(tmp_path / "workspace")
+    workspace_template.create_workspace_from_template(workspace, strategy="hardlink")
+    assert os.stat(os.path.join(workspace, "Greeting.kt")).st_nlink == 2
+    assert os.stat(os.path.join(workspace, "app/build/output.txt")).st_nlink == 1
+    workspace_template.ensure_private_copy(os.path.join(workspace, "Greeting.kt"))
+    assert os.stat(os.path.join(workspace, "Greeting.kt")).st_nlink == 1